@@ -0,0 +1,12 @@
+# ============================================================
+# shopsmart
+# ============================================================
+# Reusable pipeline code shared by the Databricks notebooks.
+# Run the notebooks from a Databricks Git folder (Repos) so the
+# repo root sits one level above notebooks/; they put it on
+# sys.path and import from here:
+#
+#   import os, sys
+#   sys.path.append(os.path.abspath(".."))
+#   from shopsmart.ingestor import MicroBatchIngestor
+# ============================================================
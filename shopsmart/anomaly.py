@@ -0,0 +1,263 @@
+# ============================================================
+# anomaly.py
+# ============================================================
+# PURPOSE:
+#   Payment anomaly scoring that works on one micro-batch at a
+#   time: rule-based fraud signals + a z-score of the amount
+#   against running per-payment-method statistics.
+#
+# WHY NOT avg/stddev OVER Window.partitionBy("payment_method")?
+#   There are ~5 payment methods. The window shuffles EVERY
+#   payment just to attach 5 pairs of numbers, and it has to
+#   rescan all history each time.
+#
+# HOW IT WORKS:
+#   1. A tiny Delta state table holds, per method, the
+#      mergeable moments of amount: n, mean, M2 (sum of
+#      squared deviations), min, max.
+#   2. A new batch is reduced to the same moments with one
+#      groupBy (5 rows to the driver) and folded into the
+#      state with the parallel Welford / Chan update:
+#        delta = mean_b - mean_a
+#        mean  = mean_a + delta * n_b / n
+#        M2    = M2_a + M2_b + delta^2 * n_a * n_b / n
+#      stddev = sqrt(M2 / (n - 1)) - same as stddev() in Spark.
+#   3. The batch is scored with a BROADCAST join to the
+#      updated stats - no shuffle of the payments.
+#
+#   Works as a foreachBatch handler of a streaming query
+#   (batch ids already folded in are skipped on replay) or
+#   directly on any DataFrame of new payments.
+#
+# USAGE:
+#   scorer = PaymentAnomalyScorer(spark, GOLD + "/ml_payment_method_stats",
+#                                 GOLD + "/ml_anomaly_detection")
+#   scorer(df_new_payments)                                  # batch
+#   stream.writeStream.foreachBatch(scorer).start()          # streaming
+# ============================================================
+
+import math
+from datetime import datetime
+
+from delta.tables import DeltaTable
+from pyspark.sql.functions import (abs, avg, broadcast, col, count, current_timestamp, hour, lit, round,
+                                   var_pop, when)
+from pyspark.sql.functions import max as spark_max
+from pyspark.sql.functions import min as spark_min
+from pyspark.sql.types import DoubleType, LongType, StringType, StructField, StructType, TimestampType
+from pyspark.sql.utils import AnalysisException
+
+# Fraud signal thresholds (Silver payments uses the same rules)
+HIGH_RISK_SCORE = 70
+HIGH_AMOUNT = 2000
+OFF_HOURS_FROM = 23   # 11 PM ...
+OFF_HOURS_TO = 5      # ... to 5 AM
+
+ANOMALY_Z = 2.0
+
+STATS_SCHEMA = StructType([
+    StructField("payment_method", StringType(), True),
+    StructField("n", LongType(), False),
+    StructField("mean", DoubleType(), True),
+    StructField("m2", DoubleType(), True),
+    StructField("min_amount", DoubleType(), True),
+    StructField("max_amount", DoubleType(), True),
+    StructField("last_batch_id", LongType(), True),
+    StructField("last_event_at", TimestampType(), True),
+    StructField("updated_at", TimestampType(), True),
+])
+
+
+def add_fraud_signals(df):
+    """Rule-based flags: high risk_score, off-hours, high amount, international"""
+    return df \
+        .withColumn("is_high_risk",
+            when(col("risk_score") >= HIGH_RISK_SCORE, lit(True)).otherwise(lit(False))) \
+        .withColumn("is_off_hours",
+            when((hour(col("transaction_timestamp")) >= OFF_HOURS_FROM) |
+                 (hour(col("transaction_timestamp")) <= OFF_HOURS_TO),
+                lit(True)).otherwise(lit(False))) \
+        .withColumn("is_high_amount",
+            when(col("amount") > HIGH_AMOUNT, lit(True)).otherwise(lit(False))) \
+        .withColumn("fraud_signal_count",
+            col("is_high_risk").cast("int") +
+            col("is_off_hours").cast("int") +
+            col("is_high_amount").cast("int") +
+            col("is_international").cast("boolean").cast("int")) \
+        .withColumn("fraud_risk_label",
+            when(col("fraud_signal_count") >= 3, lit("CRITICAL"))
+            .when(col("fraud_signal_count") >= 2, lit("HIGH"))
+            .when(col("fraud_signal_count") >= 1, lit("MEDIUM"))
+            .otherwise(lit("LOW")))
+
+
+def merge_moments(a, b):
+    """Combine two (n, mean, m2, min, max) summaries of disjoint data"""
+    if not a or a["n"] == 0:
+        return dict(b)
+    if not b or b["n"] == 0:
+        return dict(a)
+    n = a["n"] + b["n"]
+    delta = b["mean"] - a["mean"]
+    return {
+        "n": n,
+        "mean": a["mean"] + delta * b["n"] / n,
+        "m2": a["m2"] + b["m2"] + delta * delta * a["n"] * b["n"] / n,
+        "min_amount": min(a["min_amount"], b["min_amount"]),
+        "max_amount": max(a["max_amount"], b["max_amount"]),
+    }
+
+
+def sample_stddev(moments):
+    """Sample standard deviation, None below two observations"""
+    if moments["n"] < 2:
+        return None
+    return math.sqrt(moments["m2"] / (moments["n"] - 1))
+
+
+def batch_moments(df):
+    """{payment_method: moments} of one batch - a single groupBy, one row per method"""
+    rows = df.filter(col("amount").isNotNull()).groupBy("payment_method").agg(
+        count("amount").alias("n"),
+        avg("amount").alias("mean"),
+        (var_pop("amount") * count("amount")).alias("m2"),
+        spark_min("amount").alias("min_amount"),
+        spark_max("amount").alias("max_amount"),
+        spark_max("transaction_timestamp").alias("last_event_at"),
+    ).collect()
+    return {r["payment_method"]: r.asDict() for r in rows}
+
+
+def read_method_stats(spark, path):
+    """{payment_method: moments + last_batch_id / last_event_at} from the state table"""
+    try:
+        rows = spark.read.format("delta").load(path).collect()
+    except AnalysisException:
+        return {}
+    return {r["payment_method"]: r.asDict() for r in rows}
+
+
+def write_method_stats(spark, path, stats, batch_id=None):
+    """Overwrite the state table - one row per payment method"""
+    now = datetime.now()
+    rows = [(method, int(m["n"]), float(m["mean"]), float(m["m2"]),
+             float(m["min_amount"]), float(m["max_amount"]),
+             batch_id if batch_id is not None else m.get("last_batch_id"),
+             m.get("last_event_at"), now)
+            for method, m in stats.items()]
+    spark.createDataFrame(rows, STATS_SCHEMA) \
+        .write \
+        .format("delta") \
+        .mode("overwrite") \
+        .save(path)
+
+
+def fold_batch(stats, df):
+    """stats with one batch folded in (driver side - a handful of rows)"""
+    folded = dict(stats)
+    for method, moments in batch_moments(df).items():
+        merged = merge_moments(stats.get(method), moments)
+        last_seen = [t for t in (moments.get("last_event_at"), (stats.get(method) or {}).get("last_event_at")) if t]
+        merged["last_event_at"] = max(last_seen) if last_seen else None
+        merged["last_batch_id"] = (stats.get(method) or {}).get("last_batch_id")
+        folded[method] = merged
+    return folded
+
+
+def stats_frame(spark, stats):
+    """Per-method mean / stddev as a small DataFrame (broadcast side of the scoring join)"""
+    rows = [(method, float(m["mean"]), sample_stddev(m)) for method, m in stats.items()]
+    schema = StructType([
+        StructField("payment_method", StringType(), True),
+        StructField("method_mean", DoubleType(), True),
+        StructField("method_stddev", DoubleType(), True),
+    ])
+    return spark.createDataFrame(rows, schema)
+
+
+def score_payments(spark, df, stats):
+    """z-score + anomaly labels + combined risk for a batch of payments"""
+    return df.join(broadcast(stats_frame(spark, stats)), "payment_method", "left") \
+        .withColumn("z_score",
+            when(col("method_stddev") > 0,
+                round(abs(col("amount") - col("method_mean")) / col("method_stddev"), 2))
+            .otherwise(lit(0.0))) \
+        .withColumn("is_statistical_anomaly",
+            when(col("z_score") > ANOMALY_Z, lit(True)).otherwise(lit(False))) \
+        .withColumn("anomaly_type",
+            when(col("z_score") > 3, lit("EXTREME"))
+            .when(col("z_score") > 2, lit("SIGNIFICANT"))
+            .when(col("z_score") > 1.5, lit("MODERATE"))
+            .otherwise(lit("NORMAL"))) \
+        .withColumn("combined_risk_score",
+            col("fraud_signal_count") +
+            when(col("is_statistical_anomaly"), lit(2)).otherwise(lit(0))) \
+        .withColumn("overall_risk",
+            when(col("combined_risk_score") >= 4, lit("CRITICAL"))
+            .when(col("combined_risk_score") >= 3, lit("HIGH"))
+            .when(col("combined_risk_score") >= 2, lit("MEDIUM"))
+            .when(col("combined_risk_score") >= 1, lit("LOW"))
+            .otherwise(lit("SAFE")))
+
+
+ANOMALY_COLUMNS = [
+    "transaction_id", "order_id", "amount", "payment_method",
+    "status", "risk_score", "risk_level",
+    "is_high_risk", "is_off_hours", "is_high_amount", "is_international",
+    "fraud_signal_count", "fraud_risk_label",
+    "z_score", "is_statistical_anomaly", "anomaly_type",
+    "combined_risk_score", "overall_risk",
+    "transaction_timestamp", "transaction_date",
+]
+
+
+class PaymentAnomalyScorer:
+    """Fold a batch into the per-method stats, score it, MERGE the scores into Gold
+
+    Callable as scorer(df) or as a foreachBatch handler scorer(df, batch_id).
+    """
+
+    def __init__(self, spark, stats_path, output_path, full=False, verbose=True):
+        self.spark = spark
+        self.stats_path = stats_path
+        self.output_path = output_path
+        self.verbose = verbose
+        # full=True: start the stats from zero and replace the scored table on the first batch
+        self.stats = {} if full else read_method_stats(spark, stats_path)
+        self._replace_output = full
+
+    def last_event_at(self):
+        """Newest transaction_timestamp already folded into the stats (None before the first batch)"""
+        seen = [m["last_event_at"] for m in self.stats.values() if m.get("last_event_at")]
+        return max(seen) if seen else None
+
+    def __call__(self, df, batch_id=None):
+        last_batch = [m.get("last_batch_id") for m in self.stats.values() if m.get("last_batch_id") is not None]
+        if batch_id is not None and last_batch and batch_id <= max(last_batch):
+            return 0   # replayed micro-batch - already folded in and written
+
+        df = add_fraud_signals(df).cache()
+        stats = fold_batch(self.stats, df)
+        scored = score_payments(self.spark, df, stats) \
+            .select(*ANOMALY_COLUMNS) \
+            .withColumn("_gold_processed_at", current_timestamp()) \
+            .withColumn("_gold_version", lit("1.0"))
+
+        if not self._replace_output and DeltaTable.isDeltaTable(self.spark, self.output_path):
+            DeltaTable.forPath(self.spark, self.output_path).alias("t") \
+                .merge(scored.alias("s"), "t.transaction_id = s.transaction_id") \
+                .whenMatchedUpdateAll() \
+                .whenNotMatchedInsertAll() \
+                .execute()
+        else:
+            scored.write.format("delta").mode("overwrite").option("overwriteSchema", True).save(self.output_path)
+            self._replace_output = False
+
+        # Stats move only after the scores are written - a failed batch is folded in again on retry
+        write_method_stats(self.spark, self.stats_path, stats, batch_id)
+        self.stats = stats
+        rows = df.count()
+        df.unpersist()
+        if self.verbose:
+            print("  batch " + str(batch_id) + ": " + str(rows) + " payments scored")
+        return rows
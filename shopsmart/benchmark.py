@@ -0,0 +1,267 @@
+# ============================================================
+# benchmark.py
+# ============================================================
+# PURPOSE:
+#   Times every stage of the pipeline (pipeline.STAGES) on
+#   local Spark + Delta against scaled_generator output, at
+#   one or more scale factors, and compares the run with a
+#   stored baseline - no Azure, no Databricks, no network.
+#
+# WHAT IS MEASURED (per scale, per stage):
+#   seconds               wall time of the stage
+#   rows / rows_per_sec   rows written / seconds
+#   shuffle_read_bytes    summed over the stage's Spark stages
+#   shuffle_write_bytes
+#   peak_execution_memory largest Spark stage (sort / hash /
+#                         aggregation buffers)
+#   jvm_heap_peak         driver JVM heap high-water mark so far
+#   python_rss_peak       driver Python process high-water mark
+#
+#   The Spark numbers come from the application's own REST
+#   API (the Spark UI) - every stage runs in its own job group,
+#   so its jobs and stages can be picked out afterwards.
+#
+# REGRESSIONS:
+#   A stage regresses when its time grows by more than
+#   --tolerance (default 20%) AND by more than MIN_SECONDS
+#   (sub-second stages are noise), or its shuffle volume grows
+#   by more than --tolerance (same data, same plan -> same
+#   bytes, so that is a plan change). Any regression -> exit 1.
+#
+# LAYOUT:
+#   <root>/scale_<N>/bronze   generated once, kept between runs
+#   <root>/scale_<N>/silver   wiped before every run (stages
+#                             rebuild, they never load incrementally)
+#   <root>/scale_<N>/gold     wiped before every run
+#
+# USAGE:
+#   pip install pyspark delta-spark
+#   python -m shopsmart.benchmark --scales 1 10 --root /tmp/shopsmart_bench
+#   python -m shopsmart.benchmark --scales 1 10 --root /tmp/shopsmart_bench --save-baseline
+#   python -m shopsmart.benchmark --scales 10 --stage gold --repeat 3
+# ============================================================
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+import urllib.request
+from datetime import datetime
+
+from shopsmart.pipeline import local_spark, select_stages
+from shopsmart.storage import layer_paths
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "synthetic_data"))
+from scaled_generator import generate_scaled  # noqa: E402
+
+# Fixed "now" for the generator: the same scale always gives the same bytes
+AS_OF = "2025-06-30"
+
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+DEFAULT_TOLERANCE = 0.2
+MIN_SECONDS = 1.0
+
+# Give the Spark listener this long to publish a finished job group
+METRICS_WAIT_S = 10
+
+
+def _api(spark, endpoint):
+    sc = spark.sparkContext
+    url = sc.uiWebUrl + "/api/v1/applications/" + sc.applicationId + endpoint
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.load(response)
+
+
+def _group_jobs(spark, group):
+    return [job for job in _api(spark, "/jobs") if job.get("jobGroup") == group]
+
+
+def spark_metrics(spark, group):
+    """Shuffle bytes and peak memory of the Spark jobs run under one job group"""
+    deadline = time.time() + METRICS_WAIT_S
+    jobs = _group_jobs(spark, group)
+    while any(job["status"] == "RUNNING" for job in jobs) and time.time() < deadline:
+        time.sleep(0.2)
+        jobs = _group_jobs(spark, group)
+
+    stage_ids = set(stage_id for job in jobs for stage_id in job["stageIds"])
+    stages = [s for s in _api(spark, "/stages?status=complete") if s["stageId"] in stage_ids]
+    driver = [e for e in _api(spark, "/executors") if e["id"] == "driver"]
+    heap = driver[0].get("peakMemoryMetrics", {}).get("JVMHeapMemory", 0) if driver else 0
+
+    return {
+        "spark_jobs": len(jobs),
+        "spark_stages": len(stages),
+        "shuffle_read_bytes": sum(s["shuffleReadBytes"] for s in stages),
+        "shuffle_write_bytes": sum(s["shuffleWriteBytes"] for s in stages),
+        "peak_execution_memory": max([s.get("peakExecutionMemory", 0) for s in stages] or [0]),
+        "jvm_heap_peak": heap,
+    }
+
+
+def _python_rss_peak():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024    # Linux reports KB
+
+
+def scale_root(root, scale):
+    return os.path.join(root, "scale_" + str(scale))
+
+
+def generate_bronze(root, scale, regenerate=False):
+    """Bronze for one scale, unless an earlier run already generated it"""
+    bronze = layer_paths(scale_root(root, scale))[0]
+    marker = os.path.join(bronze, "_GENERATED")
+    if regenerate or not os.path.exists(marker):
+        generate_scaled(scale, output_dir=bronze, as_of=AS_OF)
+        with open(marker, "w") as f:
+            f.write(AS_OF + "\n")
+
+
+def reset_outputs(root, scale):
+    """Empty Silver / Gold (and the Bronze quarantine) for a clean full run -> layer paths"""
+    bronze, silver, gold = layer_paths(scale_root(root, scale))
+    for path in (bronze + "/quarantine", silver, gold):
+        shutil.rmtree(path, ignore_errors=True)
+    return bronze, silver, gold
+
+
+def run_stage(spark, name, stage, paths):
+    """One timed stage in its own job group -> metrics dict"""
+    group = "bench:" + name
+    spark.sparkContext.setJobGroup(group, name)
+    start = time.perf_counter()
+    rows = stage(spark, *paths)
+    seconds = time.perf_counter() - start
+    spark.sparkContext.setLocalProperty("spark.jobGroup.id", None)
+
+    result = {"seconds": round(seconds, 3), "rows": rows,
+              "rows_per_sec": int(rows / seconds) if seconds > 0 else 0}
+    result.update(spark_metrics(spark, group))
+    result["python_rss_peak"] = _python_rss_peak()
+    return result
+
+
+def run_scale(spark, root, scale, stages, repeat=1):
+    """All stages at one scale, repeat times -> {stage: metrics of its fastest run}"""
+    best = {}
+    for attempt in range(repeat):
+        paths = reset_outputs(root, scale)
+        print("\n📏 Scale " + str(scale) + " - run " + str(attempt + 1) + "/" + str(repeat))
+        for name, stage in stages:
+            result = run_stage(spark, name, stage, paths)
+            print("  " + name.ljust(22) + str(result["seconds"]).rjust(8) + " s"
+                  + format(result["rows_per_sec"], ",").rjust(12) + " rows/s"
+                  + _mb(result["shuffle_read_bytes"] + result["shuffle_write_bytes"]).rjust(10) + " shuffle")
+            if name not in best or result["seconds"] < best[name]["seconds"]:
+                best[name] = result
+    return best
+
+
+def _mb(n):
+    return str(round(n / 1024 / 1024, 1)) + " MB"
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, min_seconds=MIN_SECONDS):
+    """Stages slower / shuffling more than the baseline -> list of (scale, stage, metric, base, now)"""
+    regressions = []
+    for scale, stages in results["scales"].items():
+        for name, now in stages.items():
+            base = baseline.get("scales", {}).get(scale, {}).get(name)
+            if base is None:
+                continue
+            if (now["seconds"] > base["seconds"] * (1 + tolerance)
+                    and now["seconds"] - base["seconds"] > min_seconds):
+                regressions.append((scale, name, "seconds", base["seconds"], now["seconds"]))
+            for metric in ("shuffle_read_bytes", "shuffle_write_bytes"):
+                if now[metric] > base[metric] * (1 + tolerance) and now[metric] - base[metric] > 1024 * 1024:
+                    regressions.append((scale, name, metric, base[metric], now[metric]))
+    return regressions
+
+
+def print_comparison(results, baseline):
+    print("\n📊 vs baseline (" + baseline.get("created", "?") + ")")
+    for scale, stages in results["scales"].items():
+        for name, now in stages.items():
+            base = baseline.get("scales", {}).get(scale, {}).get(name)
+            if base is None:
+                print("  scale " + scale.ljust(4) + name.ljust(22) + "   (not in baseline)")
+                continue
+            change = (now["seconds"] - base["seconds"]) / base["seconds"] * 100 if base["seconds"] else 0.0
+            print("  scale " + scale.ljust(4) + name.ljust(22) + str(base["seconds"]).rjust(8) + " s ->"
+                  + str(now["seconds"]).rjust(8) + " s  (" + ("+" if change >= 0 else "") + str(round(change)) + "%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ShopSmart pipeline on local Spark + Delta")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10], help="Generator scale factors")
+    parser.add_argument("--root", default="benchmarks/data", help="Local folder for the generated layers")
+    parser.add_argument("--stage", action="append", help="Only stages starting with this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scale; the fastest counts")
+    parser.add_argument("--regenerate", action="store_true", help="Generate Bronze again even if present")
+    parser.add_argument("--cores", default="*", help="local[N] cores")
+    parser.add_argument("--driver-memory", default="4g")
+    parser.add_argument("--output", help="Results JSON (default: <root>/results-<timestamp>.json)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed growth before a stage counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    stages = select_stages(args.stage)
+    # Generate before Spark starts: the generator forks a process pool
+    for scale in args.scales:
+        generate_bronze(root, scale, args.regenerate)
+    spark = local_spark("shopsmart-benchmark", args.cores, args.driver_memory)
+    spark.sparkContext.setLogLevel("WARN")
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "spark_version": spark.version,
+        "python_version": platform.python_version(),
+        "machine": platform.machine() + ", " + str(os.cpu_count()) + " cpus",
+        "cores": args.cores,
+        "driver_memory": args.driver_memory,
+        "as_of": AS_OF,
+        "scales": {},
+    }
+    for scale in args.scales:
+        results["scales"][str(scale)] = run_scale(spark, root, scale, stages, args.repeat)
+    spark.stop()
+
+    output = args.output or os.path.join(root, "results-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("\n💾 Results: " + output)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print("💾 Baseline saved: " + args.baseline)
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline at " + args.baseline + " - run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    print_comparison(results, baseline)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\n❌ " + str(len(regressions)) + " regression(s) beyond " + str(int(args.tolerance * 100)) + "%:")
+        for scale, name, metric, base, now in regressions:
+            print("  scale " + scale + "  " + name + "  " + metric + ": " + str(base) + " -> " + str(now))
+        sys.exit(1)
+    print("\n✅ No regressions beyond " + str(int(args.tolerance * 100)) + "%")
+
+
+if __name__ == "__main__":
+    main()
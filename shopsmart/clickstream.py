@@ -0,0 +1,98 @@
+# ============================================================
+# clickstream.py
+# ============================================================
+# PURPOSE:
+#   Turns raw clickstream JSON (as sent by stream_producer.py)
+#   into Bronze rows and appends them to
+#   bronze/streaming_clickstream.
+#
+# WHY NOT json.loads IN A LOOP?
+#   Parsing row by row on the driver is the slowest part of a
+#   micro-batch. Here the driver only ships the raw strings to
+#   Spark (one Arrow-backed pandas column) and from_json parses
+#   them on the executors - geo_location flattened in the same
+#   select. Malformed events are kept in _corrupt_record.
+#
+# BINARY PAYLOADS:
+#   Events sent with stream_producer.py --format binary arrive as
+#   bytes and are decoded by wire.decode_events() into the same
+#   columns; a batch may mix both formats.
+#
+# DUPLICATES:
+#   With an EventDeduplicator (dedup.py) events whose event_id
+#   is already in Bronze are dropped before the write, and each
+#   Bronze commit records its batch id (userMetadata).
+# ============================================================
+
+import pandas as pd
+from pyspark.sql.functions import col, current_timestamp, from_json, lit, when
+
+from shopsmart.schemas import spark_schema
+from shopsmart.wire import decode_events
+
+# Same fields as stream_producer.generate_event(); event_timestamp stays a string like Bronze JSON
+STREAM_EVENT_SCHEMA = spark_schema("clickstream_event", text_dates=True)
+
+
+def parse_events(spark, payloads):
+    """Raw JSON strings and / or wire-format bytes -> one flat row per event"""
+
+    texts = [p for p in payloads if isinstance(p, str)]
+    blobs = [p for p in payloads if not isinstance(p, str)]
+    if not blobs:
+        return parse_json_events(spark, texts)
+    if not texts:
+        return decode_events(spark, blobs)
+    return parse_json_events(spark, texts).unionByName(decode_events(spark, blobs))
+
+
+def parse_json_events(spark, payloads):
+    """Raw JSON strings -> one flat row per event (geo_location -> geo_city / geo_country)"""
+
+    raw = spark.createDataFrame(pd.DataFrame({"_raw": payloads}))
+    parsed = raw.select(col("_raw"), from_json(col("_raw"), STREAM_EVENT_SCHEMA).alias("e"))
+
+    fields = [col("e." + f.name) for f in STREAM_EVENT_SCHEMA.fields if f.name != "geo_location"]
+    geo_at = [f.name for f in STREAM_EVENT_SCHEMA.fields].index("geo_location")
+    fields[geo_at:geo_at] = [col("e.geo_location.city").alias("geo_city"),
+                             col("e.geo_location.country").alias("geo_country")]
+
+    # from_json gives all-null fields for a malformed event; keep the raw text for it
+    return parsed.select(
+        *fields,
+        when(col("e.event_id").isNull(), col("_raw")).alias("_corrupt_record"),
+    )
+
+
+class BronzeClickstreamWriter:
+    """write_batch callable for MicroBatchIngestor: (dedup +) parse + append one micro-batch to Bronze"""
+
+    def __init__(self, spark, path, eventhub_name, dedup=None):
+        self.spark = spark
+        self.path = path
+        self.eventhub_name = eventhub_name
+        self.dedup = dedup
+        if dedup is not None:
+            dedup.sync_with_bronze(path)
+
+    def __call__(self, payloads, batch_id):
+        if self.dedup is not None:
+            payloads = self.dedup.new_payloads(payloads)
+            if not payloads:
+                return 0
+
+        df = parse_events(self.spark, payloads) \
+            .withColumn("_ingestion_source", lit("event_hub")) \
+            .withColumn("_ingestion_timestamp", current_timestamp()) \
+            .withColumn("_event_hub_name", lit(self.eventhub_name)) \
+            .withColumn("_batch_id", lit(batch_id))
+
+        df.write \
+            .format("delta") \
+            .mode("append") \
+            .option("mergeSchema", True) \
+            .option("userMetadata", batch_id) \
+            .save(self.path)
+        if self.dedup is not None:
+            self.dedup.commit(batch_id)
+        return len(payloads)
@@ -0,0 +1,333 @@
+# ============================================================
+# dedup.py
+# ============================================================
+# PURPOSE:
+#   Drops clickstream events whose event_id already reached
+#   Bronze - BEFORE the Delta write - so replaying Event Hub
+#   (starting_position="-1", lost checkpoints, retried
+#   batches) no longer piles up duplicate events.
+#
+# WHY A BLOOM FILTER?
+#   An exact set of seen ids grows with every event, and a
+#   MERGE on event_id would scan Bronze for every micro-batch.
+#   A Bloom filter answers "seen before?" from a fixed-size bit
+#   array: ~1.8 MB per million events at 0.1% false positives
+#   (a new event wrongly dropped) and never a false negative
+#   (a duplicate always caught).
+#   A full filter's false positives climb fast (~70% at 5x its
+#   capacity), so filters are chained instead: when the newest
+#   one is full, a new generation twice as large with half the
+#   false-positive budget takes the new ids - the rate stays
+#   under FALSE_POSITIVE_RATE at any daily volume.
+#
+# HOW IT WORKS:
+#   1. One (chained) filter per EVENT day (from
+#      event_timestamp), so a replayed event always hits the
+#      same filter. Days older than RETENTION_DAYS leave memory
+#      and state: Event Hub keeps events 7 days at most, so
+#      anything older can only be a replay - dropped and
+#      counted as "expired".
+#   2. event_id / event_timestamp come out of the raw JSON with
+#      one vectorized regex - no json.loads per event (binary
+#      wire-format payloads: wire.peek_keys, first fields only).
+#   3. Repeats inside the batch and ids the filter has seen are
+#      dropped; only the rest is written to Bronze.
+#   4. After the Bronze write, the new ids go into the filters
+#      and the changed generations are MERGEd (zlib-compressed)
+#      into a small Delta state table next to the checkpoints,
+#      with the batch id. Bronze commits carry the batch id too
+#      (userMetadata): if the job died between the two writes,
+#      the next start re-adds that batch from Bronze.
+#
+# USAGE:
+#   dedup = EventDeduplicator(spark, BRONZE + "/_checkpoints/streaming_clickstream_dedup")
+#   writer = BronzeClickstreamWriter(spark, path, "eh-clickstream", dedup=dedup)
+# ============================================================
+
+import hashlib
+import math
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from delta.tables import DeltaTable
+from pyspark.sql.functions import col, current_timestamp
+from pyspark.sql.types import BinaryType, IntegerType, LongType, StringType, StructField, StructType
+
+from shopsmart.wire import peek_keys
+
+RETENTION_DAYS = 8              # Event Hub retention is 7 days at most
+EVENTS_PER_DAY = 1_000_000      # capacity of a day's first filter generation
+FALSE_POSITIVE_RATE = 0.001     # bound for a whole day, all generations together
+GROWTH = 2                      # each generation holds twice as many ids as the one before
+TIGHTENING = 0.5                # ... at half its false-positive rate
+
+STATE_SCHEMA = StructType([
+    StructField("event_day", StringType(), False),
+    StructField("generation", IntegerType(), False),
+    StructField("capacity", LongType(), False),
+    StructField("num_bits", LongType(), False),
+    StructField("num_hashes", IntegerType(), False),
+    StructField("bits", BinaryType(), False),      # zlib-compressed bit array
+    StructField("events", LongType(), False),
+    StructField("last_batch_id", StringType(), True),
+])
+
+_EVENT_ID = r'"event_id"\s*:\s*"([^"]+)"'
+_EVENT_DAY = r'"event_timestamp"\s*:\s*"(\d{4}-\d{2}-\d{2})'
+
+
+def event_keys(payloads):
+    """Raw JSON strings / wire bytes -> (event_id, event day 'yyyy-MM-dd') pandas Series, NULL where not found"""
+    raw = pd.Series(payloads, dtype="object")
+    ids, days = raw.str.extract(_EVENT_ID, expand=False), raw.str.extract(_EVENT_DAY, expand=False)
+    binary = np.flatnonzero([not isinstance(p, str) for p in payloads])
+    if len(binary):
+        keys = [peek_keys(payloads[i]) for i in binary]
+        ids.iloc[binary] = [k[0] for k in keys]
+        days.iloc[binary] = [k[1] for k in keys]
+    return ids, days
+
+
+def _day(offset_days=0):
+    return (datetime.now(timezone.utc) + timedelta(days=offset_days)).strftime("%Y-%m-%d")
+
+
+def _hashes(ids):
+    """One 128-bit blake2b per id as two uint64 columns - stable across runs / versions"""
+    digests = b"".join(hashlib.blake2b(i.encode("utf-8"), digest_size=16).digest() for i in ids)
+    return np.frombuffer(digests, dtype="<u8").reshape(-1, 2)
+
+
+class BloomFilter:
+    """Fixed-size set of strings: no false negatives, ~fp_rate false positives at capacity"""
+
+    def __init__(self, num_bits, num_hashes, bits=None, events=0, capacity=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else np.zeros((num_bits + 7) // 8, dtype="uint8")
+        self.events = events
+        self.capacity = capacity
+
+    @classmethod
+    def for_capacity(cls, capacity, fp_rate):
+        num_bits = int(math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        return cls(num_bits, max(1, int(round(num_bits / capacity * math.log(2)))), capacity=capacity)
+
+    def _positions(self, h):
+        # Double hashing: h1 + i * h2
+        return (h[:, :1] + np.arange(self.num_hashes, dtype="uint64") * h[:, 1:]) % np.uint64(self.num_bits)
+
+    def contains(self, ids, hashes=None):
+        """bool array: True = probably seen, False = certainly new"""
+        positions = self._positions(_hashes(ids) if hashes is None else hashes)
+        bytes_at = self.bits[positions >> np.uint64(3)]
+        return ((bytes_at >> (positions & np.uint64(7)).astype("uint8")) & 1).all(axis=1)
+
+    def add(self, ids, hashes=None):
+        positions = self._positions(_hashes(ids) if hashes is None else hashes).ravel()
+        masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype("uint8"))
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), masks)
+        self.events += len(ids)
+
+    def to_bytes(self):
+        return zlib.compress(self.bits.tobytes(), 1)
+
+    @classmethod
+    def from_bytes(cls, num_bits, num_hashes, data, events, capacity=None):
+        bits = np.frombuffer(zlib.decompress(data), dtype="uint8").copy()
+        return cls(num_bits, num_hashes, bits, events, capacity)
+
+
+class ScalableBloomFilter:
+    """Chain of BloomFilters: a new generation (GROWTH x larger, TIGHTENING x the fp rate) once the newest is full
+
+    The false-positive rates of the generations sum to less than fp_rate,
+    however many ids are added.
+    """
+
+    def __init__(self, capacity, fp_rate, generations=None):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.generations = generations or []
+
+    @property
+    def events(self):
+        return sum(f.events for f in self.generations)
+
+    def _grow(self):
+        g = len(self.generations)
+        self.generations.append(BloomFilter.for_capacity(self.capacity * GROWTH ** g,
+                                                         self.fp_rate * (1 - TIGHTENING) * TIGHTENING ** g))
+
+    def contains(self, ids):
+        """bool array: True = probably seen, False = certainly new"""
+        seen = np.zeros(len(ids), dtype=bool)
+        if len(ids) and self.generations:
+            hashes = _hashes(ids)
+            for f in self.generations:
+                seen[~seen] = f.contains(None, hashes[~seen])
+        return seen
+
+    def add(self, ids):
+        """Add ids, filling the newest generation up to its capacity first -> indexes of changed generations"""
+        hashes = _hashes(ids)
+        changed = []
+        at = 0
+        while at < len(ids):
+            if not self.generations or self.generations[-1].events >= self.generations[-1].capacity:
+                self._grow()
+            newest = self.generations[-1]
+            take = min(len(ids) - at, newest.capacity - newest.events)
+            newest.add(ids[at:at + take], hashes[at:at + take])
+            changed.append(len(self.generations) - 1)
+            at += take
+        return changed
+
+    def nbytes(self):
+        return sum(f.bits.nbytes for f in self.generations)
+
+
+class EventDeduplicator:
+    """Seen-before check on event_id: one scalable Bloom filter per event day, persisted in a small Delta table"""
+
+    def __init__(self, spark, state_path, retention_days=RETENTION_DAYS, events_per_day=EVENTS_PER_DAY,
+                 fp_rate=FALSE_POSITIVE_RATE):
+        self.spark = spark
+        self.state_path = state_path
+        self.retention_days = retention_days
+        self.events_per_day = events_per_day
+        self.fp_rate = fp_rate
+
+        self.filters = None          # event day -> ScalableBloomFilter, loaded on first use
+        self.last_batch_id = None    # last batch whose ids are in the stored state
+        self._pending = []           # (day, ids) kept by new_payloads(), added on commit()
+
+        self.kept = 0
+        self.duplicates = 0
+        self.expired = 0
+
+    def load(self):
+        """Filters of the retained days from the state table (none on the first run)"""
+        self.filters = {}
+        if not DeltaTable.isDeltaTable(self.spark, self.state_path):
+            return
+        rows = self.spark.read.format("delta").load(self.state_path) \
+            .filter(col("event_day") >= _day(-self.retention_days)) \
+            .collect()
+        generations = {}
+        for row in rows:
+            generations.setdefault(row["event_day"], {})[row["generation"]] = BloomFilter.from_bytes(
+                row["num_bits"], row["num_hashes"], row["bits"], row["events"], row["capacity"])
+        for day, by_generation in generations.items():
+            self.filters[day] = ScalableBloomFilter(
+                self.events_per_day, self.fp_rate, [by_generation[g] for g in sorted(by_generation)])
+        batch_ids = [row["last_batch_id"] for row in rows if row["last_batch_id"]]
+        self.last_batch_id = max(batch_ids) if batch_ids else None
+
+    def sync_with_bronze(self, bronze_path):
+        """Add ids Bronze has but the state misses -> events added
+
+        No state yet: seed it from the retained days of Bronze (first run
+        after dedup was switched on). Otherwise: re-add the last Bronze
+        batch if the job stopped before its state commit.
+        """
+        if self.filters is None:
+            self.load()
+        if not DeltaTable.isDeltaTable(self.spark, bronze_path):
+            return 0
+
+        df = self.spark.read.format("delta").load(bronze_path).filter(col("event_id").isNotNull())
+        if not DeltaTable.isDeltaTable(self.spark, self.state_path):
+            batch_id = "seed"
+            df = df.filter(col("event_timestamp").substr(1, 10) >= _day(-self.retention_days))
+        else:
+            batch_id = DeltaTable.forPath(self.spark, bronze_path).history(1) \
+                .select("userMetadata").collect()[0][0]
+            if not batch_id or batch_id == self.last_batch_id:
+                return 0
+            df = df.filter(col("_batch_id") == batch_id)
+
+        pdf = df.select("event_id", col("event_timestamp").substr(1, 10).alias("event_day")).toPandas()
+        self.new_payloads([], keys=(pdf["event_id"], pdf["event_day"]))
+        self.commit(batch_id)
+        return len(pdf)
+
+    def _filter(self, day):
+        if day not in self.filters:
+            self.filters[day] = ScalableBloomFilter(self.events_per_day, self.fp_rate)
+        return self.filters[day]
+
+    def new_payloads(self, payloads, keys=None):
+        """Payloads to write: unseen event_ids, first occurrence in the batch, not expired
+
+        Events without an event_id are kept (Bronze stores them as
+        _corrupt_record). The kept ids are only added to the filters by
+        commit(), after the Bronze write succeeded.
+        """
+        if self.filters is None:
+            self.load()
+        ids, days = keys if keys is not None else event_keys(payloads)
+        ids = ids.reset_index(drop=True)
+        # No timestamp -> today; far-future timestamps share tomorrow's filter (bounded filter count)
+        days = days.reset_index(drop=True).fillna(_day()).clip(upper=_day(1))
+
+        has_id = ids.notna().to_numpy()
+        expired = has_id & (days < _day(-self.retention_days)).to_numpy()
+        keep = ~(has_id & ids.duplicated().to_numpy()) & ~expired
+        batch_duplicates = int(has_id.sum() - (keep & has_id).sum() - expired.sum())
+
+        self._pending = []
+        for day in days[keep & has_id].unique():
+            at = np.flatnonzero(keep & has_id & (days == day).to_numpy())
+            seen = self._filter(day).contains(ids.iloc[at])
+            keep[at[seen]] = False
+            self._pending.append((day, ids.iloc[at[~seen]].tolist()))
+            batch_duplicates += int(seen.sum())
+
+        self.kept += int(keep.sum())
+        self.duplicates += batch_duplicates
+        self.expired += int(expired.sum())
+        return [p for p, k in zip(payloads, keep) if k]
+
+    def commit(self, batch_id):
+        """Add the kept ids to the filters and persist the changed generations - call after the Bronze write"""
+        oldest = _day(-self.retention_days)
+        changed = set()
+        for day, ids in self._pending:
+            if ids:
+                changed.update((day, g) for g in self._filter(day).add(ids))
+        self._pending = []
+        for day in [d for d in self.filters if d < oldest]:
+            del self.filters[day]
+        changed = set((day, g) for day, g in changed if day in self.filters)
+        if not changed:
+            return
+
+        rows = []
+        for day, g in sorted(changed):
+            f = self.filters[day].generations[g]
+            rows.append((day, g, f.capacity, f.num_bits, f.num_hashes, f.to_bytes(), f.events, batch_id))
+        update = self.spark.createDataFrame(rows, STATE_SCHEMA).withColumn("updated_at", current_timestamp())
+        if not DeltaTable.isDeltaTable(self.spark, self.state_path):
+            update.write.format("delta").mode("overwrite").save(self.state_path)
+        else:
+            expired = "t.event_day < '" + oldest + "'"
+            DeltaTable.forPath(self.spark, self.state_path).alias("t") \
+                .merge(update.alias("s"), "t.event_day = s.event_day AND t.generation = s.generation") \
+                .whenMatchedUpdateAll() \
+                .whenNotMatchedInsertAll() \
+                .whenNotMatchedBySourceDelete(condition=expired) \
+                .execute()
+        self.last_batch_id = batch_id
+
+    def summary(self):
+        return {
+            "kept": self.kept,
+            "duplicates": self.duplicates,
+            "expired": self.expired,
+            "days": len(self.filters or {}),
+            "filter_generations": sum(len(f.generations) for f in (self.filters or {}).values()),
+            "filter_bytes": sum(f.nbytes() for f in (self.filters or {}).values()),
+        }
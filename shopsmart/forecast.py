@@ -0,0 +1,260 @@
+# ============================================================
+# forecast.py
+# ============================================================
+# PURPOSE:
+#   Daily demand forecast per (product_id, warehouse_id) and
+#   the DYNAMIC reorder point / quantity it implies, replacing
+#   the static reorder_point=100 / reorder_quantity=250 of
+#   silver/inventory.
+#
+# THE MODEL:
+#   Holt's linear exponential smoothing per series: a level
+#   and a trend, each nudged towards every new day's units
+#   (ALPHA / BETA), plus an exponentially weighted mean
+#   squared one-day-ahead error for the safety stock:
+#     lead-time demand = sum of the next LEAD_TIME_DAYS forecasts
+#     safety stock     = SERVICE_Z * error stddev * sqrt(lead time)
+#     reorder point    = lead-time demand + safety stock
+#     reorder quantity = COVER_DAYS of forecast demand
+#   Series with less than MIN_HISTORY_DAYS of history keep the
+#   static values of silver/inventory.
+#
+#   fact_sales carries no warehouse: a product's daily units
+#   are split evenly over the warehouses that stock it.
+#   Cancelled orders are not demand.
+#
+# WHY THIS SCALES TO 100k+ SERIES:
+#   1. The fitted state is 1 row per series (level, trend,
+#      error, last day folded) in gold/ml_demand_state. A run
+#      only folds the days after the watermark (gold/_watermarks,
+#      source "ml_demand") - nightly that is ONE day.
+#   2. Series are hashed into FORECAST_BUCKETS buckets; state
+#      and new units are cogrouped by bucket and each bucket is
+#      fitted by a pandas UDF - buckets run in parallel on the
+#      executors.
+#   3. Inside a bucket every series is updated at once: one
+#      numpy step per DAY over arrays of all its series, never
+#      a Python loop per series.
+#
+#   Days already folded are not re-read: if fact_sales is
+#   corrected for an old day, run with full=True. That is why
+#   the newest order_date is never folded - its orders may
+#   still be loading. It is folded by the first run that sees
+#   a later day (fold_window()).
+#
+# USAGE:
+#   stats = refresh_demand_state(spark, GOLD + "/fact_sales", SILVER + "/inventory",
+#                                GOLD + "/ml_demand_state", GOLD + "/_watermarks")
+#   df_reorder = reorder_points(spark.read.format("delta").load(GOLD + "/ml_demand_state"),
+#                               spark.read.format("delta").load(SILVER + "/inventory"))
+# ============================================================
+
+import numpy as np
+import pandas as pd
+from delta.tables import DeltaTable
+from pyspark.sql.functions import (broadcast, ceil, coalesce, col, count, datediff, expr, greatest, lit, pmod,
+                                   round, sqrt, to_date, when, xxhash64)
+from pyspark.sql.functions import max as spark_max
+from pyspark.sql.functions import sum as spark_sum
+from pyspark.sql.types import DoubleType, IntegerType, StringType, StructField, StructType
+from pyspark.sql.window import Window
+
+from shopsmart.incremental import commit_watermark, latest_per_key, read_watermark
+
+ALPHA = 0.3               # level smoothing
+BETA = 0.05               # trend smoothing
+ERROR_SMOOTHING = 0.1     # weight of the newest squared error
+LEAD_TIME_DAYS = 7
+COVER_DAYS = 14
+SERVICE_Z = 1.65          # ~95% of replenishment cycles without a stock-out
+MIN_HISTORY_DAYS = 28
+FORECAST_BUCKETS = 128
+EPOCH = "1970-01-01"
+
+SERIES_KEYS = ["product_id", "warehouse_id"]
+
+STATE_SCHEMA = StructType([
+    StructField("product_id", StringType(), False),
+    StructField("warehouse_id", StringType(), False),
+    StructField("first_epoch_day", IntegerType(), False),   # first day with demand
+    StructField("last_epoch_day", IntegerType(), False),    # last day folded in
+    StructField("history_days", IntegerType(), False),
+    StructField("level", DoubleType(), False),
+    StructField("trend", DoubleType(), False),
+    StructField("mse", DoubleType(), False),
+])
+
+
+def _epoch_days(column):
+    return datediff(to_date(col(column)), to_date(lit(EPOCH)))
+
+
+def warehouse_shares(df_inventory):
+    """Latest Silver inventory snapshot -> (product_id, warehouse_id, demand_share), shares of a product sum to 1"""
+    latest = latest_per_key(df_inventory, SERIES_KEYS, "snapshot_date").select(*SERIES_KEYS)
+    return latest.withColumn("demand_share", lit(1.0) / count(lit(1)).over(Window.partitionBy("product_id")))
+
+
+def daily_demand(df_fact, df_shares, after_day, through_day):
+    """fact_sales -> units per (product_id, warehouse_id, epoch_day) for days after_day < day <= through_day"""
+    df_units = df_fact \
+        .filter(~coalesce(col("is_cancelled"), lit(False))) \
+        .withColumn("epoch_day", _epoch_days("order_date")) \
+        .filter((col("epoch_day") > after_day) & (col("epoch_day") <= through_day)) \
+        .groupBy("product_id", "epoch_day") \
+        .agg(spark_sum("quantity").cast("double").alias("units"))
+    return df_units.join(broadcast(df_shares), "product_id") \
+        .select(*SERIES_KEYS, "epoch_day", (col("units") * col("demand_share")).alias("units"))
+
+
+# ----------------------------------------------------------
+# Fitting one bucket (pandas / numpy, runs on the executors)
+# ----------------------------------------------------------
+def fit_bucket(state, sales, through_day, alpha=ALPHA, beta=BETA, error_smoothing=ERROR_SMOOTHING):
+    """Stored state rows + new daily units of some series (pandas) -> their state folded up to through_day
+
+    Every stored series advances to through_day (days without sales are
+    0 units); a new series starts at its first day with units.
+    """
+    series = pd.concat([state[SERIES_KEYS], sales[SERIES_KEYS]]).drop_duplicates(ignore_index=True)
+    series = series.merge(state[[f.name for f in STATE_SCHEMA.fields]], on=SERIES_KEYS, how="left")
+    if series.empty:
+        return series
+
+    rows = series[SERIES_KEYS].reset_index().merge(sales, on=SERIES_KEYS)
+    first_sale = rows.groupby("index")["epoch_day"].min().reindex(series.index).to_numpy()
+    stored = series["last_epoch_day"].notna().to_numpy()
+    begin = np.where(stored, series["last_epoch_day"].fillna(0).to_numpy() + 1, np.nan_to_num(first_sale))
+    begin = begin.astype("int64")
+
+    start = int(begin.min())
+    days = through_day - start + 1
+    if days <= 0:
+        return series[[f.name for f in STATE_SCHEMA.fields]]
+
+    # Dense units: one row per series, one column per day since start
+    units = np.zeros((len(series), days))
+    np.add.at(units, (rows["index"].to_numpy(), rows["epoch_day"].to_numpy() - start), rows["units"].to_numpy())
+
+    level = series["level"].fillna(0.0).to_numpy()
+    trend = series["trend"].fillna(0.0).to_numpy()
+    mse = series["mse"].fillna(0.0).to_numpy()
+    history = series["history_days"].fillna(0).to_numpy().astype("int64")
+    offset = begin - start
+
+    for day in range(days):
+        y = units[:, day]
+        active = offset <= day
+        started = active & (history > 0)
+        forecast = level + trend
+        new_level = np.where(started, alpha * y + (1 - alpha) * forecast, np.where(active, y, level))
+        trend = np.where(started, beta * (new_level - level) + (1 - beta) * trend, np.where(active, 0.0, trend))
+        mse = np.where(started, (1 - error_smoothing) * mse + error_smoothing * (y - forecast) ** 2, mse)
+        level = new_level
+        history = history + active
+
+    first_day = np.where(stored, series["first_epoch_day"].fillna(0).to_numpy(), begin)
+    return pd.DataFrame({
+        "product_id": series["product_id"],
+        "warehouse_id": series["warehouse_id"],
+        "first_epoch_day": first_day.astype("int32"),
+        "last_epoch_day": np.full(len(series), through_day, dtype="int32"),
+        "history_days": history.astype("int32"),
+        "level": level,
+        "trend": trend,
+        "mse": mse,
+    })
+
+
+# ----------------------------------------------------------
+# State refresh + reorder points (Spark)
+# ----------------------------------------------------------
+def fold_window(newest_day, since=None):
+    """(after_day, through_day) of the complete days not folded yet - None if there are none
+
+    The newest day of fact_sales may be partly loaded, so only the days
+    before it count as complete.
+    """
+    if newest_day is None:
+        return None
+    after_day = int(since) if since is not None else -1
+    through_day = newest_day - 1
+    if through_day <= after_day:
+        return None
+    return after_day, through_day
+
+
+def refresh_demand_state(spark, fact_path, inventory_path, state_path, watermarks_path, full=False,
+                         buckets=FORECAST_BUCKETS):
+    """Fold the complete fact_sales days since the last refresh into the demand state -> stats dict"""
+    df_fact = spark.read.format("delta").load(fact_path)
+    mark = {} if full else read_watermark(spark, watermarks_path, "ml_demand")
+    since = mark.get("column_watermark")
+    if since is not None and not DeltaTable.isDeltaTable(spark, state_path):
+        since = None
+
+    newest_day = df_fact.agg(spark_max(_epoch_days("order_date"))).collect()[0][0]
+    window = fold_window(newest_day, since)
+    if window is None:
+        return {"mode": "up to date", "days_folded": 0, "series": None}
+    after_day, through_day = window
+
+    if since is None:
+        df_state = spark.createDataFrame([], STATE_SCHEMA)
+    else:
+        df_state = spark.read.format("delta").load(state_path)
+    df_shares = warehouse_shares(spark.read.format("delta").load(inventory_path))
+    df_sales = daily_demand(df_fact, df_shares, after_day, through_day)
+
+    bucket = pmod(xxhash64(*[col(k) for k in SERIES_KEYS]), lit(buckets))
+
+    def fit(state, sales):
+        return fit_bucket(state, sales, through_day)
+
+    df_fitted = df_state.withColumn("_bucket", bucket).groupBy("_bucket") \
+        .cogroup(df_sales.withColumn("_bucket", bucket).groupBy("_bucket")) \
+        .applyInPandas(fit, STATE_SCHEMA)
+
+    # Every series advances, so the whole (1 row per series) state is rewritten
+    df_fitted.write.format("delta").mode("overwrite").option("overwriteSchema", True).save(state_path)
+    commit_watermark(spark, watermarks_path, "ml_demand", {"column_watermark": str(through_day)})
+
+    series = spark.read.format("delta").load(state_path).count()
+    if since is None:
+        return {"mode": "full", "days_folded": None, "series": series}
+    return {"mode": "incremental", "days_folded": through_day - after_day, "series": series}
+
+
+def reorder_points(df_state, df_inventory, lead_time_days=LEAD_TIME_DAYS, cover_days=COVER_DAYS,
+                   service_z=SERVICE_Z, min_history_days=MIN_HISTORY_DAYS):
+    """Demand state + latest inventory snapshot -> reorder point / quantity per (product_id, warehouse_id)
+
+    Every inventory row gets one; series without enough history keep the
+    static values (reorder_point_source = "static").
+    """
+    lead = float(lead_time_days)
+    latest = latest_per_key(df_inventory, SERIES_KEYS, "snapshot_date").select(
+        *SERIES_KEYS, "snapshot_date", "quantity_on_hand", "quantity_available",
+        col("reorder_point").alias("static_reorder_point"),
+        col("reorder_quantity").alias("static_reorder_quantity"))
+
+    # Forecast for day h ahead: level + h * trend; summed over h = 1..lead time
+    lead_demand = greatest(col("level") * lead + col("trend") * (lead * (lead + 1) / 2), lit(0.0))
+    safety_stock = lit(service_z) * sqrt(col("mse")) * lit(float(np.sqrt(lead)))
+    warm = coalesce(col("history_days"), lit(0)) >= min_history_days
+
+    return latest.join(df_state, SERIES_KEYS, "left") \
+        .withColumn("forecast_date", expr("date_add('" + EPOCH + "', last_epoch_day + 1)")) \
+        .withColumn("forecast_daily_units", round(greatest(col("level") + col("trend"), lit(0.0)), 2)) \
+        .withColumn("forecast_lead_time_units", round(lead_demand, 2)) \
+        .withColumn("demand_stddev", round(sqrt(col("mse")), 2)) \
+        .withColumn("safety_stock", round(safety_stock, 2)) \
+        .withColumn("reorder_point_source", when(warm, lit("forecast")).otherwise(lit("static"))) \
+        .withColumn("reorder_point",
+            when(warm, ceil(lead_demand + safety_stock).cast("int")).otherwise(col("static_reorder_point"))) \
+        .withColumn("reorder_quantity",
+            when(warm, greatest(ceil(col("forecast_daily_units") * cover_days).cast("int"), lit(1)))
+            .otherwise(col("static_reorder_quantity"))) \
+        .withColumn("needs_reorder", col("quantity_available") <= col("reorder_point")) \
+        .withColumn("history_days", coalesce(col("history_days"), lit(0))) \
+        .drop("first_epoch_day", "last_epoch_day", "level", "trend", "mse")
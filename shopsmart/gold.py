@@ -0,0 +1,213 @@
+# ============================================================
+# gold.py
+# ============================================================
+# PURPOSE:
+#   The star-schema builders of notebook 02 (and the Gold
+#   cells copied into notebook 1): dim_date, dim_customer,
+#   dim_product, fact_sales and agg_daily_sales.
+#
+# WHAT STAYS IN THE NOTEBOOK:
+#   Surrogate keys (keys.py), the SCD2 MERGE (scd2.py), the
+#   incremental month / day scoping, the writes and the
+#   layout check. The functions here only shape the rows.
+#
+# USAGE:
+#   df_dim_date = build_dim_date(spark)
+#   df_fact_sales = build_fact_sales(join_orders_items(df_orders, df_items))
+#   df_agg_daily = build_agg_daily_sales(df_fact)
+# ============================================================
+
+from pyspark.sql.functions import (avg, col, concat, count, countDistinct, current_timestamp, date_format,
+                                   dayofmonth, dayofweek, dayofyear, first, last_day, lit, month, quarter, round,
+                                   to_date, weekofyear, when, year)
+from pyspark.sql.functions import sum as spark_sum
+
+GOLD_VERSION = "1.0"
+
+DATE_START = "2024-01-01"
+DATE_END = "2026-12-31"
+
+# fact_sales physical layout (see layout.py)
+FACT_PARTITIONS = ["order_year", "order_month"]
+FACT_ZORDER_BY = ["customer_sk", "product_sk", "order_date_key"]
+
+# A change in any of these opens a new dim_customer version
+SCD2_TRACKED_COLUMNS = [
+    "loyalty_tier",
+    "address_street", "address_city", "address_state", "address_zip", "address_country",
+    "pref_categories", "pref_communication",
+]
+
+DIM_CUSTOMER_COLUMNS = [
+    "customer_sk", "customer_id", "first_name", "last_name", "first_name_initial", "last_name_initial",
+    "email_hash", "email_domain", "phone_masked", "gender", "date_of_birth", "age", "age_group",
+    "loyalty_tier", "registration_date", "customer_tenure_days", "tenure_category",
+    "address_street", "address_city", "address_state", "address_zip", "address_country",
+    "pref_categories", "pref_communication", "has_email",
+]
+
+
+def _gold_metadata():
+    return [current_timestamp().alias("_gold_processed_at"), lit(GOLD_VERSION).alias("_gold_version")]
+
+
+def build_dim_date(spark, start=DATE_START, end=DATE_END):
+    """One row per calendar day from start to end, with every date attribute dashboards group by"""
+    df_dates = spark.sql(
+        "SELECT explode(sequence(to_date('" + start + "'), to_date('" + end + "'), interval 1 day)) as date")
+
+    return df_dates.select(
+        date_format(col("date"), "yyyyMMdd").cast("int").alias("date_key"),
+        col("date").alias("full_date"),
+        year("date").alias("year"),
+        quarter("date").alias("quarter"),
+        month("date").alias("month"),
+        dayofmonth("date").alias("day"),
+        date_format("date", "MMMM").alias("month_name"),
+        date_format("date", "MMM").alias("month_short"),
+        dayofweek("date").alias("day_of_week"),
+        date_format("date", "EEEE").alias("day_name"),
+        date_format("date", "EEE").alias("day_short"),
+        weekofyear("date").alias("week_of_year"),
+        dayofyear("date").alias("day_of_year"),
+        when(dayofweek("date").isin(1, 7), lit(True)).otherwise(lit(False)).alias("is_weekend"),
+        when(dayofmonth("date") == 1, lit(True)).otherwise(lit(False)).alias("is_month_start"),
+        when(col("date") == last_day("date"), lit(True)).otherwise(lit(False)).alias("is_month_end"),
+        when(month("date").isin(11, 12, 1), lit(True)).otherwise(lit(False)).alias("is_holiday_season"),
+        concat(lit("Q"), quarter("date").cast("string"), lit("-"), year("date").cast("string")).alias("quarter_label"),
+        concat(date_format("date", "MMM"), lit("-"), year("date").cast("string")).alias("month_year_label"),
+        when(month("date") <= 6, lit(1)).otherwise(lit(2)).alias("half_year"),
+        when(month("date") <= 6, lit("H1")).otherwise(lit("H2")).alias("half_year_label")
+    )
+
+
+def build_dim_customer(df_keyed):
+    """Silver customers + customer_sk -> dim_customer rows (SCD2 columns are added by scd2_merge)"""
+    return df_keyed.select(*[col(c) for c in DIM_CUSTOMER_COLUMNS], *_gold_metadata())
+
+
+def build_dim_product(df_keyed):
+    """Silver products + product_sk -> dim_product rows"""
+    return df_keyed.select(
+        col("product_sk"),
+        col("product_id"),
+        col("product_name"),
+        col("category"),
+        col("sub_category"),
+        col("brand"),
+        col("supplier_id"),
+        col("price").alias("current_price"),
+        col("cost_price"),
+        col("profit_margin"),
+        col("margin_pct"),
+        col("price_tier"),
+        col("weight_kg"),
+        col("rating"),
+        col("review_count"),
+        col("rating_category"),
+        col("is_active"),
+        col("attr_battery_life"),
+        col("attr_colors"),
+        col("attr_connectivity"),
+        col("created_at").alias("product_created_at"),
+        col("updated_at").alias("product_updated_at"),
+        col("product_age_days"),
+        *_gold_metadata()
+    )
+
+
+def join_orders_items(df_orders, df_items):
+    """Silver orders INNER JOIN order_items (orphaned items drop out)"""
+    return df_orders.alias("o").join(
+        df_items.alias("i"),
+        col("o.order_id") == col("i.order_id"),
+        "inner"
+    )
+
+
+def build_fact_sales(df_joined):
+    """join_orders_items() rows -> fact_sales rows, one per order item (surrogate keys: layout.join_dimension_keys)"""
+    return df_joined.select(
+        # Primary key
+        col("i.item_id").alias("sales_key"),
+        # Dimension keys
+        date_format(col("o.order_date"), "yyyyMMdd").cast("int").alias("order_date_key"),
+        col("o.customer_id"),
+        col("i.product_id"),
+        # Degenerate dimensions
+        col("o.order_id"),
+        col("i.item_id"),
+        # Measures
+        col("i.quantity"),
+        col("i.unit_price"),
+        col("i.line_total"),
+        col("i.discount_percent"),
+        col("i.discount_amount"),
+        col("i.net_line_total"),
+        col("o.shipping_amount"),
+        # Order attributes
+        col("o.order_date"),
+        col("o.order_status"),
+        col("o.payment_method"),
+        col("o.channel"),
+        col("i.item_status"),
+        # Pre-computed flags
+        col("o.is_cancelled"),
+        col("o.is_returned"),
+        col("i.has_discount"),
+        col("o.is_weekend"),
+        col("o.has_free_shipping"),
+        # Time parts (for quick filtering without joining dim_date)
+        col("o.order_year"),
+        col("o.order_month"),
+        col("o.order_day"),
+        col("o.order_hour"),
+        col("o.day_name"),
+        *_gold_metadata()
+    )
+
+
+def place_surrogate_keys(df_fact, fact_columns):
+    """customer_sk / product_sk right after order_date_key"""
+    return df_fact.select(*fact_columns[:2], "customer_sk", "product_sk", *fact_columns[2:])
+
+
+def _rate(numerator):
+    return when(col("total_orders") > 0, round(col(numerator) / col("total_orders") * 100, 2)).otherwise(lit(0.0))
+
+
+def build_agg_daily_sales(df_fact):
+    """fact_sales rows -> one row per (day, channel) with order counts, revenue and rates"""
+    return df_fact.groupBy(
+        col("order_year"),
+        col("order_month"),
+        col("order_day"),
+        to_date(col("order_date")).alias("order_date"),
+        col("channel")
+    ).agg(
+        countDistinct("order_id").alias("total_orders"),
+        countDistinct("customer_id").alias("total_customers"),
+        count("*").alias("total_line_items"),
+        spark_sum("quantity").alias("total_items_sold"),
+        round(spark_sum("line_total"), 2).alias("gross_revenue"),
+        round(spark_sum("discount_amount"), 2).alias("total_discount"),
+        round(spark_sum("net_line_total"), 2).alias("net_revenue"),
+        round(spark_sum("shipping_amount"), 2).alias("total_shipping"),
+        round(avg("net_line_total"), 2).alias("avg_item_value"),
+        round(avg("quantity"), 2).alias("avg_quantity_per_item"),
+        countDistinct(when(col("order_status") == "CANCELLED", col("order_id"))).alias("cancelled_orders"),
+        countDistinct(when(col("order_status") == "RETURNED", col("order_id"))).alias("returned_orders"),
+        countDistinct(when(col("order_status") == "DELIVERED", col("order_id"))).alias("delivered_orders"),
+        countDistinct(when(col("has_discount") == True, col("order_id"))).alias("orders_with_discount"),  # noqa: E712
+        first("is_weekend").alias("is_weekend"),
+        first("day_name").alias("day_name")
+    ) \
+        .withColumn("avg_order_value",
+            when(col("total_orders") > 0,
+                round(col("net_revenue") / col("total_orders"), 2))
+            .otherwise(lit(0.0))) \
+        .withColumn("cancel_rate_pct", _rate("cancelled_orders")) \
+        .withColumn("return_rate_pct", _rate("returned_orders")) \
+        .withColumn("discount_rate_pct", _rate("orders_with_discount")) \
+        .withColumn("_gold_processed_at", current_timestamp()) \
+        .withColumn("_gold_version", lit(GOLD_VERSION))
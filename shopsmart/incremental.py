@@ -0,0 +1,276 @@
+# ============================================================
+# incremental.py
+# ============================================================
+# PURPOSE:
+#   Incremental Bronze -> Silver loads: read only what changed
+#   since the last run and MERGE it into Silver, instead of
+#   rebuilding every Silver table from the full history.
+#   Gold uses the same watermarks (on _silver_processed_at) to
+#   rewrite only the partitions / days Silver changed.
+#
+# HOW IT WORKS:
+#   1. A high-water mark per source lives in a small Delta
+#      table (silver/_watermarks):
+#        - file_watermark:   newest Bronze file modification time
+#        - column_watermark: newest value of a change column
+#                            (e.g. orders.updated_at), optional -
+#                            recorded, never used to drop rows
+#   2. read_new_bronze() lists only files modified after the
+#      file watermark (Spark's modifiedAfter option, applied at
+#      file listing time) and returns EVERY row in them. A new
+#      or regenerated file may carry rows whose updated_at is
+#      older than the last run's newest: the MERGE's
+#      latest-updated_at rule decides whether they win, a row
+#      filter would lose them for good.
+#   3. upsert_latest() dedups the new rows (latest updated_at
+#      wins), then MERGEs them into Silver with the same rule,
+#      touching only the partitions present in the batch plus
+#      the ones that hold its keys today: an order whose
+#      order_date moved to another month must still match its
+#      old row, not be inserted a second time.
+#      Event data (never updated, only re-delivered) uses
+#      append_new(): an insert-only MERGE that never rewrites an
+#      existing file, so streams reading the table keep working.
+#      Its partition comes from the event itself, so with
+#      fixed_partitions=True the key lookup is skipped.
+#   4. commit_watermark() moves the watermark - only after the
+#      MERGE succeeded. A failed run simply re-reads the same
+#      files next time, and the MERGE makes that harmless.
+#   5. With no new files there is nothing to infer a schema
+#      from, so the Bronze schema is stored with the watermark
+#      and an empty DataFrame flows through the same cells.
+#
+# USAGE:
+#   df, pending = read_new_bronze(spark, path, "csv", "orders", WATERMARKS,
+#                                 watermark_column="updated_at", header=True)
+#   ... transform df ...
+#   upsert_latest(spark, df_silver, SILVER + "/orders", ["order_id"],
+#                 latest_by="updated_at", partition_by=["order_year", "order_month"])
+#   commit_watermark(spark, WATERMARKS, "orders", pending)
+#
+#   Gold:
+#   replace_partitions(df_fact, GOLD + "/fact_sales", ["order_year", "order_month"], partitions)
+#   merge_slice(spark, df_agg, GOLD + "/agg_daily_sales", ["order_date", "channel"],
+#               "order_date", affected_days)
+# ============================================================
+
+import json
+
+from delta.tables import DeltaTable
+from pyspark.sql.functions import col, current_timestamp, date_format, row_number
+from pyspark.sql.functions import max as spark_max
+from pyspark.sql.types import LongType, StringType, StructField, StructType
+from pyspark.sql.utils import AnalysisException
+from pyspark.sql.window import Window
+
+# Same format Spark expects for modifiedAfter (session time zone)
+WATERMARK_FORMAT = "yyyy-MM-dd'T'HH:mm:ss"
+
+WATERMARK_SCHEMA = StructType([
+    StructField("source", StringType(), False),
+    StructField("file_watermark", StringType(), True),
+    StructField("column_watermark", StringType(), True),
+    StructField("rows_processed", LongType(), True),
+    StructField("bronze_schema", StringType(), True),
+])
+
+
+def read_watermark(spark, watermarks_path, source):
+    """The source's row in the watermark table as a dict ({} before the first commit)"""
+    try:
+        rows = spark.read.format("delta").load(watermarks_path) \
+            .filter(col("source") == source) \
+            .collect()
+    except AnalysisException:
+        return {}   # first run: no watermark table yet
+    return rows[0].asDict() if rows else {}
+
+
+def read_new_bronze(spark, path, fmt, source, watermarks_path, watermark_column=None, full=False, schema=None,
+                    **options):
+    """Bronze rows added since the last committed run -> (DataFrame, pending watermark or None)
+
+    Files are selected by the file watermark only; every row of a new file
+    is returned (upsert_latest(latest_by=...) keeps the newest per key).
+    full=True reads everything (first load / backfill) but still returns
+    the watermark to commit, so the next incremental run starts after it.
+    watermark_column: change column whose newest value is recorded with the watermark.
+    schema: explicit StructType (see schemas.bronze_schema) - no inference pass.
+    """
+    mark = {} if full else read_watermark(spark, watermarks_path, source)
+
+    reader = spark.read.format(fmt).options(**options)
+    if schema is not None:
+        reader = reader.schema(schema)
+    if mark.get("file_watermark"):
+        reader = reader.option("modifiedAfter", mark["file_watermark"])
+    try:
+        df = reader.load(path)
+    except AnalysisException:
+        if not mark.get("bronze_schema"):
+            raise
+        # Every file is older than the watermark: nothing new, same columns as last time
+        if schema is None:
+            schema = StructType.fromJson(json.loads(mark["bronze_schema"]))
+        return spark.createDataFrame([], schema), None
+
+    aggs = [date_format(spark_max(col("_metadata.file_modification_time")), WATERMARK_FORMAT)
+            .alias("file_watermark")]
+    if watermark_column:
+        aggs.append(date_format(spark_max(col(watermark_column).cast("timestamp")), "yyyy-MM-dd HH:mm:ss")
+                    .alias("column_watermark"))
+    stats = df.agg(*aggs).collect()[0]
+
+    pending = {
+        "file_watermark": stats["file_watermark"] or mark.get("file_watermark"),
+        "column_watermark": (stats["column_watermark"] if watermark_column else None) or mark.get("column_watermark"),
+        "bronze_schema": df.schema.json(),
+    }
+    return df, pending
+
+
+def commit_watermark(spark, watermarks_path, source, pending, rows_processed=None):
+    """Move the source's watermark forward - call only after Silver was written"""
+    if pending is None:
+        return
+    update = spark.createDataFrame(
+        [(source, pending.get("file_watermark"), pending.get("column_watermark"), rows_processed,
+          pending.get("bronze_schema"))],
+        WATERMARK_SCHEMA,
+    ).withColumn("updated_at", current_timestamp())
+
+    if not DeltaTable.isDeltaTable(spark, watermarks_path):
+        update.write.format("delta").mode("overwrite").save(watermarks_path)
+        return
+    DeltaTable.forPath(spark, watermarks_path).alias("t") \
+        .merge(update.alias("s"), "t.source = s.source") \
+        .whenMatchedUpdateAll() \
+        .whenNotMatchedInsertAll() \
+        .execute()
+
+
+def latest_per_key(df, keys, latest_by):
+    """One row per key - the one with the newest latest_by (same rule as the full-load dedup)"""
+    window = Window.partitionBy(*keys).orderBy(col(latest_by).desc())
+    return df.withColumn("_row_num", row_number().over(window)) \
+        .filter(col("_row_num") == 1) \
+        .drop("_row_num")
+
+
+def _merge_into(spark, df, path, keys, partition_by, fixed_partitions=False):
+    """MERGE builder of df into the table at path on keys - None if df was empty or created the table
+
+    fixed_partitions: a key's partition values never change, so the
+    batch's own partitions are the only ones that can hold its keys
+    """
+    exists = DeltaTable.isDeltaTable(spark, path)
+    if exists and df.isEmpty():
+        return None
+    if not exists:
+        writer = df.write.format("delta").mode("overwrite")
+        if partition_by:
+            writer = writer.partitionBy(*partition_by)
+        writer.save(path)
+        return None
+
+    condition = " AND ".join("t." + k + " = s." + k for k in keys)
+    if partition_by:
+        # Literal partition values let Delta skip every other partition's files
+        batch = df.select(*partition_by)
+        if not fixed_partitions:
+            # Where the batch's keys are now (key + partition columns only)
+            held = spark.read.format("delta").load(path) \
+                .join(df.select(*keys).distinct(), keys, "left_semi") \
+                .select(*partition_by)
+            batch = batch.union(held)
+        partitions = batch.distinct().collect()
+        if partitions:
+            condition += " AND " + partition_predicate(partitions, partition_by, alias="t")
+    return DeltaTable.forPath(spark, path).alias("t").merge(df.alias("s"), condition)
+
+
+def upsert_latest(spark, df, path, keys, latest_by=None, partition_by=None):
+    """MERGE a batch into a Silver Delta table (created on first use)
+
+    keys:         business key(s) to match on
+    latest_by:    only overwrite an existing row if the new one is at least as recent
+    partition_by: partition columns - the MERGE is limited to the partitions in the
+                  batch and the ones holding its keys (a key may change partition)
+    """
+    if latest_by:
+        df = latest_per_key(df, keys, latest_by)
+    else:
+        df = df.dropDuplicates(keys)
+
+    merge = _merge_into(spark, df, path, keys, partition_by)
+    if merge is None:
+        return
+    if latest_by:
+        merge = merge.whenMatchedUpdateAll(condition="s." + latest_by + " >= t." + latest_by)
+    else:
+        merge = merge.whenMatchedUpdateAll()
+    merge.whenNotMatchedInsertAll().execute()
+
+
+def append_new(spark, df, path, keys, partition_by=None, fixed_partitions=False):
+    """Insert the rows whose keys the Delta table doesn't have yet (created on first use)
+
+    Insert-only MERGE: existing rows are never rewritten, so the table
+    stays append-only - a stream reading it never sees a data update,
+    whether a batch is retried or an event re-delivered.
+    fixed_partitions: the partition values are derived from immutable
+    fields (e.g. the event date) - only the batch's partitions are checked
+    """
+    merge = _merge_into(spark, df.dropDuplicates(keys), path, keys, partition_by, fixed_partitions)
+    if merge is not None:
+        merge.whenNotMatchedInsertAll().execute()
+
+
+def partition_predicate(partitions, partition_by, alias=None):
+    """SQL predicate matching exactly the given partition value tuples, e.g. for replaceWhere"""
+    prefix = alias + "." if alias else ""
+    return "(" + " OR ".join(
+        "(" + " AND ".join(_sql_equals(prefix + c, v) for c, v in zip(partition_by, p)) + ")"
+        for p in partitions
+    ) + ")"
+
+
+def replace_partitions(df, path, partition_by, partitions):
+    """Overwrite only the listed partitions of a partitioned Delta table (replaceWhere)
+
+    A listed partition with no rows left in df ends up empty - unlike
+    dynamic partition overwrite, which only replaces partitions present in df.
+    """
+    df.write \
+        .format("delta") \
+        .mode("overwrite") \
+        .option("replaceWhere", partition_predicate(partitions, partition_by)) \
+        .save(path)
+
+
+def merge_slice(spark, df, path, keys, slice_column, slice_values):
+    """Make the rows of a Delta table with slice_column IN slice_values equal to df
+
+    Rows are updated / inserted by key; rows inside the slice that df no
+    longer has are deleted. Everything outside the slice is left alone.
+    """
+    in_slice = "t." + slice_column + " IN (" + ", ".join(_sql_literal(v) for v in slice_values) + ")"
+    condition = " AND ".join("t." + k + " = s." + k for k in keys) + " AND " + in_slice
+    DeltaTable.forPath(spark, path).alias("t") \
+        .merge(df.alias("s"), condition) \
+        .whenMatchedUpdateAll() \
+        .whenNotMatchedInsertAll() \
+        .whenNotMatchedBySourceDelete(condition=in_slice) \
+        .execute()
+
+
+def _sql_equals(column, value):
+    if value is None:
+        return column + " IS NULL"
+    return column + " = " + _sql_literal(value)
+
+
+def _sql_literal(value):
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
@@ -0,0 +1,254 @@
+# ============================================================
+# ingestor.py
+# ============================================================
+# PURPOSE:
+#   Continuous Event Hub -> Bronze ingestion in micro-batches,
+#   replacing "receive on a thread for 15 seconds, then parse".
+#
+# HOW IT WORKS:
+#   1. consumer.receive_batch() runs on a background thread and
+#      hands events to a bounded buffer per partition. When a
+#      buffer is full the callback waits, which stalls that
+#      partition's receive loop - driver memory stays flat.
+#   2. The driver thread cuts a micro-batch when enough events
+#      are buffered (max_batch_events) or the oldest one has
+#      waited max_batch_seconds, and calls write_batch() once.
+#   3. Only after the write succeeds is each partition
+#      checkpointed - once per batch, at its last event. A
+#      crash replays the unwritten batch (at-least-once).
+#
+#   The consumer is anything with EventHubConsumerClient's
+#   receive_batch() / close() (see LocalQueueSource for tests).
+#
+#   Payloads reach write_batch() as str (JSON) or bytes (the
+#   binary wire format of wire.py, told apart by its first
+#   byte) - producers may mix both.
+#
+# USAGE:
+#   ingestor = MicroBatchIngestor(consumer, BronzeClickstreamWriter(spark, path, "eh-clickstream"))
+#   ingestor.run(duration_seconds=300, idle_timeout_seconds=30)
+# ============================================================
+
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from shopsmart.wire import MAGIC
+
+DEFAULT_BATCH_EVENTS = 50_000
+DEFAULT_BATCH_SECONDS = 2.0
+DEFAULT_BUFFER_EVENTS = 100_000   # per partition
+RECEIVE_BATCH_SIZE = 1000         # events per receive_batch callback
+
+
+def event_payload(event):
+    """EventData -> bytes for a wire-format message, str (JSON text) otherwise"""
+    body = event.body
+    body = body if isinstance(body, bytes) else b"".join(body)
+    return body if body[:1] == MAGIC else body.decode("utf-8")
+
+
+class _PartitionBuffer:
+    """Events received for one partition since the last micro-batch"""
+
+    def __init__(self):
+        self.payloads = []
+        self.context = None        # partition_context to checkpoint with
+        self.last_event = None     # checkpoint position after the batch is written
+        self.first_enqueued = None
+
+
+class MicroBatchIngestor:
+    """Bounded, checkpointed micro-batch ingestion from an Event Hub consumer"""
+
+    def __init__(self, consumer, write_batch, max_batch_events=DEFAULT_BATCH_EVENTS,
+                 max_batch_seconds=DEFAULT_BATCH_SECONDS, max_buffer_events=DEFAULT_BUFFER_EVENTS,
+                 starting_position="-1", verbose=True):
+        self.consumer = consumer
+        self.write_batch = write_batch    # write_batch(payloads, batch_id) -> rows written
+        self.max_batch_events = max_batch_events
+        self.max_batch_seconds = max_batch_seconds
+        self.max_buffer_events = max_buffer_events
+        self.starting_position = starting_position
+        self.verbose = verbose
+
+        self._cond = threading.Condition()
+        self._buffers = {}
+        self._buffered = 0
+        self._batch_started = None   # monotonic time the oldest buffered event arrived
+        self._last_receive = None
+        self._stopping = False
+        self._receive_error = None
+
+        self.batches = 0
+        self.events = 0
+        self.max_lag_seconds = 0.0
+        self.history = []   # one dict per written micro-batch
+
+    # ---------- receive side (background thread) ----------
+
+    def _on_event_batch(self, partition_context, events):
+        if not events:
+            return
+        with self._cond:
+            buffer = self._buffers.get(partition_context.partition_id)
+            if buffer is None:
+                buffer = self._buffers[partition_context.partition_id] = _PartitionBuffer()
+            # Backpressure: hold this partition until the driver has written its buffer
+            while len(buffer.payloads) >= self.max_buffer_events and not self._stopping:
+                self._cond.wait(0.5)
+                buffer = self._buffers.setdefault(partition_context.partition_id, _PartitionBuffer())
+            buffer.payloads.extend(event_payload(event) for event in events)
+            buffer.context = partition_context
+            buffer.last_event = events[-1]
+            if buffer.first_enqueued is None:
+                buffer.first_enqueued = events[0].enqueued_time
+            self._buffered += len(events)
+            self._last_receive = time.monotonic()
+            if self._batch_started is None:
+                self._batch_started = self._last_receive
+            self._cond.notify_all()
+
+    def _receive(self):
+        try:
+            self.consumer.receive_batch(
+                on_event_batch=self._on_event_batch,
+                max_batch_size=RECEIVE_BATCH_SIZE,
+                max_wait_time=1,
+                starting_position=self.starting_position,
+            )
+        except Exception as e:
+            self._receive_error = e
+        finally:
+            with self._cond:
+                self._cond.notify_all()
+
+    # ---------- driver side ----------
+
+    def _batch_due(self):
+        if self._buffered >= self.max_batch_events:
+            return True
+        return self._buffered > 0 and time.monotonic() - self._batch_started >= self.max_batch_seconds
+
+    def _take_buffers(self):
+        """Swap the buffers out under the lock, so receiving continues during the write"""
+        with self._cond:
+            buffers, self._buffers = self._buffers, {}
+            self._buffered = 0
+            self._batch_started = None
+            self._cond.notify_all()
+        return [b for b in buffers.values() if b.payloads]
+
+    def _flush(self):
+        buffers = self._take_buffers()
+        if not buffers:
+            return
+        payloads = [p for b in buffers for p in b.payloads]
+        batch_id = "stream_" + time.strftime("%Y%m%d_%H%M%S") + "_" + str(self.batches).zfill(5)
+
+        write_start = time.perf_counter()
+        rows = self.write_batch(payloads, batch_id)
+        write_seconds = time.perf_counter() - write_start
+
+        # Written - now it is safe to move every partition's checkpoint past this batch
+        for buffer in buffers:
+            buffer.context.update_checkpoint(buffer.last_event)
+
+        oldest = min(b.first_enqueued for b in buffers)
+        lag = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+        self.batches += 1
+        self.events += len(payloads)
+        self.max_lag_seconds = max(self.max_lag_seconds, lag)
+        self.history.append({"batch_id": batch_id, "events": len(payloads), "rows": rows,
+                             "partitions": len(buffers), "write_seconds": write_seconds,
+                             "lag_seconds": lag})
+        if self.verbose:
+            print("  " + batch_id + ": " + format(len(payloads), ",").rjust(8) + " events from "
+                  + str(len(buffers)) + " partition(s) | write " + str(round(write_seconds, 2))
+                  + "s | lag " + str(round(lag, 2)) + "s")
+
+    def run(self, duration_seconds=None, idle_timeout_seconds=None):
+        """Ingest until duration_seconds have passed or nothing arrived for idle_timeout_seconds"""
+
+        receiver = threading.Thread(target=self._receive, name="eventhub-receiver", daemon=True)
+        start = time.monotonic()
+        self._last_receive = start
+        receiver.start()
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._batch_due() or self._receive_error is not None or not receiver.is_alive(),
+                        timeout=0.1)
+                    due = self._batch_due()
+                    idle_for = time.monotonic() - self._last_receive if self._buffered == 0 else 0.0
+                if due:
+                    self._flush()
+                if self._receive_error is not None:
+                    raise self._receive_error
+                if not receiver.is_alive():
+                    break
+                if duration_seconds and time.monotonic() - start >= duration_seconds:
+                    break
+                if idle_timeout_seconds and idle_for >= idle_timeout_seconds:
+                    break
+        finally:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+            self.consumer.close()
+            receiver.join(timeout=30)
+        # Whatever arrived before the consumer closed still gets written + checkpointed
+        self._flush()
+        return self.summary()
+
+    def summary(self):
+        return {"batches": self.batches, "events": self.events, "max_lag_seconds": self.max_lag_seconds}
+
+
+class _LocalEvent:
+    """The bits of azure.eventhub.EventData the ingestor uses"""
+
+    def __init__(self, body, enqueued_time):
+        self._body = body
+        self.enqueued_time = enqueued_time
+
+    @property
+    def body(self):
+        return self._body if isinstance(self._body, bytes) else self._body.encode("utf-8")
+
+
+class _LocalPartitionContext:
+    def __init__(self, source, partition_id):
+        self._source = source
+        self.partition_id = partition_id
+
+    def update_checkpoint(self, event):
+        self._source.checkpoints[self.partition_id] = event
+
+
+class LocalQueueSource:
+    """receive_batch() over a queue of (partition_id, [payload, ...]) - e.g. sinks.QueueSink.queue"""
+
+    def __init__(self, source_queue):
+        self.queue = source_queue
+        self.checkpoints = {}   # partition id -> last checkpointed event
+        self._closed = threading.Event()
+
+    def receive_batch(self, on_event_batch, max_batch_size=RECEIVE_BATCH_SIZE, max_wait_time=1, **kwargs):
+        contexts = {}
+        while not self._closed.is_set():
+            try:
+                partition_id, payloads = self.queue.get(timeout=max_wait_time)
+            except queue.Empty:
+                continue
+            if partition_id not in contexts:
+                contexts[partition_id] = _LocalPartitionContext(self, partition_id)
+            now = datetime.now(timezone.utc)
+            events = [_LocalEvent(p, now) for p in payloads]
+            for i in range(0, len(events), max_batch_size):
+                on_event_batch(contexts[partition_id], events[i:i + max_batch_size])
+
+    def close(self):
+        self._closed.set()
@@ -0,0 +1,100 @@
+# ============================================================
+# keys.py
+# ============================================================
+# PURPOSE:
+#   Stable surrogate keys for the Gold dimensions.
+#
+# WHY NOT row_number().over(Window.orderBy(...))?
+#   1. A window with no partitionBy pulls every row into ONE
+#      task - fine for 500 customers, not for 50 million.
+#   2. Keys are recomputed each run: a new customer_id that
+#      sorts between two old ones shifts every key after it,
+#      and every fact row pointing at those keys is now wrong.
+#
+# HOW IT WORKS:
+#   1. A key map per dimension lives in Delta
+#      (gold/_keys/<name>: business key -> surrogate key).
+#      Once a key is in the map it never changes.
+#   2. Business keys not in the map yet are found with a
+#      left_anti join, sorted (range partitioned - all tasks)
+#      and numbered after the current max key: a count per
+#      sorted partition gives each partition its first key,
+#      row_number() numbers the rows inside it. Numbering stays
+#      parallel and dense, and uses DataFrames only (no RDD
+#      API - shared / Unity Catalog clusters have none).
+#   3. The new keys are appended to the map, and the batch is
+#      joined to the map to pick up every key.
+#
+#   On the first run the map is empty, so keys come out in
+#   business-key order from 1 - same as the old row_number().
+#   Runs must not assign keys for the same map concurrently.
+#
+# USAGE:
+#   df_dim, new_keys = assign_surrogate_keys(
+#       spark, df_cust_silver, ["customer_id"], "customer_sk", GOLD + "/_keys/customer")
+# ============================================================
+
+from pyspark.sql.functions import broadcast, col, current_timestamp, lit, row_number, spark_partition_id
+from pyspark.sql.functions import max as spark_max
+from pyspark.sql.functions import sum as spark_sum
+from pyspark.sql.utils import AnalysisException
+from pyspark.sql.window import Window
+
+
+def read_key_map(spark, map_path, keys, sk_column):
+    """business key(s) -> surrogate key, or None before the first assignment"""
+    try:
+        return spark.read.format("delta").load(map_path).select(*keys, sk_column)
+    except AnalysisException:
+        return None
+
+
+def _max_key(key_map, sk_column):
+    if key_map is None:
+        return 0
+    return key_map.agg(spark_max(sk_column)).collect()[0][0] or 0
+
+
+def number_keys(df, keys, sk_column, offset=0):
+    """Distinct business keys -> + sk_column numbered offset+1, offset+2, ... in key order
+
+    The sorted rows are persisted: both the per-partition counts and the
+    numbering must see the same range partitioning. Call unpersist() on
+    the second return value once the result is written.
+    """
+    ordered = df.orderBy(*keys).withColumn("_part", spark_partition_id()).persist()
+    starts = ordered.groupBy("_part").count() \
+        .withColumn("_start", spark_sum("count").over(Window.orderBy("_part")) - col("count")) \
+        .select("_part", "_start")
+    numbered = ordered.join(broadcast(starts), "_part") \
+        .withColumn(sk_column, (lit(offset) + col("_start")
+                                + row_number().over(Window.partitionBy("_part").orderBy(*keys))).cast("long")) \
+        .drop("_part", "_start")
+    return numbered, ordered
+
+
+def assign_surrogate_keys(spark, df, keys, sk_column, map_path):
+    """df + sk_column, giving keys only to unseen business keys -> (DataFrame, new key count)
+
+    Rows with a null business key get a null surrogate key.
+    """
+    key_map = read_key_map(spark, map_path, keys, sk_column)
+    offset = _max_key(key_map, sk_column)
+
+    new_keys = df.select(*keys).dropna().distinct()
+    if key_map is not None:
+        new_keys = new_keys.join(key_map.select(*keys), keys, "left_anti")
+
+    numbered, ordered = number_keys(new_keys, keys, sk_column, offset)
+    numbered \
+        .withColumn("_assigned_at", current_timestamp()) \
+        .write \
+        .format("delta") \
+        .mode("append") \
+        .save(map_path)
+    ordered.unpersist()
+
+    key_map = read_key_map(spark, map_path, keys, sk_column)
+    new_count = _max_key(key_map, sk_column) - offset
+    return df.join(key_map, keys, "left"), new_count
+
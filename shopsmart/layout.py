@@ -0,0 +1,247 @@
+# ============================================================
+# layout.py
+# ============================================================
+# PURPOSE:
+#   Physical layout of the Gold tables: broadcast the small
+#   dimension lookups, keep files near a target size and
+#   cluster the data on the keys BI queries filter by.
+#
+# WHY?
+#   Partitioning by (order_year, order_month) only helps
+#   queries that filter on time. "Sales of customer X" or
+#   "sales of product Y" read every file of every month,
+#   because each file holds a random mix of customers and
+#   products. Z-ordering on customer_sk / product_sk /
+#   order_date_key sorts the rows so each file covers a narrow
+#   range of those keys - Delta's per-file min/max statistics
+#   then skip most files.
+#
+# HOW IT WORKS:
+#   1. join_dimension_keys() - fact -> surrogate keys from the
+#      key maps, broadcast when the map is small (no shuffle
+#      of the fact rows).
+#   2. layout_stats() - per-file size, row count and key
+#      ranges of a table (or a few partitions of it), from
+#      the Delta log alone: every live file's add action
+#      carries its size, partition values and min/max stats.
+#      Not a single data file is read. log_rows() adds up
+#      the same stats into the table's row count.
+#   3. needs_optimize() - reasons to re-optimize: too many
+#      small files, skewed file sizes, or files covering too
+#      much of the key range (clustering has decayed).
+#      Partition skew is reported too, but OPTIMIZE can't fix
+#      it - a busy month is simply bigger.
+#   4. optimize_table() - OPTIMIZE ... ZORDER BY, limited to
+#      the given partitions.
+#
+#   Liquid clustering (CLUSTER BY) can't be used on a
+#   partitioned table, so fact_sales keeps its month
+#   partitions and uses Z-order inside them.
+#
+# USAGE:
+#   df_fact = join_dimension_keys(spark, df_fact, [
+#       (GOLD + "/_keys/customer", ["customer_id"], "customer_sk")])
+#   stats = layout_stats(spark, path, ["order_year", "order_month"], ["customer_sk"])
+#   if needs_optimize(stats):
+#       optimize_table(spark, path, ["customer_sk"])
+# ============================================================
+
+from pyspark.sql.functions import (broadcast, coalesce, col, count, expr, from_json, get_json_object, lit,
+                                   percentile_approx, regexp_extract, row_number)
+from pyspark.sql.functions import max as spark_max
+from pyspark.sql.functions import min as spark_min
+from pyspark.sql.functions import sum as spark_sum
+from pyspark.sql.types import LongType, MapType, StringType, StructField, StructType
+from pyspark.sql.utils import AnalysisException
+from pyspark.sql.window import Window
+
+TARGET_FILE_SIZE = 128 * 1024 * 1024
+# On-disk (compressed) size below which a lookup table is broadcast
+BROADCAST_MAX_BYTES = 64 * 1024 * 1024
+
+SMALL_FILE_FRACTION = 0.25       # a file under 1/4 of the target is "small"
+MAX_SMALL_FILE_RATIO = 0.5       # ... and more than half the files small -> compact
+MAX_FILE_SKEW = 8.0              # largest file vs the median one
+MAX_KEY_RANGE_FRACTION = 0.5     # average file covers more than half the key range
+
+# The parts of a log action layout_stats() / log_rows() need
+_ADD = StructType([
+    StructField("path", StringType()),
+    StructField("partitionValues", MapType(StringType(), StringType())),
+    StructField("size", LongType()),
+    StructField("stats", StringType()),
+    StructField("deletionVector", StructType([StructField("cardinality", LongType())])),
+])
+_ACTIONS = StructType([
+    StructField("add", _ADD),
+    StructField("remove", StructType([StructField("path", StringType())])),
+])
+
+
+def table_detail(spark, path):
+    """DESCRIBE DETAIL of a Delta table as a dict (numFiles, sizeInBytes, partitionColumns, ...)"""
+    return spark.sql("DESCRIBE DETAIL delta.`" + path + "`").collect()[0].asDict()
+
+
+def join_dimension_keys(spark, df, dimensions, max_broadcast_bytes=BROADCAST_MAX_BYTES):
+    """df + one surrogate key column per dimension -> DataFrame
+
+    dimensions: [(key map path, business key columns, sk column), ...]
+    Maps smaller than max_broadcast_bytes on disk are broadcast.
+    """
+    for path, keys, sk_column in dimensions:
+        lookup = spark.read.format("delta").load(path).select(*keys, sk_column)
+        if table_detail(spark, path)["sizeInBytes"] <= max_broadcast_bytes:
+            lookup = broadcast(lookup)
+        df = df.join(lookup, keys, "left")
+    return df
+
+
+def set_target_file_size(spark, path, target_bytes=TARGET_FILE_SIZE):
+    """Target size for files written by OPTIMIZE / auto compaction on this table"""
+    spark.sql("ALTER TABLE delta.`" + path + "` SET TBLPROPERTIES "
+              "('delta.targetFileSize' = '" + str(target_bytes) + "')")
+
+
+def log_files(spark, path):
+    """Live data files of a Delta table from its _delta_log -> DataFrame (path, partitionValues, size, stats, ...)
+
+    Replays the latest checkpoint plus the commits after it: the newest
+    action per file wins, a file is live if that action is an add.
+    Classic (single / multi-part) checkpoints only.
+    """
+    log = path.rstrip("/") + "/_delta_log"
+    try:
+        checkpoint = spark.read.json(log + "/_last_checkpoint").collect()[0]["version"]
+    except AnalysisException:
+        checkpoint = None   # no checkpoint yet: the commits are the whole log
+
+    actions = spark.read.schema(_ACTIONS).json(log + "/*.json") \
+        .withColumn("_version", regexp_extract(col("_metadata.file_name"), r"^(\d+)\.json$", 1).cast("long"))
+    actions = actions.filter(col("_version").isNotNull())   # skip compacted logs
+    if checkpoint is not None:
+        actions = actions.filter(col("_version") > checkpoint).unionByName(
+            spark.read.schema(_ACTIONS).parquet(log + "/" + str(checkpoint).zfill(20) + ".checkpoint*.parquet")
+            .withColumn("_version", lit(checkpoint)))
+
+    latest = Window.partitionBy("_path").orderBy(col("_version").desc(), col("add").isNotNull().desc())
+    return actions.filter(col("add").isNotNull() | col("remove").isNotNull()) \
+        .withColumn("_path", expr("coalesce(add.path, remove.path)")) \
+        .withColumn("_n", row_number().over(latest)) \
+        .filter((col("_n") == 1) & col("add").isNotNull()) \
+        .select("add.*")
+
+
+def log_rows(spark, path):
+    """Row count of a Delta table from the numRecords stats of its live files, None if a file has no stats
+
+    Rows soft-deleted by a deletion vector are subtracted.
+    """
+    totals = log_files(spark, path).select(
+        get_json_object("stats", "$.numRecords").cast("long").alias("_rows"),
+        coalesce(col("deletionVector.cardinality"), lit(0)).alias("_deleted"),
+    ).agg(
+        count(lit(1)).alias("files"),
+        count("_rows").alias("files_with_stats"),
+        spark_sum("_rows").alias("rows"),
+        spark_sum("_deleted").alias("deleted"),
+    ).collect()[0]
+    if totals["files_with_stats"] < totals["files"]:
+        return None
+    return (totals["rows"] or 0) - (totals["deleted"] or 0)
+
+
+def layout_stats(spark, path, partition_by, cluster_by=(), where=None, target_bytes=TARGET_FILE_SIZE):
+    """File count / size / skew / key-range statistics of a Delta table -> dict
+
+    where: SQL predicate on partition columns to look at only some partitions.
+    key_range_fraction[c]: how much of the key range of c an average file
+    covers (1.0 = every lookup of c reads every file). Read from the
+    per-file min/max stats in the Delta log - a column without stats
+    (past delta.dataSkippingNumIndexedCols) gets no entry.
+    """
+    schema = spark.read.format("delta").load(path).schema   # metadata only
+    keys = StructType([schema[c] for c in cluster_by])
+    stats = StructType([StructField("numRecords", LongType()),
+                        StructField("minValues", keys), StructField("maxValues", keys)])
+
+    files = log_files(spark, path).select(
+        *[col("partitionValues")[c].cast(schema[c].dataType).alias(c) for c in partition_by],
+        col("size").alias("_bytes"),
+        from_json("stats", stats).alias("_stats"))
+    if where:
+        files = files.filter(expr(where))
+    files = files.select(
+        *partition_by, "_bytes",
+        col("_stats.numRecords").alias("_rows"),
+        *[col("_stats.minValues")[c].alias("_min_" + c) for c in cluster_by],
+        *[col("_stats.maxValues")[c].alias("_max_" + c) for c in cluster_by],
+    ).cache()
+
+    small = target_bytes * SMALL_FILE_FRACTION
+    totals = files.agg(
+        count(lit(1)).alias("files"),
+        spark_sum(expr("CASE WHEN _bytes < " + str(int(small)) + " THEN 1 ELSE 0 END")).alias("small_files"),
+        spark_sum("_bytes").alias("bytes"),
+        spark_sum("_rows").alias("rows"),
+        spark_max("_bytes").alias("max_file_bytes"),
+        percentile_approx("_bytes", 0.5).alias("median_file_bytes"),
+        *[spark_min("_min_" + c).alias("_lo_" + c) for c in cluster_by],
+        *[spark_max("_max_" + c).alias("_hi_" + c) for c in cluster_by],
+    ).collect()[0]
+
+    per_partition = files.groupBy(*partition_by).agg(spark_sum("_bytes").alias("_bytes")) \
+        .agg(count(lit(1)).alias("partitions"),
+             spark_max("_bytes").alias("max_bytes"),
+             percentile_approx("_bytes", 0.5).alias("median_bytes")) \
+        .collect()[0]
+
+    key_range_fraction = {}
+    for c in cluster_by:
+        lo, hi = totals["_lo_" + c], totals["_hi_" + c]
+        if lo is None or hi is None:
+            continue
+        width = float(hi - lo + 1)
+        covered = files.agg(expr("avg(_max_" + c + " - _min_" + c + " + 1)")).collect()[0][0] or 0
+        key_range_fraction[c] = round(covered / width, 3)
+    files.unpersist()
+
+    n_files = totals["files"] or 0
+    median_file = totals["median_file_bytes"] or 0
+    median = per_partition["median_bytes"] or 0
+    return {
+        "files": n_files,
+        "small_files": totals["small_files"] or 0,
+        "bytes": totals["bytes"] or 0,
+        "rows": totals["rows"] or 0,
+        "avg_file_mb": round((totals["bytes"] or 0) / n_files / 1024 / 1024, 1) if n_files else 0.0,
+        "partitions": per_partition["partitions"] or 0,
+        "file_skew": round(totals["max_file_bytes"] / median_file, 2) if median_file else 0.0,
+        "partition_skew": round(per_partition["max_bytes"] / median, 2) if median else 0.0,
+        "key_range_fraction": key_range_fraction,
+    }
+
+
+def needs_optimize(stats, max_small_file_ratio=MAX_SMALL_FILE_RATIO, max_file_skew=MAX_FILE_SKEW,
+                   max_key_range_fraction=MAX_KEY_RANGE_FRACTION):
+    """Reasons to re-optimize a table from layout_stats() - an empty list means the layout is fine"""
+    reasons = []
+    # One small file per partition is as good as it gets for a small partition
+    if stats["files"] > stats["partitions"] and stats["small_files"] > stats["files"] * max_small_file_ratio:
+        reasons.append(str(stats["small_files"]) + " of " + str(stats["files"]) + " files are small")
+    if stats["files"] > stats["partitions"] and stats["file_skew"] > max_file_skew:
+        reasons.append("largest file is " + str(stats["file_skew"]) + "x the median file")
+    for c, fraction in sorted(stats["key_range_fraction"].items()):
+        if stats["files"] > stats["partitions"] and fraction > max_key_range_fraction:
+            reasons.append("files cover " + str(int(fraction * 100)) + " pct of the " + c + " range")
+    return reasons
+
+
+def optimize_table(spark, path, zorder_by, where=None):
+    """OPTIMIZE (compaction) + ZORDER BY, optionally limited to some partitions -> OPTIMIZE metrics"""
+    sql = "OPTIMIZE delta.`" + path + "`"
+    if where:
+        sql += " WHERE " + where
+    if zorder_by:
+        sql += " ZORDER BY (" + ", ".join(zorder_by) + ")"
+    return spark.sql(sql).collect()[0]["metrics"]
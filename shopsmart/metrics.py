@@ -0,0 +1,489 @@
+# ============================================================
+# metrics.py
+# ============================================================
+# PURPOSE:
+#   Per-stage instrumentation of pipeline runs: wall time, rows
+#   written, table size, shuffle / spill volume - emitted as
+#   one JSON record per stage to Log Analytics (or local files).
+#
+# WHY?
+#   Every notebook cell proved its write by reading the table
+#   back: spark.read...load(path).count(). On large tables that
+#   is a full extra Spark job per cell, only to print a number.
+#   The write itself already knows: every Delta commit stores
+#   operationMetrics (numOutputRows, numTargetRowsInserted...).
+#
+# HOW IT WORKS:
+#   1. commit_metrics() / rows_written() / source_rows() -
+#      operationMetrics of the latest commit (one small read of
+#      the Delta log).
+#   2. table_rows() - current row count from the commit history:
+#      the last full overwrite + the rows appended / merged /
+#      deleted since. When the history can't tell (replaceWhere
+#      / partition overwrite, unknown operation) the numRecords
+#      stats of the live files in the Delta log are added up
+#      (layout.log_rows) - count() only for files without stats.
+#   3. StageMetricsListener - a SparkListener (Python, via the
+#      py4j callback server) that adds up each finished Spark
+#      stage's task metrics under the pipeline stage that ran
+#      it. Only onStageCompleted does work: one call per Spark
+#      stage, not per task.
+#   4. PipelineRun / Stage - timing context around a unit of
+#      work; on finish it collects all of the above into one
+#      record and hands it to the sinks. A stage only reports
+#      the latest commit's rows if that commit is its own: the
+#      table version is taken when the stage starts (path=...),
+#      else the commit time is compared with the stage start.
+#      A no-op incremental run writes 0 rows, not the last
+#      run's, and its record skips table_rows altogether.
+#   5. Sinks - JsonLinesSink (one file per run, for local runs
+#      and tests) and LogAnalyticsSink (HTTP Data Collector API
+#      of log-shopsmart-dev, custom log ShopSmartPipeline_CL).
+#
+#   On clusters where the SparkContext is not reachable (Spark
+#   Connect / shared access mode) the listener is skipped and
+#   records carry no shuffle numbers - everything else works.
+#
+# USAGE:
+#   RUN = PipelineRun(spark, "bronze_to_silver", default_sinks(dbutils))
+#   stage = RUN.stage("silver.orders", path=SILVER + "/orders")
+#   ... write SILVER + "/orders" ...
+#   stage.finish(quarantined=quarantine_count)
+#
+#   with RUN.stage("gold.dim_date") as stage:
+#       ...
+#       stage.set(path=GOLD + "/dim_date")
+#   RUN.close()
+# ============================================================
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from email.utils import formatdate
+
+from delta.tables import DeltaTable
+
+from shopsmart.layout import log_rows
+
+SECRET_SCOPE = "shopsmart-scope"
+METRICS_DIR_ENV = "SHOPSMART_METRICS_DIR"
+DEFAULT_METRICS_DIR = "metrics"
+
+LOG_TYPE = "ShopSmartPipeline"   # -> table ShopSmartPipeline_CL
+STAGE_PROPERTY = "shopsmart.stage"
+
+# How far back table_rows() walks the history looking for a full overwrite
+MAX_HISTORY = 100
+
+# Operations that don't change the row count
+_NO_ROW_CHANGE = {"OPTIMIZE", "VACUUM START", "VACUUM END", "SET TBLPROPERTIES", "UNSET TBLPROPERTIES",
+                  "ADD CONSTRAINT", "DROP CONSTRAINT", "CHANGE COLUMN", "ADD COLUMNS", "UPDATE",
+                  "FSCK", "RESTORE"}
+_REPLACE = {"CREATE TABLE AS SELECT", "REPLACE TABLE AS SELECT", "CREATE OR REPLACE TABLE AS SELECT"}
+
+_UNKNOWN = object()   # Stage started without a path: no start version
+
+_SPARK_METRICS = ["spark_stages", "failed_stages", "tasks", "executor_run_time_ms", "input_bytes", "output_bytes",
+                  "shuffle_read_bytes", "shuffle_write_bytes", "memory_spilled_bytes", "disk_spilled_bytes",
+                  "peak_execution_memory"]
+
+
+def _int(metrics, name):
+    return int(metrics.get(name) or 0)
+
+
+def _numeric(operation_metrics):
+    return {k: int(v) for k, v in (operation_metrics or {}).items() if str(v).lstrip("-").isdigit()}
+
+
+# ----------------------------------------------------------
+# Delta commit metrics
+# ----------------------------------------------------------
+def commit_metrics(spark, path):
+    """Version, time, operation and operationMetrics (as ints) of the latest commit of a Delta table"""
+    last = DeltaTable.forPath(spark, path).history(1) \
+        .select("version", "timestamp", "operation", "operationMetrics").collect()[0]
+    return {
+        "version": last["version"],
+        "timestamp": last["timestamp"],
+        "operation": last["operation"],
+        "metrics": _numeric(last["operationMetrics"]),
+    }
+
+
+def table_version(spark, path):
+    """Latest version of a Delta table, None if there is no table at path yet"""
+    if not DeltaTable.isDeltaTable(spark, path):
+        return None
+    return DeltaTable.forPath(spark, path).history(1).select("version").collect()[0]["version"]
+
+
+def _rows_added(operation, metrics):
+    """Rows a commit added to the table (negative: removed), None if the metrics don't say"""
+    if operation in ("WRITE", "STREAMING UPDATE") or operation in _REPLACE:
+        return _int(metrics, "numOutputRows")
+    if operation == "MERGE":
+        return _int(metrics, "numTargetRowsInserted") - _int(metrics, "numTargetRowsDeleted")
+    if operation == "DELETE":
+        return -_int(metrics, "numDeletedRows") if "numDeletedRows" in metrics else None
+    if operation in _NO_ROW_CHANGE:
+        return 0
+    return None
+
+
+def rows_written(commit):
+    """Rows the commit wrote: inserted + updated for a MERGE, output rows for a write"""
+    metrics = commit["metrics"]
+    if commit["operation"] == "MERGE":
+        return _int(metrics, "numTargetRowsInserted") + _int(metrics, "numTargetRowsUpdated")
+    return _int(metrics, "numOutputRows")
+
+
+def source_rows(commit):
+    """Rows the commit was given: the MERGE source, the rows written for a write"""
+    if commit["operation"] == "MERGE":
+        return _int(commit["metrics"], "numSourceRows")
+    return _int(commit["metrics"], "numOutputRows")
+
+
+def table_rows(spark, path, max_history=MAX_HISTORY):
+    """Current row count of a Delta table from its commit history, else from the file stats in the Delta log"""
+    history = DeltaTable.forPath(spark, path).history(max_history) \
+        .select("operation", "operationParameters", "operationMetrics").collect()
+    delta = 0
+    for commit in history:   # newest first
+        operation = commit["operation"]
+        params = commit["operationParameters"] or {}
+        metrics = _numeric(commit["operationMetrics"])
+        overwrite = operation in _REPLACE or (operation == "WRITE" and params.get("mode") == "Overwrite")
+        if overwrite:
+            if params.get("predicate") in (None, "", "[]") and "numOutputRows" in metrics:
+                return metrics["numOutputRows"] + delta
+            break   # replaceWhere / dynamic partition overwrite: removed rows unknown
+        added = _rows_added(operation, metrics)
+        if added is None:
+            break
+        delta += added
+    rows = log_rows(spark, path)
+    if rows is None:   # files written without stats
+        rows = spark.read.format("delta").load(path).count()
+    return rows
+
+
+# ----------------------------------------------------------
+# Spark listener: shuffle / spill per pipeline stage
+# ----------------------------------------------------------
+class StageMetricsListener:
+    """SparkListener adding up task metrics of finished Spark stages per pipeline stage (STAGE_PROPERTY)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owner = {}    # Spark stage id -> pipeline stage name
+        self._totals = {}   # pipeline stage name -> metric totals
+        self._active = True
+
+    @classmethod
+    def register(cls, spark):
+        """Attach a listener to the SparkContext -> listener, or None where the SparkContext is not reachable"""
+        try:
+            from pyspark.java_gateway import ensure_callback_server_started
+            sc = spark.sparkContext
+            ensure_callback_server_started(sc._gateway)
+            listener = cls()
+            sc._jsc.sc().addSparkListener(listener)
+            listener._sc = sc
+            return listener
+        except Exception as e:   # Spark Connect / shared clusters: no SparkContext
+            print("  (stage metrics off: " + type(e).__name__ + ")")
+            return None
+
+    def remove(self):
+        self._active = False    # a re-created py4j proxy may not match the registered one
+        try:
+            self._sc._jsc.sc().removeSparkListener(self)
+        except Exception:
+            pass
+
+    def take(self, stage_name):
+        """Totals collected for a pipeline stage so far (and forget them)"""
+        with self._lock:
+            totals = self._totals.pop(stage_name, None)
+        return totals or dict.fromkeys(_SPARK_METRICS, 0)
+
+    # SparkListenerInterface
+    def onStageSubmitted(self, event):
+        if not self._active:
+            return
+        props = event.properties()
+        name = props.getProperty(STAGE_PROPERTY) if props is not None else None
+        if name:
+            with self._lock:
+                self._owner[event.stageInfo().stageId()] = name
+
+    def onStageCompleted(self, event):
+        info = event.stageInfo()
+        with self._lock:
+            name = self._owner.pop(info.stageId(), None)
+        if name is None:
+            return
+        m = info.taskMetrics()
+        values = {
+            "spark_stages": 1,
+            "failed_stages": 1 if info.failureReason().isDefined() else 0,
+            "tasks": info.numTasks(),
+            "executor_run_time_ms": m.executorRunTime(),
+            "input_bytes": m.inputMetrics().bytesRead(),
+            "output_bytes": m.outputMetrics().bytesWritten(),
+            "shuffle_read_bytes": m.shuffleReadMetrics().totalBytesRead(),
+            "shuffle_write_bytes": m.shuffleWriteMetrics().bytesWritten(),
+            "memory_spilled_bytes": m.memoryBytesSpilled(),
+            "disk_spilled_bytes": m.diskBytesSpilled(),
+            "peak_execution_memory": m.peakExecutionMemory(),
+        }
+        with self._lock:
+            totals = self._totals.setdefault(name, dict.fromkeys(_SPARK_METRICS, 0))
+            for key, value in values.items():
+                if key == "peak_execution_memory":
+                    totals[key] = max(totals[key], value)
+                else:
+                    totals[key] += value
+
+    def __getattr__(self, name):
+        # Every other SparkListenerInterface callback: nothing to do
+        if name.startswith("on"):
+            return lambda *args: None
+        raise AttributeError(name)
+
+    class Java:
+        implements = ["org.apache.spark.scheduler.SparkListenerInterface"]
+
+
+# ----------------------------------------------------------
+# Sinks
+# ----------------------------------------------------------
+class JsonLinesSink:
+    """Appends each record as one JSON line to <directory>/<pipeline>_<run_id>.jsonl"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get(METRICS_DIR_ENV) or DEFAULT_METRICS_DIR
+
+    def emit(self, record):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, record["pipeline"] + "_" + record["run_id"] + ".jsonl")
+        with open(path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+class LogAnalyticsSink:
+    """Posts each record to a Log Analytics workspace (HTTP Data Collector API, custom log <log_type>_CL)"""
+
+    def __init__(self, workspace_id, shared_key, log_type=LOG_TYPE, timeout=30):
+        self.workspace_id = workspace_id
+        self.shared_key = shared_key
+        self.log_type = log_type
+        self.timeout = timeout
+
+    @classmethod
+    def from_secrets(cls, dbutils, scope=SECRET_SCOPE, log_type=LOG_TYPE):
+        return cls(dbutils.secrets.get(scope=scope, key="log-analytics-workspace-id"),
+                   dbutils.secrets.get(scope=scope, key="log-analytics-shared-key"), log_type)
+
+    def _signature(self, date, length):
+        to_sign = "POST\n" + str(length) + "\napplication/json\nx-ms-date:" + date + "\n/api/logs"
+        digest = hmac.new(base64.b64decode(self.shared_key), to_sign.encode("utf-8"), hashlib.sha256).digest()
+        return "SharedKey " + self.workspace_id + ":" + base64.b64encode(digest).decode()
+
+    def emit(self, record):
+        body = json.dumps([record], default=str).encode("utf-8")
+        date = formatdate(usegmt=True)
+        request = urllib.request.Request(
+            "https://" + self.workspace_id + ".ods.opinsights.azure.com/api/logs?api-version=2016-04-01",
+            data=body, method="POST",
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": self._signature(date, len(body)),
+                "Log-Type": self.log_type,
+                "x-ms-date": date,
+                "time-generated-field": "finished_at",
+            })
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except Exception as e:   # metrics must never fail the pipeline
+            print("  (metrics not sent to Log Analytics: " + str(e) + ")")
+
+
+def default_sinks(dbutils=None, directory=None):
+    """Log Analytics when its secrets are in shopsmart-scope, JSON files otherwise"""
+    if dbutils is not None:
+        try:
+            return [LogAnalyticsSink.from_secrets(dbutils)]
+        except Exception:
+            print("  (no log-analytics-* secrets in " + SECRET_SCOPE + " - metrics go to JSON files)")
+    return [JsonLinesSink(directory)]
+
+
+# ----------------------------------------------------------
+# Runs and stages
+# ----------------------------------------------------------
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+class Stage:
+    """One timed unit of work of a PipelineRun - finish() (or leaving the with block) emits its record"""
+
+    def __init__(self, run, name, path=None):
+        self.run = run
+        self.name = name
+        self.fields = {"path": path} if path else {}
+        self.record = None
+        self._rows = None
+        self._start_version = table_version(run.spark, path) if path else _UNKNOWN
+        self._start = time.perf_counter()
+        self._started = datetime.now()
+        self._started_at = _now()
+        run._set_stage(name)
+
+    def set(self, **fields):
+        """Extra fields for the record (path=... also gives rows_written / table_rows)"""
+        self.fields.update(fields)
+
+    def _committed(self, commit):
+        """Whether the commit was made during this stage"""
+        if self._start_version is not _UNKNOWN:
+            return self._start_version is None or commit["version"] > self._start_version
+        # path only known at the end: history() timestamps are collected as local time, like datetime.now()
+        return commit["timestamp"] is not None and commit["timestamp"] >= self._started
+
+    def finish(self, status="ok", **fields):
+        self.set(**fields)
+        seconds = time.perf_counter() - self._start
+        self.run._set_stage(None)
+
+        record = {
+            "record_type": "stage",
+            "pipeline": self.run.pipeline,
+            "run_id": self.run.run_id,
+            "stage": self.name,
+            "status": status,
+            "started_at": self._started_at,
+            "finished_at": _now(),
+            "seconds": round(seconds, 3),
+        }
+        path = self.fields.get("path")
+        if path and self._start_version is None and not DeltaTable.isDeltaTable(self.run.spark, path):
+            path = None   # table still not created
+        if path and status == "ok":
+            commit = commit_metrics(self.run.spark, path)
+            committed = self._committed(commit)
+            record.update({
+                "delta_version": commit["version"],
+                "operation": commit["operation"] if committed else None,
+                "rows_written": rows_written(commit) if committed else 0,
+                "source_rows": source_rows(commit) if committed else 0,
+            })
+            if committed:   # else the table is as it was: nothing to recount
+                record["table_rows"] = table_rows(self.run.spark, path)
+        if self.run.listener is not None:
+            record.update(self.run.listener.take(self.name))
+        record.update(self.fields)
+        if record.get("rows_written") is not None and seconds > 0:
+            record["rows_per_sec"] = int(record["rows_written"] / seconds)
+
+        self.record = record
+        self.run._emit(record)
+        return record
+
+    @property
+    def rows(self):
+        """Row count of the table after the stage - looked up on first use if the stage committed nothing"""
+        if not self.record or self.record.get("delta_version") is None:
+            return None
+        if self._rows is None:
+            self._rows = self.record.get("table_rows")
+            if self._rows is None:
+                self._rows = table_rows(self.run.spark, self.record["path"])
+        return self._rows
+
+    @property
+    def source_rows(self):
+        """Rows the stage's write was given (after the transformation) - no count() needed"""
+        return self.record.get("source_rows") if self.record else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.finish("failed", error=type(exc).__name__ + ": " + str(exc)[:500])
+        return False
+
+
+class PipelineRun:
+    """Stages of one notebook / pipeline run, emitted to the sinks; close() adds a run summary"""
+
+    def __init__(self, spark, pipeline, sinks=None, run_id=None, listen=True, verbose=True):
+        self.spark = spark
+        self.pipeline = pipeline
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6]
+        self.sinks = list(sinks) if sinks is not None else [JsonLinesSink()]
+        self.listener = StageMetricsListener.register(spark) if listen else None
+        self.verbose = verbose
+        self.records = []
+        self._start = time.perf_counter()
+
+    def _set_stage(self, name):
+        if self.listener is not None:
+            self.spark.sparkContext.setLocalProperty(STAGE_PROPERTY, name)
+
+    def _emit(self, record):
+        self.records.append(record)
+        for sink in self.sinks:
+            sink.emit(record)
+        if self.verbose and record["record_type"] == "stage":
+            line = "  ⏱️ " + record["stage"] + ": " + str(record["seconds"]) + " s"
+            if record.get("rows_written") is not None:
+                line += ", " + format(record["rows_written"], ",") + " rows written"
+            if record.get("shuffle_write_bytes"):
+                line += ", " + str(round(record["shuffle_write_bytes"] / 1024 / 1024, 1)) + " MB shuffled"
+            if record.get("disk_spilled_bytes"):
+                line += ", " + str(round(record["disk_spilled_bytes"] / 1024 / 1024, 1)) + " MB spilled"
+            print(line)
+
+    def stage(self, name, path=None):
+        """Start timing a stage: call .finish() on it, or use it as a with block
+
+        path: the Delta table the stage writes - its version now tells
+              whether the stage committed anything
+        """
+        return Stage(self, name, path)
+
+    def close(self):
+        """Emit the run summary and detach the listener"""
+        stages = [r for r in self.records if r["record_type"] == "stage"]
+        summary = {
+            "record_type": "run",
+            "pipeline": self.pipeline,
+            "run_id": self.run_id,
+            "status": "failed" if any(r["status"] != "ok" for r in stages) else "ok",
+            "finished_at": _now(),
+            "seconds": round(time.perf_counter() - self._start, 3),
+            "stages": len(stages),
+            "rows_written": sum(r.get("rows_written") or 0 for r in stages),
+        }
+        for key in ("shuffle_read_bytes", "shuffle_write_bytes", "memory_spilled_bytes", "disk_spilled_bytes"):
+            summary[key] = sum(r.get(key) or 0 for r in stages)
+        self._emit(summary)
+        if self.listener is not None:
+            self.listener.remove()
+            self.listener = None
+        return summary
@@ -0,0 +1,306 @@
+# ============================================================
+# pipeline.py
+# ============================================================
+# PURPOSE:
+#   The whole Medallion pipeline as plain Python stages:
+#   Bronze -> Silver (notebook 1), Silver -> Gold (notebook 02)
+#   and the ML tables (notebook 03) - runnable against any
+#   storage root, e.g. local Spark + a local Delta folder.
+#
+# WHY?
+#   The notebooks need Databricks, ADLS and the Key Vault
+#   secrets. The stages here run the same transformations
+#   (silver.py, gold.py and the other shared modules) with
+#   nothing but pyspark + delta-spark, so benchmark.py can
+#   time them before a deploy.
+#
+# WHAT A STAGE DOES:
+#   The FULL (rebuild) path of its notebook cell: read, check,
+#   transform, overwrite, plus the layout check for
+#   fact_sales. No watermarks are written and no verification
+#   output is printed - the next incremental notebook run on
+#   the same root simply starts with a full load.
+#   Every stage returns the rows it wrote (Delta row counts
+#   come from the transaction log, not from a scan).
+#
+# USAGE:
+#   spark = local_spark()
+#   paths = layer_paths("/tmp/shopsmart")        # storage.py
+#   for name, stage in STAGES:
+#       rows = stage(spark, *paths)
+#
+#   python -m shopsmart.pipeline --root /tmp/shopsmart
+#   (one JSON metrics record per stage -> metrics/, see metrics.py)
+# ============================================================
+
+import argparse
+
+from pyspark.sql.functions import current_timestamp, lit
+
+from shopsmart.anomaly import PaymentAnomalyScorer
+from shopsmart.forecast import refresh_demand_state, reorder_points
+from shopsmart.gold import (FACT_PARTITIONS, FACT_ZORDER_BY, GOLD_VERSION, SCD2_TRACKED_COLUMNS, build_agg_daily_sales,
+                            build_dim_customer, build_dim_date, build_dim_product, build_fact_sales,
+                            join_orders_items, place_surrogate_keys)
+from shopsmart.keys import assign_surrogate_keys
+from shopsmart.layout import (join_dimension_keys, layout_stats, needs_optimize, optimize_table,
+                              set_target_file_size)
+from shopsmart.metrics import JsonLinesSink, PipelineRun, table_rows
+from shopsmart.quality import ORDER_ITEMS_RULES, ORDERS_RULES, check_rules
+from shopsmart.rfm import refresh_rfm_state, rfm_cutoffs, score_rfm
+from shopsmart.rollups import refresh_rollups
+from shopsmart.scd2 import scd2_merge
+from shopsmart.serving import refresh_customer_360
+from shopsmart.schemas import read_bronze
+from shopsmart.sessions import SESSION_GAP, sessionize
+from shopsmart.silver import (INVENTORY_VALID, PAYMENTS_VALID, PRODUCTS_VALID, build_clickstream,
+                              build_customers, build_inventory, build_order_items, build_orders,
+                              build_payments, build_products, with_silver_metadata, write_table)
+from shopsmart.storage import layer_paths
+
+# source -> file under BRONZE (the generator's folder layout)
+BRONZE_FILES = {
+    "orders": "/source1_orders_pg/orders.csv",
+    "order_items": "/source1_orders_pg/order_items.csv",
+    "customers": "/source2_customers_api/customers.json",
+    "products": "/source3_products_mongo/products.json",
+    "clickstream": "/source4_clickstream_eventhub/clickstream.json",
+    "inventory": "/source5_inventory_csv/inventory.csv",
+    "payments": "/source6_payments_api/payments.json",
+}
+
+ORDER_PARTITIONS = ["order_year", "order_month"]
+
+
+def local_spark(app_name="shopsmart", cores="*", driver_memory="4g", shuffle_partitions=8):
+    """Local SparkSession with Delta Lake (pip install pyspark delta-spark)"""
+    from delta import configure_spark_with_delta_pip
+    from pyspark.sql import SparkSession
+
+    builder = SparkSession.builder \
+        .master("local[" + str(cores) + "]") \
+        .appName(app_name) \
+        .config("spark.driver.memory", driver_memory) \
+        .config("spark.sql.shuffle.partitions", str(shuffle_partitions)) \
+        .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension") \
+        .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
+    return configure_spark_with_delta_pip(builder).getOrCreate()
+
+
+def _rows(spark, path):
+    return table_rows(spark, path)
+
+
+def _bronze(spark, bronze, source):
+    return read_bronze(spark, source, bronze + BRONZE_FILES[source])
+
+
+# ----------------------------------------------------------
+# Bronze -> Silver (notebook 1)
+# ----------------------------------------------------------
+def silver_orders(spark, bronze, silver, gold):
+    df_bronze = _bronze(spark, bronze, "orders") \
+        .withColumn("_bronze_loaded_at", current_timestamp()) \
+        .withColumn("_source_file", lit(BRONZE_FILES["orders"].lstrip("/")))
+    check = check_rules(df_bronze, ORDERS_RULES)
+    check.quarantine \
+        .withColumn("_quarantine_timestamp", current_timestamp()) \
+        .write.format("delta").mode("overwrite").option("overwriteSchema", True) \
+        .save(bronze + "/quarantine/orders")
+    write_table(spark, with_silver_metadata(build_orders(check.good)), silver + "/orders",
+                partition_by=ORDER_PARTITIONS)
+    check.release()
+    return _rows(spark, silver + "/orders")
+
+
+def silver_order_items(spark, bronze, silver, gold):
+    check = check_rules(build_order_items(_bronze(spark, bronze, "order_items")), ORDER_ITEMS_RULES)
+    write_table(spark, with_silver_metadata(check.good), silver + "/order_items")
+    check.release()
+    return _rows(spark, silver + "/order_items")
+
+
+def silver_customers(spark, bronze, silver, gold):
+    write_table(spark, with_silver_metadata(build_customers(_bronze(spark, bronze, "customers"))),
+                silver + "/customers")
+    return _rows(spark, silver + "/customers")
+
+
+def silver_products(spark, bronze, silver, gold):
+    df = build_products(_bronze(spark, bronze, "products")).filter(PRODUCTS_VALID)
+    write_table(spark, with_silver_metadata(df), silver + "/products")
+    return _rows(spark, silver + "/products")
+
+
+def silver_inventory(spark, bronze, silver, gold):
+    df = build_inventory(_bronze(spark, bronze, "inventory")).filter(INVENTORY_VALID)
+    write_table(spark, with_silver_metadata(df), silver + "/inventory")
+    return _rows(spark, silver + "/inventory")
+
+
+def silver_clickstream(spark, bronze, silver, gold):
+    """Event table + session table (sessions are built from the written events)"""
+    df_events = with_silver_metadata(build_clickstream(_bronze(spark, bronze, "clickstream")))
+    write_table(spark, df_events, silver + "/clickstream", partition_by=["event_date"])
+    df_events = spark.read.format("delta").load(silver + "/clickstream")
+    write_table(spark, sessionize(df_events, SESSION_GAP), silver + "/sessions")
+    return _rows(spark, silver + "/clickstream") + _rows(spark, silver + "/sessions")
+
+
+def silver_payments(spark, bronze, silver, gold):
+    df = build_payments(_bronze(spark, bronze, "payments")).filter(PAYMENTS_VALID)
+    write_table(spark, with_silver_metadata(df), silver + "/payments")
+    return _rows(spark, silver + "/payments")
+
+
+# ----------------------------------------------------------
+# Silver -> Gold (notebook 02)
+# ----------------------------------------------------------
+def gold_dim_date(spark, bronze, silver, gold):
+    write_table(spark, build_dim_date(spark), gold + "/dim_date")
+    return _rows(spark, gold + "/dim_date")
+
+
+def gold_dim_customer(spark, bronze, silver, gold):
+    df_keyed, _ = assign_surrogate_keys(
+        spark, spark.read.format("delta").load(silver + "/customers"),
+        ["customer_id"], "customer_sk", gold + "/_keys/customer")
+    scd2_merge(spark, build_dim_customer(df_keyed), gold + "/dim_customer", "customer_id",
+               SCD2_TRACKED_COLUMNS, first_start_column="registration_date")
+    return _rows(spark, gold + "/dim_customer")
+
+
+def gold_dim_product(spark, bronze, silver, gold):
+    df_keyed, _ = assign_surrogate_keys(
+        spark, spark.read.format("delta").load(silver + "/products"),
+        ["product_id"], "product_sk", gold + "/_keys/product")
+    write_table(spark, build_dim_product(df_keyed), gold + "/dim_product")
+    return _rows(spark, gold + "/dim_product")
+
+
+def gold_fact_sales(spark, bronze, silver, gold):
+    """Full rebuild + the layout check / Z-order of notebook 02 Step 4b"""
+    df_fact = build_fact_sales(join_orders_items(
+        spark.read.format("delta").load(silver + "/orders"),
+        spark.read.format("delta").load(silver + "/order_items")))
+    fact_columns = df_fact.columns
+    df_fact = place_surrogate_keys(join_dimension_keys(spark, df_fact, [
+        (gold + "/_keys/customer", ["customer_id"], "customer_sk"),
+        (gold + "/_keys/product", ["product_id"], "product_sk"),
+    ]), fact_columns)
+
+    path = gold + "/fact_sales"
+    write_table(spark, df_fact, path, partition_by=FACT_PARTITIONS)
+    set_target_file_size(spark, path)
+    if needs_optimize(layout_stats(spark, path, FACT_PARTITIONS, FACT_ZORDER_BY)):
+        optimize_table(spark, path, FACT_ZORDER_BY)
+    return _rows(spark, path)
+
+
+def gold_agg_daily_sales(spark, bronze, silver, gold):
+    df_fact = spark.read.format("delta").load(gold + "/fact_sales")
+    write_table(spark, build_agg_daily_sales(df_fact), gold + "/agg_daily_sales")
+    return _rows(spark, gold + "/agg_daily_sales")
+
+
+def gold_rollups(spark, bronze, silver, gold):
+    built = refresh_rollups(spark, gold, force=True, verbose=False)
+    return sum(_rows(spark, gold + "/rollups/" + name) for name in built)
+
+
+# ----------------------------------------------------------
+# ML (notebook 03)
+# ----------------------------------------------------------
+def ml_rfm(spark, bronze, silver, gold):
+    refresh_rfm_state(spark, gold + "/fact_sales", gold + "/ml_rfm_orders", gold + "/ml_rfm_customers",
+                      gold + "/_watermarks", full=True)
+    df_state = spark.read.format("delta").load(gold + "/ml_rfm_customers")
+    df_scored = score_rfm(df_state, rfm_cutoffs(df_state)) \
+        .withColumn("_gold_processed_at", current_timestamp()) \
+        .withColumn("_gold_version", lit(GOLD_VERSION))
+    write_table(spark, df_scored, gold + "/ml_customer_rfm")
+    return _rows(spark, gold + "/ml_customer_rfm")
+
+
+def ml_anomaly(spark, bronze, silver, gold):
+    scorer = PaymentAnomalyScorer(spark, gold + "/ml_payment_method_stats", gold + "/ml_anomaly_detection",
+                                  full=True, verbose=False)
+    scorer(spark.read.format("delta").load(silver + "/payments"))
+    return _rows(spark, gold + "/ml_anomaly_detection")
+
+
+def ml_demand(spark, bronze, silver, gold):
+    refresh_demand_state(spark, gold + "/fact_sales", silver + "/inventory", gold + "/ml_demand_state",
+                         gold + "/_watermarks", full=True)
+    df_reorder = reorder_points(spark.read.format("delta").load(gold + "/ml_demand_state"),
+                                spark.read.format("delta").load(silver + "/inventory")) \
+        .withColumn("_gold_processed_at", current_timestamp()) \
+        .withColumn("_gold_version", lit(GOLD_VERSION))
+    write_table(spark, df_reorder, gold + "/ml_reorder_points")
+    return _rows(spark, gold + "/ml_reorder_points")
+
+
+def serving_customer_360(spark, bronze, silver, gold):
+    # SQLite needs a local file system: local roots only (the notebook builds it on the driver's disk)
+    if "://" in gold:
+        raise ValueError("serving.customer_360 needs a local storage root, got " + gold)
+    stats = refresh_customer_360(spark, gold, gold + "/serving/customer_360.sqlite", force=True)
+    return stats["rows"]
+
+
+# In dependency order
+STAGES = [
+    ("silver.orders", silver_orders),
+    ("silver.order_items", silver_order_items),
+    ("silver.customers", silver_customers),
+    ("silver.products", silver_products),
+    ("silver.inventory", silver_inventory),
+    ("silver.clickstream", silver_clickstream),
+    ("silver.payments", silver_payments),
+    ("gold.dim_date", gold_dim_date),
+    ("gold.dim_customer", gold_dim_customer),
+    ("gold.dim_product", gold_dim_product),
+    ("gold.fact_sales", gold_fact_sales),
+    ("gold.agg_daily_sales", gold_agg_daily_sales),
+    ("gold.rollups", gold_rollups),
+    ("ml.rfm", ml_rfm),
+    ("ml.anomaly", ml_anomaly),
+    ("ml.demand", ml_demand),
+    ("serving.customer_360", serving_customer_360),
+]
+
+
+def select_stages(names=None):
+    """STAGES, or only those whose name starts with one of names ("silver", "gold.fact_sales", ...)"""
+    if not names:
+        return list(STAGES)
+    chosen = [(name, stage) for name, stage in STAGES if any(name.startswith(n) for n in names)]
+    if not chosen:
+        raise ValueError("No stage matches " + ", ".join(names) + " - stages: "
+                         + ", ".join(name for name, _ in STAGES))
+    return chosen
+
+
+def run_pipeline(spark, root=None, stages=None, sinks=None):
+    """Run the stages against root (see storage.layer_paths), one metrics record each -> run summary"""
+    paths = layer_paths(root)
+    run = PipelineRun(spark, "pipeline", sinks)
+    for name, stage in select_stages(stages):
+        with run.stage(name) as timed:
+            timed.set(rows_written=stage(spark, *paths))
+    return run.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ShopSmart pipeline on local Spark")
+    parser.add_argument("--root", required=True, help="Storage root holding bronze/ (silver/ and gold/ are written)")
+    parser.add_argument("--stage", action="append", help="Only stages starting with this (repeatable)")
+    parser.add_argument("--metrics-dir", help="Where the JSON metrics go (default: $SHOPSMART_METRICS_DIR or metrics/)")
+    args = parser.parse_args()
+
+    spark = local_spark()
+    run_pipeline(spark, args.root, args.stage, [JsonLinesSink(args.metrics_dir)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# ============================================================
+# quality.py
+# ============================================================
+# PURPOSE:
+#   Declarative data-quality rules, evaluated in ONE pass.
+#
+# WHY?
+#   df.filter(rule_1).count(), df.filter(rule_2).count(), ...
+#   is one Spark job per metric, and every job re-reads the raw
+#   CSV / JSON from Bronze. Here all rules for a source become
+#   columns of a single df.agg(...) - one read, one job.
+#
+# HOW IT WORKS:
+#   - Rule(name, failing_sql): a SQL condition that is TRUE for
+#     a bad row. quarantine=True means bad rows are split off.
+#   - DuplicateRule(name, columns): rows minus distinct keys,
+#     approx_count_distinct unless exact=True (HyperLogLog, ~2%
+#     error, no shuffle of every key).
+#   - profile(df, rules) -> metrics dict, one aggregation.
+#   - check_rules(df, rules) tags every row with the reasons it
+#     failed (a single column), caches the tagged rows and
+#     computes all metrics in the same pass. .good and
+#     .quarantine are filters over the cached rows - the source
+#     is not read again.
+#   - write_dq_history() appends one metrics row per run.
+#
+# USAGE:
+#   result = check_rules(df_orders_bronze, ORDERS_RULES)
+#   result.good / result.quarantine / result.metrics
+#   write_dq_history(spark, SILVER + "/_dq_history", run_id, "orders", result.metrics)
+#   result.release()
+# ============================================================
+
+from datetime import datetime
+
+from pyspark import StorageLevel
+from pyspark.sql.functions import (approx_count_distinct, col, concat_ws, count, countDistinct, expr, lit,
+                                   struct, sum as spark_sum, when)
+from pyspark.sql.types import (LongType, MapType, StringType, StructField, StructType,
+                               TimestampType)
+
+QUARANTINE_REASON = "_quarantine_reason"
+
+DQ_HISTORY_SCHEMA = StructType([
+    StructField("run_id", StringType(), False),
+    StructField("checked_at", TimestampType(), False),
+    StructField("source", StringType(), False),
+    StructField("row_count", LongType(), True),
+    StructField("quarantined", LongType(), True),
+    StructField("failures", MapType(StringType(), LongType()), True),
+])
+
+
+class Rule:
+    """Row-level check - failing_sql is TRUE for a bad row (NULL counts as passing)"""
+
+    def __init__(self, name, failing_sql, quarantine=False, description=None):
+        self.name = name
+        self.failing_sql = failing_sql
+        self.quarantine = quarantine
+        self.description = description or name
+
+    def failing(self):
+        return expr(self.failing_sql)
+
+    def aggregations(self):
+        return [spark_sum(when(self.failing(), 1).otherwise(0)).alias(self.name)]
+
+    def metric(self, row):
+        return row[self.name] or 0
+
+
+class DuplicateRule:
+    """Rows whose key was already seen (row count minus distinct keys)"""
+
+    quarantine = False
+
+    def __init__(self, name, columns, exact=False, description=None):
+        self.name = name
+        self.columns = columns
+        self.exact = exact
+        self.description = description or name
+
+    def aggregations(self):
+        if self.exact:
+            distinct = countDistinct(*self.columns)
+        elif len(self.columns) == 1:
+            distinct = approx_count_distinct(self.columns[0])
+        else:
+            distinct = approx_count_distinct(struct(*self.columns))
+        return [distinct.alias(self.name + "__distinct")]
+
+    def metric(self, row):
+        # The approximate distinct count can overshoot the row count slightly
+        return max(row["row_count"] - (row[self.name + "__distinct"] or 0), 0)
+
+
+def _metrics(df, rules, extra=()):
+    aggs = [count(lit(1)).alias("row_count")] + list(extra)
+    for rule in rules:
+        aggs.extend(rule.aggregations())
+    row = df.agg(*aggs).collect()[0]
+    metrics = {"row_count": row["row_count"]}
+    for rule in rules:
+        metrics[rule.name] = rule.metric(row)
+    return metrics, row
+
+
+def profile(df, rules):
+    """{"row_count": n, <rule name>: failing rows, ...} - every rule in one aggregation"""
+    return _metrics(df, rules)[0]
+
+
+class RuleCheck:
+    """Rows tagged with the quarantine rules they failed, plus the metrics of the same pass"""
+
+    def __init__(self, tagged, metrics):
+        self.tagged = tagged
+        self.metrics = metrics
+
+    @property
+    def good(self):
+        return self.tagged.filter(col(QUARANTINE_REASON).isNull()).drop(QUARANTINE_REASON)
+
+    @property
+    def quarantine(self):
+        return self.tagged.filter(col(QUARANTINE_REASON).isNotNull())
+
+    def release(self):
+        self.tagged.unpersist()
+
+
+def check_rules(df, rules, storage_level=StorageLevel.MEMORY_AND_DISK):
+    """Evaluate all rules in one pass and split good / quarantine rows -> RuleCheck
+
+    metrics also holds "quarantined" and "good" counts.
+    """
+    reasons = [when(rule.failing(), lit(rule.description)) for rule in rules if rule.quarantine]
+    if reasons:
+        # concat_ws skips NULLs: "" means no quarantine rule failed
+        reason = concat_ws("; ", *reasons)
+        tagged = df.withColumn(QUARANTINE_REASON, when(reason != "", reason))
+    else:
+        tagged = df.withColumn(QUARANTINE_REASON, lit(None).cast("string"))
+    tagged = tagged.persist(storage_level)
+
+    metrics, row = _metrics(
+        tagged, rules,
+        extra=[spark_sum(when(col(QUARANTINE_REASON).isNotNull(), 1).otherwise(0)).alias("quarantined")])
+    metrics["quarantined"] = row["quarantined"] or 0
+    metrics["good"] = metrics["row_count"] - metrics["quarantined"]
+    return RuleCheck(tagged, metrics)
+
+
+def write_dq_history(spark, path, run_id, source, metrics):
+    """Append one row with this run's metrics for a source to the DQ history Delta table"""
+    failures = {name: int(value) for name, value in metrics.items()
+                if name not in ("row_count", "quarantined", "good")}
+    row = (run_id, datetime.now(), source, int(metrics["row_count"]),
+           int(metrics.get("quarantined", 0)), failures)
+    spark.createDataFrame([row], DQ_HISTORY_SCHEMA) \
+        .write \
+        .format("delta") \
+        .mode("append") \
+        .save(path)
+
+
+def print_metrics(metrics, rules):
+    """One line per rule: failing rows and percent of all rows"""
+    total = metrics["row_count"]
+    for rule in rules:
+        failed = metrics[rule.name]
+        pct = str(int(failed * 100 / total)) if total else "0"
+        print("  " + (rule.description + ":").ljust(24) + str(failed) + " rows (" + pct + " pct)")
+
+
+# ----------------------------------------------------------
+# Bronze rules per source (the issues profiled in notebook 1)
+# ----------------------------------------------------------
+ORDERS_RULES = [
+    Rule("null_order_status", "order_status IS NULL", quarantine=True, description="NULL order_status"),
+    Rule("negative_total_amount", "total_amount < 0", description="Negative total_amount"),
+    DuplicateRule("duplicate_order_id", ["order_id"], description="Duplicate order_ids"),
+]
+
+ORDER_ITEMS_RULES = [
+    Rule("null_item_id", "item_id IS NULL", quarantine=True, description="NULL item_id"),
+    Rule("null_order_id", "order_id IS NULL", quarantine=True, description="NULL order_id"),
+    Rule("null_product_id", "product_id IS NULL", quarantine=True, description="NULL product_id"),
+    Rule("non_positive_quantity", "coalesce(quantity, 0) <= 0", quarantine=True,
+         description="quantity missing or <= 0"),
+    Rule("non_positive_unit_price", "coalesce(unit_price, 0) <= 0", quarantine=True,
+         description="unit_price missing or <= 0"),
+]
+
+CUSTOMERS_RULES = [
+    Rule("null_email", "email IS NULL", description="NULL email"),
+    DuplicateRule("duplicate_customer_id", ["customer_id"], description="Duplicate customer_ids"),
+]
+
+PRODUCTS_RULES = [
+    Rule("null_price", "price IS NULL", description="NULL price"),
+    Rule("zero_price", "price = 0", description="Zero price"),
+]
+
+INVENTORY_RULES = [
+    Rule("negative_stock", "quantity_on_hand < 0", description="Negative stock"),
+]
+
+CLICKSTREAM_RULES = [
+    Rule("null_customer_id", "customer_id IS NULL", description="NULL customer_id"),
+]
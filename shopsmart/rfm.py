@@ -0,0 +1,193 @@
+# ============================================================
+# rfm.py
+# ============================================================
+# PURPOSE:
+#   RFM (Recency / Frequency / Monetary) features and 1-5
+#   scores for every customer, kept up to date incrementally.
+#
+# WHY NOT ntile(5) OVER Window.orderBy(...)?
+#   A window without partitionBy sorts ALL customers in ONE
+#   task - three times, once per metric. Here the quintile
+#   cutoffs come from percentile_approx (a mergeable sketch,
+#   computed per partition and combined), all three metrics
+#   plus the reference date in ONE aggregation. Scoring is
+#   then a plain per-row comparison with 4 cutoffs - no sort,
+#   no shuffle.
+#
+#   Ties: every customer with the same value gets the same
+#   score (ntile split ties arbitrarily across buckets).
+#
+# HOW THE INCREMENTAL REFRESH WORKS:
+#   Two small Delta state tables in Gold:
+#     ml_rfm_orders     one row per order (date, status, totals,
+#                       channel, products) - built from fact_sales
+#     ml_rfm_customers  one row per customer (min/max dates,
+#                       counts, sums) - built from ml_rfm_orders
+#   1. Only fact_sales rows with _gold_processed_at after the
+#      watermark are read. fact_sales rewrites whole months,
+#      so every item of a changed order is in that set.
+#   2. Those rows are summarised per order and MERGEd into
+#      ml_rfm_orders.
+#   3. Only customers with a changed order are re-aggregated
+#      (from their order rows, not from fact_sales) and MERGEd
+#      into ml_rfm_customers.
+#   4. Scoring runs over ml_rfm_customers - one row per
+#      customer, whatever the size of the fact table.
+#
+# USAGE:
+#   stats = refresh_rfm_state(spark, GOLD + "/fact_sales", GOLD + "/ml_rfm_orders",
+#                             GOLD + "/ml_rfm_customers", GOLD + "/_watermarks")
+#   df_customers = spark.read.format("delta").load(GOLD + "/ml_rfm_customers")
+#   cutoffs = rfm_cutoffs(df_customers)
+#   df_scored = score_rfm(df_customers, cutoffs)
+# ============================================================
+
+from pyspark.sql.functions import (array_distinct, col, collect_list, collect_set, count, countDistinct,
+                                   date_format, datediff, first, flatten, lit, percentile_approx, round,
+                                   size, to_date, when)
+from pyspark.sql.functions import max as spark_max
+from pyspark.sql.functions import min as spark_min
+from pyspark.sql.functions import sum as spark_sum
+
+from shopsmart.incremental import commit_watermark, read_watermark, upsert_latest
+
+QUINTILES = [0.2, 0.4, 0.6, 0.8]
+PERCENTILE_ACCURACY = 10000   # percentile_approx default: ~0.01% rank error
+EPOCH = "1970-01-01"
+
+
+def order_summaries(df_fact):
+    """fact_sales rows -> one row per order"""
+    return df_fact.groupBy("customer_id", "order_id").agg(
+        spark_max("order_date").alias("order_date"),
+        first("order_status").alias("order_status"),
+        first("channel").alias("channel"),
+        count(lit(1)).alias("line_count"),
+        spark_sum("quantity").alias("quantity"),
+        spark_sum("net_line_total").alias("net_total"),
+        collect_set("product_id").alias("product_ids"),
+    )
+
+
+def customer_aggregates(df_orders):
+    """ml_rfm_orders rows -> one row of additive R/F/M aggregates per customer"""
+    return df_orders.groupBy("customer_id").agg(
+        spark_max("order_date").alias("last_order_date"),
+        spark_min("order_date").alias("first_order_date"),
+        count(lit(1)).alias("frequency"),
+        # Cancelled orders generate no revenue
+        round(spark_sum(when(col("order_status") != "CANCELLED", col("net_total")).otherwise(lit(0))), 2)
+        .alias("monetary"),
+        spark_sum("net_total").alias("net_total_all"),
+        spark_sum("line_count").alias("line_count"),
+        spark_sum("quantity").alias("total_items_bought"),
+        size(array_distinct(flatten(collect_list("product_ids")))).alias("unique_products"),
+        countDistinct("channel").alias("channels_used"),
+        spark_sum(when(col("order_status") == "CANCELLED", 1).otherwise(0)).alias("cancelled_orders"),
+        spark_sum(when(col("order_status") == "RETURNED", 1).otherwise(0)).alias("returned_orders"),
+        spark_sum(when(col("order_status") == "DELIVERED", 1).otherwise(0)).alias("delivered_orders"),
+    )
+
+
+def refresh_rfm_state(spark, fact_path, orders_path, customers_path, watermarks_path, full=False):
+    """Fold fact_sales changes since the last refresh into the RFM state tables -> stats dict"""
+    df_fact = spark.read.format("delta").load(fact_path)
+    mark = {} if full else read_watermark(spark, watermarks_path, "ml_rfm")
+    since = mark.get("column_watermark")
+
+    # Newest fact row this refresh covers -> next refresh's watermark
+    latest = df_fact.agg(date_format(spark_max("_gold_processed_at"), "yyyy-MM-dd HH:mm:ss.SSSSSS")) \
+        .collect()[0][0]
+
+    if since is None:
+        # First refresh (or full): build both state tables from all of fact_sales
+        df_orders = order_summaries(df_fact)
+        df_orders.write.format("delta").mode("overwrite").option("overwriteSchema", True).save(orders_path)
+        df_orders = spark.read.format("delta").load(orders_path)
+        customer_aggregates(df_orders).write \
+            .format("delta").mode("overwrite").option("overwriteSchema", True).save(customers_path)
+        commit_watermark(spark, watermarks_path, "ml_rfm", {"column_watermark": latest})
+        customers = spark.read.format("delta").load(customers_path).count()
+        return {"mode": "full", "orders_changed": df_orders.count(), "customers_changed": customers}
+
+    # Delta file stats on _gold_processed_at skip every file fact_sales did not rewrite
+    df_changed = df_fact.filter(col("_gold_processed_at") > lit(since).cast("timestamp"))
+    changed_orders = order_summaries(df_changed).cache()
+    orders_changed = changed_orders.count()
+    if orders_changed:
+        upsert_latest(spark, changed_orders, orders_path, ["order_id"])
+        changed_customers = changed_orders.select("customer_id").distinct()
+        df_orders = spark.read.format("delta").load(orders_path) \
+            .join(changed_customers, "customer_id", "left_semi")
+        upsert_latest(spark, customer_aggregates(df_orders), customers_path, ["customer_id"])
+        customers_changed = changed_customers.count()
+    else:
+        customers_changed = 0
+    changed_orders.unpersist()
+
+    commit_watermark(spark, watermarks_path, "ml_rfm", {"column_watermark": latest or since})
+    return {"mode": "incremental", "orders_changed": orders_changed, "customers_changed": customers_changed}
+
+
+def _epoch_days(column):
+    return datediff(to_date(col(column)), to_date(lit(EPOCH)))
+
+
+def rfm_cutoffs(df_customers, accuracy=PERCENTILE_ACCURACY):
+    """Quintile cutoffs for recency / frequency / monetary + the reference date - one aggregation
+
+    Recency cutoffs are on last_order_date (as days since epoch): ranking by
+    last order date is ranking by recency, and it needs no reference date up front.
+    """
+    row = df_customers.agg(
+        spark_max(to_date(col("last_order_date"))).alias("reference_date"),
+        percentile_approx(_epoch_days("last_order_date"), QUINTILES, accuracy).alias("last_order"),
+        percentile_approx(col("frequency"), QUINTILES, accuracy).alias("frequency"),
+        percentile_approx(col("monetary"), QUINTILES, accuracy).alias("monetary"),
+    ).collect()[0]
+    return {
+        "reference_date": row["reference_date"],
+        "last_order": list(row["last_order"] or []),
+        "frequency": list(row["frequency"] or []),
+        "monetary": list(row["monetary"] or []),
+    }
+
+
+def _quintile_score(value, cutoffs):
+    """1 + number of cutoffs the value is above -> 1..5"""
+    score = lit(1)
+    for cutoff in cutoffs:
+        score = score + (value > lit(cutoff)).cast("int")
+    return score
+
+
+def score_rfm(df_customers, cutoffs):
+    """Customer aggregates -> RFM features, 1-5 scores and segment (map-side only)"""
+    reference = lit(str(cutoffs["reference_date"]))
+    return df_customers \
+        .withColumn("recency_days", datediff(reference, to_date(col("last_order_date")))) \
+        .withColumn("avg_order_value",
+            when(col("line_count") > 0, round(col("net_total_all") / col("line_count"), 2))) \
+        .withColumn("avg_items_per_order",
+            when(col("frequency") > 0, round(col("total_items_bought") / col("frequency"), 2))) \
+        .withColumn("customer_lifespan_days", datediff(col("last_order_date"), col("first_order_date"))) \
+        .withColumn("return_rate",
+            when(col("frequency") > 0, round(col("returned_orders") / col("frequency") * 100, 2))
+            .otherwise(lit(0.0))) \
+        .withColumn("cancel_rate",
+            when(col("frequency") > 0, round(col("cancelled_orders") / col("frequency") * 100, 2))
+            .otherwise(lit(0.0))) \
+        .withColumn("delivery_rate",
+            when(col("frequency") > 0, round(col("delivered_orders") / col("frequency") * 100, 2))
+            .otherwise(lit(0.0))) \
+        .withColumn("r_score", _quintile_score(_epoch_days("last_order_date"), cutoffs["last_order"])) \
+        .withColumn("f_score", _quintile_score(col("frequency"), cutoffs["frequency"])) \
+        .withColumn("m_score", _quintile_score(col("monetary"), cutoffs["monetary"])) \
+        .withColumn("rfm_score", col("r_score") + col("f_score") + col("m_score")) \
+        .withColumn("rfm_segment",
+            when(col("rfm_score") >= 13, lit("Champions"))
+            .when(col("rfm_score") >= 10, lit("Loyal Customers"))
+            .when(col("rfm_score") >= 7, lit("Potential Loyalists"))
+            .when(col("rfm_score") >= 5, lit("At Risk"))
+            .otherwise(lit("Hibernating"))) \
+        .drop("net_total_all", "line_count")
@@ -0,0 +1,310 @@
+# ============================================================
+# rollups.py
+# ============================================================
+# PURPOSE:
+#   Pre-aggregated sales rollups for the dashboard questions
+#   (revenue by category by month, channel by day, ...), a
+#   router that answers a question from the SMALLEST rollup
+#   that can, and a result cache tied to Delta versions.
+#
+# WHY?
+#   Every dashboard question used to join fact_sales to the
+#   dimensions and aggregate all of it again. The rollups are
+#   built once per Gold load; a question then reads a few
+#   hundred / thousand pre-aggregated rows, and a repeated
+#   question is answered from driver memory.
+#
+# HOW IT WORKS:
+#   1. The base is fact_sales with category (dim_product) and
+#      loyalty_tier / address_state (CURRENT dim_customer row),
+#      joined once, by surrogate key, with broadcast dims.
+#   2. ROLLUPS lists the materialized grains: day / week /
+#      month x a subset of category, channel, loyalty_tier,
+#      address_state. Each is built from the smallest rollup
+#      already built that covers it (only the finest ones read
+#      fact_sales) and saved as gold/rollups/<name>.
+#   3. Measures are additive (sums) - order / customer counts
+#      are HyperLogLog sketches (hll_sketch_agg), so they can be
+#      re-aggregated to any coarser grain without double
+#      counting an order that spans two categories.
+#   4. gold/rollups/_catalog records, per rollup, its row count
+#      and the Delta versions of the sources it was built from.
+#      refresh_rollups() rebuilds only when a source version
+#      moved.
+#   5. RollupQuery.query() picks the smallest rollup covering
+#      the grain, group-by and filter columns and caches the
+#      collected rows. The cache key includes the catalog
+#      version, so a refresh invalidates every cached answer.
+#
+#   Time grains: a day rollup can answer any grain; a month
+#   rollup answers month / quarter / year; a week rollup only
+#   weeks (weeks cross month boundaries). grain=None means
+#   totals over all time - any rollup can answer it.
+#
+# USAGE:
+#   refresh_rollups(spark, GOLD)
+#   rollups = RollupQuery(spark, GOLD)
+#   result = rollups.query("month", by=["category"], where={"channel": "web"})
+#   result.rows / result.rollup / result.cached
+# ============================================================
+
+import time
+from datetime import datetime
+
+from delta.tables import DeltaTable
+from pyspark.sql.functions import broadcast, col, count, date_trunc, desc, expr, lit, round, to_date
+from pyspark.sql.functions import sum as spark_sum
+from pyspark.sql.types import (ArrayType, LongType, MapType, StringType, StructField, StructType,
+                               TimestampType)
+from pyspark.sql.utils import AnalysisException
+
+# Coarser grains each stored grain can be rolled up to
+GRAIN_ANSWERS = {
+    "day": ["day", "week", "month", "quarter", "year"],
+    "week": ["week"],
+    "month": ["month", "quarter", "year"],
+}
+
+ROLLUP_DIMENSIONS = ["category", "channel", "loyalty_tier", "address_state"]
+
+MEASURES = ["line_items", "units", "revenue", "discounts", "orders", "customers"]
+
+SOURCE_TABLES = ["fact_sales", "dim_product", "dim_customer"]
+
+CATALOG_SCHEMA = StructType([
+    StructField("name", StringType(), False),
+    StructField("grain", StringType(), False),
+    StructField("dimensions", ArrayType(StringType()), False),
+    StructField("rows", LongType(), True),
+    StructField("source_versions", MapType(StringType(), LongType()), True),
+    StructField("built_at", TimestampType(), True),
+])
+
+
+class Rollup:
+    """One materialized grain: time grain + grouping dimensions"""
+
+    def __init__(self, name, grain, dimensions):
+        self.name = name
+        self.grain = grain
+        self.dimensions = list(dimensions)
+
+    def covers(self, grain, columns):
+        time_ok = grain is None or grain in GRAIN_ANSWERS[self.grain]
+        return time_ok and set(columns) <= set(self.dimensions)
+
+
+ROLLUPS = [
+    Rollup("sales_day_all", "day", ROLLUP_DIMENSIONS),
+    Rollup("sales_week_all", "week", ROLLUP_DIMENSIONS),
+    Rollup("sales_month_all", "month", ROLLUP_DIMENSIONS),
+    Rollup("sales_day_channel", "day", ["channel"]),
+    Rollup("sales_month_category_channel", "month", ["category", "channel"]),
+    Rollup("sales_month_tier_state", "month", ["loyalty_tier", "address_state"]),
+    Rollup("sales_month", "month", []),
+]
+
+
+def _period(column, grain):
+    """Start date of the grain's period containing column"""
+    if grain == "day":
+        return to_date(col(column))
+    return to_date(date_trunc(grain, col(column)))
+
+
+def _table_version(spark, path):
+    return DeltaTable.forPath(spark, path).history(1).select("version").collect()[0][0]
+
+
+def source_versions(spark, gold_root):
+    """{table: current Delta version} for the tables the rollups are built from"""
+    return {name: _table_version(spark, gold_root + "/" + name) for name in SOURCE_TABLES}
+
+
+def sales_base(spark, gold_root):
+    """fact_sales + category / loyalty_tier / address_state - the rows the finest rollups aggregate"""
+    df_fact = spark.read.format("delta").load(gold_root + "/fact_sales")
+    df_product = spark.read.format("delta").load(gold_root + "/dim_product") \
+        .select("product_sk", "category")
+    # Current version only - one row per customer_sk
+    df_customer = spark.read.format("delta").load(gold_root + "/dim_customer") \
+        .filter(col("is_current")) \
+        .select("customer_sk", "loyalty_tier", "address_state")
+    return df_fact \
+        .join(broadcast(df_product), "product_sk", "left") \
+        .join(broadcast(df_customer), "customer_sk", "left")
+
+
+def _aggregate_base(df_base, rollup):
+    return df_base \
+        .withColumn("period_start", _period("order_date", rollup.grain)) \
+        .groupBy("period_start", *rollup.dimensions) \
+        .agg(
+            count(lit(1)).alias("line_items"),
+            spark_sum("quantity").alias("units"),
+            spark_sum("net_line_total").alias("revenue"),
+            spark_sum("discount_amount").alias("discounts"),
+            expr("hll_sketch_agg(order_id)").alias("orders_sketch"),
+            expr("hll_sketch_agg(customer_id)").alias("customers_sketch"),
+        )
+
+
+def _reaggregate(df, grain, dimensions):
+    """Roll stored rows up to a coarser grain / fewer dimensions (sums + sketch unions)
+
+    grain=None: no time column - totals over all periods.
+    """
+    if grain:
+        df = df.withColumn("period_start", _period("period_start", grain))
+    return df \
+        .groupBy(*(["period_start"] if grain else []), *dimensions) \
+        .agg(
+            spark_sum("line_items").alias("line_items"),
+            spark_sum("units").alias("units"),
+            spark_sum("revenue").alias("revenue"),
+            spark_sum("discounts").alias("discounts"),
+            expr("hll_union_agg(orders_sketch)").alias("orders_sketch"),
+            expr("hll_union_agg(customers_sketch)").alias("customers_sketch"),
+        )
+
+
+def read_catalog(spark, gold_root):
+    """{rollup name: catalog row as dict} ({} before the first build)"""
+    try:
+        rows = spark.read.format("delta").load(gold_root + "/rollups/_catalog").collect()
+    except AnalysisException:
+        return {}
+    return {r["name"]: r.asDict() for r in rows}
+
+
+def refresh_rollups(spark, gold_root, force=False, verbose=True):
+    """Rebuild the rollups if fact_sales or a dimension changed since the last build -> built names"""
+    versions = source_versions(spark, gold_root)
+    catalog = read_catalog(spark, gold_root)
+    stale = force or any(
+        r.name not in catalog or catalog[r.name]["source_versions"] != versions for r in ROLLUPS)
+    if not stale:
+        if verbose:
+            print("  Rollups up to date with " + str(versions))
+        return []
+
+    df_base = sales_base(spark, gold_root)
+    built = []      # (Rollup, row count) in build order
+    entries = []
+    # Finest rollups first, so every coarser one can come from a built one
+    for rollup in sorted(ROLLUPS, key=lambda r: (r.grain != "day", -len(r.dimensions))):
+        parents = [(n, p) for p, n in built if p.covers(rollup.grain, rollup.dimensions)]
+        if parents:
+            parent = min(parents, key=lambda pair: pair[0])[1]
+            df = _reaggregate(spark.read.format("delta").load(gold_root + "/rollups/" + parent.name),
+                              rollup.grain, rollup.dimensions)
+            source = parent.name
+        else:
+            df = _aggregate_base(df_base, rollup)
+            source = "fact_sales"
+
+        path = gold_root + "/rollups/" + rollup.name
+        df.write.format("delta").mode("overwrite").option("overwriteSchema", True).save(path)
+        rows = spark.read.format("delta").load(path).count()
+        built.append((rollup, rows))
+        entries.append((rollup.name, rollup.grain, rollup.dimensions, rows, versions, datetime.now()))
+        if verbose:
+            print("  " + rollup.name.ljust(30) + str(rows).rjust(8) + " rows  (from " + source + ")")
+
+    spark.createDataFrame(entries, CATALOG_SCHEMA) \
+        .write \
+        .format("delta") \
+        .mode("overwrite") \
+        .save(gold_root + "/rollups/_catalog")
+    return [r.name for r, _ in built]
+
+
+class RollupResult:
+    """Answer to one query: rows, the rollup that answered it, whether it came from the cache"""
+
+    def __init__(self, rows, rollup, cached, seconds):
+        self.rows = rows
+        self.rollup = rollup
+        self.cached = cached
+        self.seconds = seconds
+
+    def show(self, n=20):
+        if not self.rows:
+            print("  (no rows)")
+            return
+        columns = list(self.rows[0].asDict().keys())
+        print("  " + " | ".join(c.ljust(14) for c in columns))
+        for row in self.rows[:n]:
+            print("  " + " | ".join(str(row[c]).ljust(14) for c in columns))
+
+
+class RollupQuery:
+    """Route questions to the smallest covering rollup; cache answers per catalog version"""
+
+    def __init__(self, spark, gold_root, version_check_seconds=30):
+        self.spark = spark
+        self.gold_root = gold_root
+        self.version_check_seconds = version_check_seconds
+        self._cache = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._catalog = {}
+
+    def _catalog_version(self):
+        # Checking the version is a Delta log read - do it at most every few seconds
+        now = time.time()
+        if self._version is None or now - self._checked_at > self.version_check_seconds:
+            version = _table_version(self.spark, self.gold_root + "/rollups/_catalog")
+            if version != self._version:
+                self._cache = {}
+                self._catalog = read_catalog(self.spark, self.gold_root)
+            self._version = version
+            self._checked_at = now
+        return self._version
+
+    def route(self, grain, columns):
+        """Smallest rollup (by row count) that can answer grain x columns"""
+        candidates = [r for r in ROLLUPS if r.name in self._catalog and r.covers(grain, columns)]
+        if not candidates:
+            raise ValueError("No rollup covers grain=" + str(grain) + " by " + str(sorted(columns)))
+        return min(candidates, key=lambda r: self._catalog[r.name]["rows"])
+
+    def query(self, grain, by=(), where=None, measures=MEASURES, order_by=None):
+        """Aggregated measures per period (and per `by` column) -> RollupResult
+
+        grain:    "day" / "week" / "month" / "quarter" / "year", or None for all time
+        where:    {column: value or list of values} on rollup dimensions
+        order_by: output columns to sort by, "-column" for descending (default: period, then `by`)
+        """
+        started = time.time()
+        where = where or {}
+        key = (self._catalog_version(), grain, tuple(by),
+               tuple(sorted((c, tuple(v) if isinstance(v, (list, tuple)) else v) for c, v in where.items())),
+               tuple(measures), tuple(order_by) if order_by else None)
+        if key in self._cache:
+            rollup, rows = self._cache[key]
+            return RollupResult(rows, rollup, True, time.time() - started)
+
+        rollup = self.route(grain, list(by) + list(where))
+        df = self.spark.read.format("delta").load(self.gold_root + "/rollups/" + rollup.name)
+        for column, value in where.items():
+            values = list(value) if isinstance(value, (list, tuple)) else [value]
+            df = df.filter(col(column).isin(values))
+
+        df = _reaggregate(df, grain, list(by))
+        outputs = {
+            "line_items": col("line_items"),
+            "units": col("units"),
+            "revenue": round(col("revenue"), 2),
+            "discounts": round(col("discounts"), 2),
+            "orders": expr("hll_sketch_estimate(orders_sketch)"),
+            "customers": expr("hll_sketch_estimate(customers_sketch)"),
+        }
+        period = [col("period_start").alias(grain)] if grain else []
+        df = df.select(*period, *by, *[outputs[m].alias(m) for m in measures])
+        order = [desc(c[1:]) if c.startswith("-") else col(c)
+                 for c in (order_by or ([grain] if grain else []) + list(by))]
+        rows = df.orderBy(*order).collect()
+
+        self._cache[key] = (rollup.name, rows)
+        return RollupResult(rows, rollup.name, False, time.time() - started)
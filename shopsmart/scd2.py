@@ -0,0 +1,111 @@
+# ============================================================
+# scd2.py
+# ============================================================
+# PURPOSE:
+#   SCD Type 2 maintenance for Gold dimensions: a changed
+#   customer gets a NEW row, the old row is closed - history
+#   is kept instead of overwritten.
+#
+# HOW IT WORKS:
+#   1. row_hash() hashes the tracked attributes of every
+#      incoming row (sha256 over the values, null-safe).
+#      Comparing one hash per row is much cheaper than
+#      comparing 10+ columns on a wide dimension.
+#   2. The incoming rows are joined to the CURRENT dimension
+#      rows on the business key. Only two kinds survive:
+#        - new keys           -> insert version 1
+#        - hash is different  -> close old row + insert version n+1
+#      Unchanged keys drop out here, so the MERGE never
+#      touches (or rewrites the files of) unchanged rows.
+#   3. One MERGE does both halves for changed keys. Each
+#      changed row is staged twice:
+#        - _merge_key = key  -> matches the current row -> close it
+#        - _merge_key = NULL -> never matches           -> insert it
+#
+#   Columns added to the dimension:
+#     _row_hash, version, effective_start_date,
+#     effective_end_date (9999-12-31 while current), is_current
+#
+#   Keys missing from the incoming data are left as they are
+#   (no deletes).
+#
+# USAGE:
+#   stats = scd2_merge(spark, df_dim_customer, GOLD + "/dim_customer",
+#                      "customer_id", ["loyalty_tier", "address_city"],
+#                      first_start_column="registration_date")
+# ============================================================
+
+from delta.tables import DeltaTable
+from pyspark.sql.functions import (coalesce, col, concat_ws, current_date, lit, sha2, sum as spark_sum,
+                                   to_date, when)
+
+OPEN_END_DATE = "9999-12-31"
+SCD2_COLUMNS = ["_row_hash", "version", "effective_start_date", "effective_end_date", "is_current"]
+
+# Separator / null marker that can't appear in ordinary text values
+_SEPARATOR = "\u001f"
+_NULL = "\u0000"
+
+
+def row_hash(columns):
+    """sha256 over the given columns - a null and an empty string hash differently"""
+    return sha2(concat_ws(_SEPARATOR, *[coalesce(col(c).cast("string"), lit(_NULL)) for c in columns]), 256)
+
+
+def _first_versions(df, first_start_column):
+    start = to_date(col(first_start_column)) if first_start_column else current_date()
+    return df \
+        .withColumn("version", lit(1)) \
+        .withColumn("effective_start_date", coalesce(start, current_date())) \
+        .withColumn("effective_end_date", to_date(lit(OPEN_END_DATE))) \
+        .withColumn("is_current", lit(True))
+
+
+def scd2_merge(spark, df, path, key, tracked_columns, first_start_column=None):
+    """Apply one snapshot of a dimension (one row per key) as SCD2 -> {"new", "changed", "unchanged"}
+
+    first_start_column: date column used as effective_start_date of a key's
+                        first version (default: today). Later versions start today.
+    """
+    df = df.withColumn("_row_hash", row_hash(tracked_columns))
+
+    # First run - or a table written before SCD2 tracking (no _row_hash yet)
+    if not DeltaTable.isDeltaTable(spark, path) or "_row_hash" not in spark.read.format("delta").load(path).columns:
+        first = _first_versions(df, first_start_column)
+        first.write.format("delta").mode("overwrite").option("overwriteSchema", True).save(path)
+        return {"new": first.count(), "changed": 0, "unchanged": 0}
+
+    current = spark.read.format("delta").load(path) \
+        .filter(col("is_current")) \
+        .select(col(key), col("_row_hash").alias("_current_hash"), col("version").alias("_current_version"))
+
+    compared = df.join(current, key, "left")
+    counts = compared.agg(
+        spark_sum(when(col("_current_hash").isNull(), 1).otherwise(0)).alias("new"),
+        spark_sum(when(col("_current_hash") != col("_row_hash"), 1).otherwise(0)).alias("changed"),
+        spark_sum(when(col("_current_hash") == col("_row_hash"), 1).otherwise(0)).alias("unchanged"),
+    ).collect()[0].asDict()
+    counts = {name: value or 0 for name, value in counts.items()}
+    if counts["new"] == 0 and counts["changed"] == 0:
+        return counts
+
+    new_rows = _first_versions(compared.filter(col("_current_hash").isNull()), first_start_column)
+    changed_rows = compared.filter(col("_current_hash") != col("_row_hash")) \
+        .withColumn("version", col("_current_version") + 1) \
+        .withColumn("effective_start_date", current_date()) \
+        .withColumn("effective_end_date", to_date(lit(OPEN_END_DATE))) \
+        .withColumn("is_current", lit(True))
+
+    columns = df.columns + [c for c in SCD2_COLUMNS if c not in df.columns]
+    staged = new_rows.select(*columns, col(key).alias("_merge_key")) \
+        .unionByName(changed_rows.select(*columns, col(key).alias("_merge_key"))) \
+        .unionByName(changed_rows.select(*columns, lit(None).cast(df.schema[key].dataType).alias("_merge_key")))
+
+    DeltaTable.forPath(spark, path).alias("t") \
+        .merge(staged.alias("s"), "t." + key + " = s._merge_key AND t.is_current = true") \
+        .whenMatchedUpdate(
+            condition="t._row_hash <> s._row_hash",
+            set={"is_current": "false", "effective_end_date": "s.effective_start_date"}) \
+        .whenNotMatchedInsert(values={c: "s." + c for c in columns}) \
+        .execute()
+    return counts
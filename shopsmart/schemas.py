@@ -0,0 +1,378 @@
+# ============================================================
+# schemas.py
+# ============================================================
+# PURPOSE:
+#   ONE declaration of the seven Bronze sources - columns,
+#   types and the nested address / preferences / attributes /
+#   geo_location structs - used by:
+#     - the notebooks: explicit Spark schemas, no inferSchema
+#     - synthetic_data/columnar.py: the Parquet (Arrow) schemas
+#     - generator.py / stream_producer.py: a record check
+#   plus a cheap schema-drift check for Bronze files.
+#
+# WHY?
+#   inferSchema (CSV) and JSON schema inference read the WHOLE
+#   file once just to guess the types, then Spark reads it
+#   again for the data. With an explicit schema a Bronze read
+#   is one pass. The types also stop drifting between runs
+#   (a column of all-null values inferred as string, ...).
+#
+# HOW IT WORKS:
+#   - SOURCES is plain Python (type names as strings), so the
+#     generator and the producer can import it without pyspark.
+#   - spark_schema() / arrow_schema() render it on demand.
+#   - JSON sources keep their date / timestamp fields as
+#     strings in Bronze (that's what JSON inference gave and
+#     what the Silver cells parse - e.g. payments tries several
+#     timestamp formats). CSV timestamps are typed directly.
+#   - check_drift() looks at the first lines of a file only:
+#     the CSV header, or the JSON keys, plus how many sample
+#     records fail to parse with the declared types.
+#
+# USAGE:
+#   df = read_bronze(spark, "orders", BRONZE + "/source1_orders_pg/orders.csv")
+#   drift = check_drift(spark, "orders", BRONZE + "/source1_orders_pg/orders.csv")
+#   table = pa.Table.from_arrays(..., schema=arrow_schema("orders"))
+#   validate_record("clickstream_event", generate_event())
+# ============================================================
+
+import re
+from datetime import date, datetime
+
+# Type names: string, int, double, boolean, date, timestamp,
+# ("array", element type), ("struct", [(name, type), ...])
+SOURCES = {
+    "orders": [
+        ("order_id", "string"),
+        ("customer_id", "string"),
+        ("order_date", "timestamp"),
+        ("order_status", "string"),
+        ("total_amount", "double"),
+        ("discount_amount", "double"),
+        ("shipping_amount", "double"),
+        ("payment_method", "string"),
+        ("channel", "string"),
+        ("shipping_address_id", "string"),
+        ("created_at", "timestamp"),
+        ("updated_at", "timestamp"),
+    ],
+    "order_items": [
+        ("item_id", "string"),
+        ("order_id", "string"),
+        ("product_id", "string"),
+        ("quantity", "int"),
+        ("unit_price", "double"),
+        ("discount_percent", "double"),
+        ("item_status", "string"),
+        ("created_at", "timestamp"),
+    ],
+    "customers": [
+        ("customer_id", "string"),
+        ("first_name", "string"),
+        ("last_name", "string"),
+        ("email", "string"),
+        ("phone", "string"),
+        ("date_of_birth", "date"),
+        ("gender", "string"),
+        ("registration_date", "date"),
+        ("loyalty_tier", "string"),
+        ("address", ("struct", [
+            ("street", "string"),
+            ("city", "string"),
+            ("state", "string"),
+            ("zip", "string"),
+            ("country", "string"),
+        ])),
+        ("preferences", ("struct", [
+            ("categories", ("array", "string")),
+            ("communication", ("array", "string")),
+        ])),
+    ],
+    "products": [
+        ("product_id", "string"),
+        ("product_name", "string"),
+        ("category", "string"),
+        ("sub_category", "string"),
+        ("brand", "string"),
+        ("price", "double"),
+        ("cost_price", "double"),
+        ("weight_kg", "double"),
+        ("supplier_id", "string"),
+        ("rating", "double"),
+        ("review_count", "int"),
+        ("is_active", "boolean"),
+        ("attributes", ("struct", [
+            ("color", ("array", "string")),
+            ("battery_life", "string"),
+            ("connectivity", "string"),
+        ])),
+        ("created_at", "timestamp"),
+        ("updated_at", "timestamp"),
+    ],
+    "inventory": [
+        ("product_id", "string"),
+        ("warehouse_id", "string"),
+        ("quantity_on_hand", "int"),
+        ("quantity_reserved", "int"),
+        ("reorder_point", "int"),
+        ("reorder_quantity", "int"),
+        ("last_restock_date", "date"),
+        ("snapshot_date", "date"),
+    ],
+    "payments": [
+        ("transaction_id", "string"),
+        ("order_id", "string"),
+        ("payment_method", "string"),
+        ("card_type", "string"),
+        ("amount", "double"),
+        ("currency", "string"),
+        ("status", "string"),
+        ("gateway_response_code", "string"),
+        ("is_international", "boolean"),
+        ("transaction_timestamp", "timestamp"),
+        ("risk_score", "int"),
+        ("ip_address", "string"),
+        ("device_fingerprint", "string"),
+    ],
+    "clickstream": [
+        ("event_id", "string"),
+        ("session_id", "string"),
+        ("customer_id", "string"),
+        ("event_type", "string"),
+        ("event_timestamp", "timestamp"),
+        ("page_url", "string"),
+        ("product_id", "string"),
+        ("device_type", "string"),
+        ("browser", "string"),
+        ("os", "string"),
+        ("ip_address", "string"),
+        ("geo_location", ("struct", [
+            ("city", "string"),
+            ("country", "string"),
+        ])),
+        ("referrer", "string"),
+        ("search_query", "string"),
+    ],
+}
+
+# Streaming events (stream_producer.py) carry three page metrics on top
+SOURCES["clickstream_event"] = SOURCES["clickstream"] + [
+    ("page_load_time_ms", "int"),
+    ("time_on_page_sec", "int"),
+    ("scroll_depth_pct", "int"),
+]
+
+# How each source lands in Bronze: format + reader options
+BRONZE_FORMATS = {
+    "orders": ("csv", {"header": True}),
+    "order_items": ("csv", {"header": True}),
+    "customers": ("json", {"multiLine": True}),
+    "products": ("json", {"multiLine": True}),
+    "inventory": ("csv", {"header": True}),
+    "payments": ("json", {"multiLine": True}),
+    "clickstream": ("json", {}),
+}
+
+CORRUPT_RECORD = "_corrupt_record"
+
+_TEXT_TYPES = ("date", "timestamp")
+
+
+def fields(source):
+    """[(name, type), ...] of a source"""
+    return SOURCES[source]
+
+
+def field_names(source):
+    return [name for name, _ in SOURCES[source]]
+
+
+def _key_names(spec):
+    """Every field name at any nesting level"""
+    names = set()
+    for name, kind in spec:
+        names.add(name)
+        if isinstance(kind, tuple) and kind[0] == "struct":
+            names |= _key_names(kind[1])
+    return names
+
+
+# ----------------------------------------------------------
+# Spark
+# ----------------------------------------------------------
+def _spark_type(kind, text_dates):
+    from pyspark.sql import types as T
+    if isinstance(kind, tuple):
+        if kind[0] == "array":
+            return T.ArrayType(_spark_type(kind[1], text_dates), True)
+        return T.StructType([T.StructField(n, _spark_type(k, text_dates), True) for n, k in kind[1]])
+    if text_dates and kind in _TEXT_TYPES:
+        return T.StringType()
+    return {
+        "string": T.StringType(),
+        "int": T.IntegerType(),
+        "double": T.DoubleType(),
+        "boolean": T.BooleanType(),
+        "date": T.DateType(),
+        "timestamp": T.TimestampType(),
+    }[kind]
+
+
+def spark_schema(source, text_dates=False, corrupt_record=False):
+    """StructType of a source (dates / timestamps as strings if text_dates)"""
+    from pyspark.sql.types import StringType, StructField, StructType
+    schema = StructType([StructField(n, _spark_type(k, text_dates), True) for n, k in SOURCES[source]])
+    if corrupt_record:
+        schema = schema.add(StructField(CORRUPT_RECORD, StringType(), True))
+    return schema
+
+
+def bronze_schema(source, corrupt_record=False):
+    """The schema a Bronze file of this source is read with"""
+    fmt = BRONZE_FORMATS[source][0]
+    return spark_schema(source, text_dates=(fmt == "json"), corrupt_record=corrupt_record)
+
+
+def bronze_options(source):
+    """format + reader options for read_bronze() / read_new_bronze()"""
+    fmt, options = BRONZE_FORMATS[source]
+    return fmt, dict(options)
+
+
+def read_bronze(spark, source, path):
+    """Single-pass Bronze read with the declared schema"""
+    fmt, options = bronze_options(source)
+    return spark.read.format(fmt).options(**options).schema(bronze_schema(source)).load(path)
+
+
+# ----------------------------------------------------------
+# Arrow (synthetic_data/columnar.py)
+# ----------------------------------------------------------
+def _arrow_type(kind):
+    import pyarrow as pa
+    if isinstance(kind, tuple):
+        if kind[0] == "array":
+            return pa.list_(_arrow_type(kind[1]))
+        return pa.struct([(n, _arrow_type(k)) for n, k in kind[1]])
+    return {
+        "string": pa.string(),
+        "int": pa.int32(),
+        "double": pa.float64(),
+        "boolean": pa.bool_(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }[kind]
+
+
+def arrow_schema(source):
+    import pyarrow as pa
+    return pa.schema([(n, _arrow_type(k)) for n, k in SOURCES[source]])
+
+
+# ----------------------------------------------------------
+# Plain Python records (generator / stream producer)
+# ----------------------------------------------------------
+_PY_TYPES = {
+    "string": (str,),
+    "int": (int,),
+    "double": (int, float),
+    "boolean": (bool,),
+    "date": (str, date),
+    "timestamp": (str, datetime),
+}
+
+
+def _record_problems(spec, record, prefix):
+    problems = []
+    expected = dict(spec)
+    for name in sorted(set(record) - set(expected)):
+        problems.append("unexpected field " + prefix + name)
+    for name, kind in spec:
+        if name not in record:
+            problems.append("missing field " + prefix + name)
+            continue
+        value = record[name]
+        if value is None:
+            continue
+        if isinstance(kind, tuple):
+            if kind[0] == "struct":
+                if not isinstance(value, dict):
+                    problems.append(prefix + name + " is not an object")
+                else:
+                    problems.extend(_record_problems(kind[1], value, prefix + name + "."))
+            elif not isinstance(value, list):
+                problems.append(prefix + name + " is not a list")
+        # bool is an int subclass - don't let True pass as a number
+        elif not isinstance(value, _PY_TYPES[kind]) or (kind in ("int", "double") and isinstance(value, bool)):
+            problems.append(prefix + name + " should be " + kind + ", got " + type(value).__name__)
+    return problems
+
+
+def check_record(source, record):
+    """Problems of one dict record against the source's schema ([] = matches)"""
+    return _record_problems(SOURCES[source], record, "")
+
+
+def validate_record(source, record):
+    """check_record() that raises ValueError - for writers, on their first record"""
+    problems = check_record(source, record)
+    if problems:
+        raise ValueError(source + " record does not match shopsmart/schemas.py: " + "; ".join(problems))
+
+
+# ----------------------------------------------------------
+# Drift check on Bronze files
+# ----------------------------------------------------------
+_JSON_KEY = re.compile(r'"([^"\\]+)"\s*:')
+
+
+def check_drift(spark, source, path, sample_lines=1000):
+    """Compare the first lines of a Bronze file with the declared schema -> dict
+
+    missing / unexpected: field names (CSV: the header; JSON: keys at any level)
+    corrupt / sampled:    sample records that don't parse with the declared
+                          types (not for multiLine JSON, whose lines aren't records)
+    Only the first sample_lines lines are read - never the whole file.
+    """
+    fmt, options = bronze_options(source)
+    lines = [r[0] for r in spark.read.text(path).limit(sample_lines).collect()]
+    if not lines:
+        return {"missing": [], "unexpected": [], "corrupt": 0, "sampled": 0}
+
+    if fmt == "csv":
+        seen = set(c.strip().strip('"') for c in lines[0].split(","))
+        expected = set(field_names(source))
+    else:
+        seen = set(key for line in lines for key in _JSON_KEY.findall(line))
+        expected = _key_names(SOURCES[source])
+    report = {
+        "missing": sorted(expected - seen),
+        "unexpected": sorted(seen - expected),
+        "corrupt": 0,
+        "sampled": 0,
+    }
+
+    if not options.get("multiLine"):
+        # A DataFrame of the lines, parsed per row - no RDD API (shared clusters)
+        from pyspark.sql import functions as F
+        records = lines[1:] if options.get("header") else lines
+        records = [(line,) for line in records if line.strip()]
+        if records:
+            schema = bronze_schema(source, corrupt_record=True)
+            parse_options = {"mode": "PERMISSIVE", "columnNameOfCorruptRecord": CORRUPT_RECORD}
+            sample = spark.createDataFrame(records, "value string")
+            if fmt == "csv":
+                parsed = F.from_csv("value", schema.simpleString(), parse_options)
+            else:
+                parsed = F.from_json("value", schema, parse_options)
+            counts = sample.select(parsed.alias("r")).agg(
+                F.count("*").alias("sampled"),
+                F.count("r." + CORRUPT_RECORD).alias("corrupt"),
+            ).first()
+            report["sampled"] = counts["sampled"]
+            report["corrupt"] = counts["corrupt"]
+    return report
+
+
+def has_drift(report):
+    return bool(report["missing"] or report["unexpected"] or report["corrupt"])
@@ -0,0 +1,335 @@
+# ============================================================
+# serving.py
+# ============================================================
+# PURPOSE:
+#   Customer-360 answers (RFM segment + scores, loyalty tier,
+#   recent payment risk) for online services - checkout,
+#   marketing - in microseconds, without Spark.
+#
+# WHY NOT QUERY GOLD?
+#   gold/ml_customer_rfm and gold/ml_anomaly_detection are
+#   Delta tables: every lookup is a Spark job and a scan. The
+#   services need one small record per customer_id, many
+#   thousands of times a second.
+#
+# HOW IT WORKS:
+#   1. customer_360_frame() joins, per customer, the current
+#      dim_customer row, the RFM scores and a summary of the
+#      payments of the last RISK_WINDOW_DAYS (payments reach
+#      customers through gold/ml_rfm_orders) - one row each.
+#   2. The rows land in an embedded SQLite file: one table
+#      keyed by customer_id (WITHOUT ROWID - the row IS the
+#      primary key b-tree), so a lookup is a single indexed
+#      read, a few microseconds with the file in page cache.
+#   3. Incremental refresh: the Delta versions of the source
+#      tables are stored in the file. Unchanged versions -> no
+#      Spark job at all. Otherwise every row carries a
+#      fingerprint of its values; only new / changed rows are
+#      written and vanished customers deleted, in one
+#      transaction - readers never see half a refresh.
+#
+#   The store is one local file (SQLite needs a POSIX file
+#   system): build it on the driver's disk, then copy it to
+#   where the services read it.
+#
+# USAGE:
+#   stats = refresh_customer_360(spark, GOLD, "/local_disk0/serving/customer_360.sqlite")
+#
+#   store = Customer360Store("customer_360.sqlite")     # one per thread
+#   store.get("CUST042")  -> {"rfm_segment": "Champions", "worst_risk_recent": "LOW", ...}
+#
+#   python -m shopsmart.serving --store customer_360.sqlite --lookup CUST042
+#   python -m shopsmart.serving --store customer_360.sqlite --benchmark 200000
+# ============================================================
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+RISK_WINDOW_DAYS = 90
+RISK_LEVELS = ["SAFE", "LOW", "MEDIUM", "HIGH", "CRITICAL"]   # anomaly.score_payments labels, ascending
+
+# Gold tables the store is built from (a new Delta version of any -> re-export)
+SOURCE_TABLES = ["dim_customer", "ml_customer_rfm", "ml_rfm_orders", "ml_anomaly_detection"]
+
+STORE_TABLE = "customer_360"
+STORE_COLUMNS = [
+    ("customer_id", "TEXT"),
+    ("loyalty_tier", "TEXT"),
+    ("rfm_segment", "TEXT"),
+    ("r_score", "INTEGER"),
+    ("f_score", "INTEGER"),
+    ("m_score", "INTEGER"),
+    ("rfm_score", "INTEGER"),
+    ("recency_days", "INTEGER"),
+    ("frequency", "INTEGER"),
+    ("monetary", "REAL"),
+    ("payments_recent", "INTEGER"),
+    ("anomalies_recent", "INTEGER"),
+    ("high_risk_payments_recent", "INTEGER"),
+    ("max_risk_score_recent", "INTEGER"),
+    ("worst_risk_recent", "TEXT"),
+    ("last_payment_at", "TEXT"),
+]
+COLUMN_NAMES = [name for name, _ in STORE_COLUMNS]
+
+DEFAULT_MMAP_BYTES = 256 * 1024 * 1024
+SQLITE_MAX_VARIABLES = 900   # per IN (...) of get_many
+_PANDAS_TYPES = {"TEXT": "object", "INTEGER": "Int64", "REAL": "float64"}
+
+
+# ----------------------------------------------------------
+# Export rows (Spark - driver side)
+# ----------------------------------------------------------
+def customer_360_frame(spark, gold, risk_window_days=RISK_WINDOW_DAYS):
+    """One row per current customer with the STORE_COLUMNS (RFM / risk NULL or 0 when there is none)"""
+    from pyspark.sql.functions import array, array_position, col, count, date_format, element_at, lit, when
+    from pyspark.sql.functions import max as spark_max
+    from pyspark.sql.functions import sum as spark_sum
+
+    def load(name):
+        return spark.read.format("delta").load(gold + "/" + name)
+
+    df_customers = load("dim_customer").filter(col("is_current")).select("customer_id", "loyalty_tier")
+    df_rfm = load("ml_customer_rfm").select(
+        "customer_id", "rfm_segment", "r_score", "f_score", "m_score", "rfm_score",
+        "recency_days", "frequency", "monetary")
+
+    # "Recent" = the window before the newest scored payment (also right for the historic demo data)
+    df_payments = load("ml_anomaly_detection")
+    newest = df_payments.agg(spark_max("transaction_timestamp")).collect()[0][0]
+    if newest is not None:
+        df_payments = df_payments.filter(col("transaction_timestamp") > lit(newest - timedelta(days=risk_window_days)))
+
+    levels = array(*[lit(level) for level in RISK_LEVELS])
+    df_risk = df_payments.join(load("ml_rfm_orders").select("order_id", "customer_id"), "order_id") \
+        .groupBy("customer_id").agg(
+            count(lit(1)).alias("payments_recent"),
+            spark_sum(col("is_statistical_anomaly").cast("int")).alias("anomalies_recent"),
+            spark_sum(col("overall_risk").isin("HIGH", "CRITICAL").cast("int")).alias("high_risk_payments_recent"),
+            spark_max("combined_risk_score").alias("max_risk_score_recent"),
+            spark_max(array_position(levels, col("overall_risk"))).alias("_worst"),
+            spark_max("transaction_timestamp").alias("_last_payment")) \
+        .withColumn("worst_risk_recent", when(col("_worst") > 0, element_at(levels, col("_worst").cast("int")))) \
+        .withColumn("last_payment_at", date_format(col("_last_payment"), "yyyy-MM-dd HH:mm:ss"))
+
+    return df_customers \
+        .join(df_rfm, "customer_id", "left") \
+        .join(df_risk, "customer_id", "left") \
+        .fillna(0, subset=["payments_recent", "anomalies_recent", "high_risk_payments_recent"]) \
+        .select(*COLUMN_NAMES)
+
+
+def source_versions(spark, gold):
+    """{table: current Delta version} of SOURCE_TABLES"""
+    from shopsmart.lookups import delta_version
+
+    return {name: delta_version(spark, gold + "/" + name) for name in SOURCE_TABLES}
+
+
+def refresh_customer_360(spark, gold, store_path, force=False, risk_window_days=RISK_WINDOW_DAYS):
+    """Re-export Gold into the store if any source table has a new Delta version -> stats dict"""
+    versions = source_versions(spark, gold)
+    if not force and os.path.exists(store_path) and store_meta(store_path).get("source_versions") == versions:
+        return {"mode": "current", "versions": versions}
+
+    pdf = customer_360_frame(spark, gold, risk_window_days).toPandas()
+    stats = write_snapshot(store_path, pdf, versions)
+    stats.update(mode="refreshed", versions=versions)
+    return stats
+
+
+# ----------------------------------------------------------
+# The store (plain Python + sqlite3 - no Spark needed)
+# ----------------------------------------------------------
+def _create_table(conn):
+    """Create the tables; a store with other columns (older layout) is emptied and recreated"""
+    existing = [row[1] for row in conn.execute("PRAGMA table_info(" + STORE_TABLE + ")")]
+    if existing and existing != COLUMN_NAMES + ["_fingerprint"]:
+        conn.execute("DROP TABLE " + STORE_TABLE)
+    columns = ", ".join(name + " " + sql_type for name, sql_type in STORE_COLUMNS[1:])
+    conn.execute("CREATE TABLE IF NOT EXISTS " + STORE_TABLE + " (customer_id TEXT PRIMARY KEY, " + columns
+                 + ", _fingerprint INTEGER NOT NULL) WITHOUT ROWID")
+    conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+def write_snapshot(path, pdf, versions=None):
+    """Export rows (pandas, COLUMN_NAMES) -> store: writes new / changed rows, deletes missing ones -> counts"""
+    pdf = pdf[COLUMN_NAMES].dropna(subset=["customer_id"]).drop_duplicates("customer_id")
+    # Fixed dtypes, so a row's fingerprint doesn't change when a NULL elsewhere turns an int column into floats
+    pdf = pdf.astype({name: _PANDAS_TYPES[sql_type] for name, sql_type in STORE_COLUMNS})
+    values = pdf.astype(object).where(pdf.notna(), None)
+    fingerprints = pd.util.hash_pandas_object(values.astype(str), index=False).astype("int64")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    try:
+        _create_table(conn)
+        stored = pd.read_sql_query("SELECT customer_id, _fingerprint FROM " + STORE_TABLE, conn)
+
+        current = pd.DataFrame({"customer_id": pdf["customer_id"].to_numpy(), "_fingerprint": fingerprints.to_numpy()})
+        merged = current.merge(stored, on="customer_id", how="left", suffixes=("", "_stored"))
+        is_new = merged["_fingerprint_stored"].isna().to_numpy()
+        changed = is_new | (merged["_fingerprint_stored"] != merged["_fingerprint"]).to_numpy()
+        removed = stored.loc[~stored["customer_id"].isin(current["customer_id"]), "customer_id"].tolist()
+
+        rows = [tuple(row) + (fingerprint,) for row, fingerprint in
+                zip(values[changed].itertuples(index=False, name=None), fingerprints[changed].tolist())]
+        meta = [("source_versions", json.dumps(versions or {})), ("rows", str(len(current))),
+                ("refreshed_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))]
+
+        # One transaction: readers see the old store or the new one, never a mix
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO " + STORE_TABLE + " VALUES ("
+                             + ", ".join(["?"] * (len(COLUMN_NAMES) + 1)) + ")", rows)
+            conn.executemany("DELETE FROM " + STORE_TABLE + " WHERE customer_id = ?", [(c,) for c in removed])
+            conn.executemany("INSERT OR REPLACE INTO store_meta VALUES (?, ?)", meta)
+    finally:
+        conn.close()
+
+    inserted = int(is_new.sum())
+    return {"rows": len(current), "inserted": inserted, "updated": int(changed.sum()) - inserted,
+            "deleted": len(removed), "unchanged": len(current) - int(changed.sum())}
+
+
+def store_meta(path):
+    """{key: value} of the store's metadata (source_versions decoded) - {} for a store without any"""
+    conn = sqlite3.connect("file:" + os.path.abspath(path) + "?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT key, value FROM store_meta").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+    meta = dict(rows)
+    if "source_versions" in meta:
+        meta["source_versions"] = json.loads(meta["source_versions"])
+    return meta
+
+
+class Customer360Store:
+    """Read-only customer_id -> record lookups on a store file (sqlite3: one instance per thread)"""
+
+    def __init__(self, path, mmap_bytes=DEFAULT_MMAP_BYTES):
+        self.path = path
+        self.conn = sqlite3.connect("file:" + os.path.abspath(path) + "?mode=ro", uri=True)
+        # Pages are read straight from the memory-mapped file instead of copied into SQLite's cache
+        self.conn.execute("PRAGMA mmap_size=" + str(int(mmap_bytes)))
+        self._select = "SELECT " + ", ".join(COLUMN_NAMES) + " FROM " + STORE_TABLE + " WHERE customer_id = ?"
+
+    def get(self, customer_id):
+        """Record dict for one customer, None if unknown"""
+        row = self.conn.execute(self._select, (customer_id,)).fetchone()
+        return dict(zip(COLUMN_NAMES, row)) if row is not None else None
+
+    def get_many(self, customer_ids):
+        """{customer_id: record} for the known ones among customer_ids"""
+        found = {}
+        ids = list(dict.fromkeys(customer_ids))
+        for i in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            chunk = ids[i:i + SQLITE_MAX_VARIABLES]
+            query = "SELECT " + ", ".join(COLUMN_NAMES) + " FROM " + STORE_TABLE \
+                + " WHERE customer_id IN (" + ", ".join(["?"] * len(chunk)) + ")"
+            for row in self.conn.execute(query, chunk):
+                found[row[0]] = dict(zip(COLUMN_NAMES, row))
+        return found
+
+    def customer_ids(self):
+        return [row[0] for row in self.conn.execute("SELECT customer_id FROM " + STORE_TABLE)]
+
+    def meta(self):
+        return store_meta(self.path)
+
+    def close(self):
+        self.conn.close()
+
+
+# ----------------------------------------------------------
+# Read benchmark
+# ----------------------------------------------------------
+def _percentiles_us(values):
+    values = sorted(values)
+    return {name: values[min(len(values) - 1, int(q * len(values)))] / 1000 if values else 0.0
+            for name, q in [("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)]}
+
+
+def benchmark_store(path, lookups=100_000, batch_size=100, miss_rate=0.05, seed=42):
+    """Single-key latency percentiles (us) and lookups/sec, plus get_many throughput, on random customer_ids"""
+    store = Customer360Store(path)
+    try:
+        known = store.customer_ids()
+        if not known:
+            raise ValueError("Empty store: " + path)
+        rng = random.Random(seed)
+        keys = [rng.choice(known) if rng.random() >= miss_rate else "MISSING" + str(i) for i in range(lookups)]
+
+        for key in keys[:1000]:   # warm the page cache
+            store.get(key)
+
+        latencies = []
+        hits = 0
+        start = time.perf_counter()
+        for key in keys:
+            t = time.perf_counter_ns()
+            hits += store.get(key) is not None
+            latencies.append(time.perf_counter_ns() - t)
+        single_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(0, len(keys), batch_size):
+            store.get_many(keys[i:i + batch_size])
+        batch_seconds = time.perf_counter() - start
+    finally:
+        store.close()
+
+    return {
+        "customers": len(known),
+        "lookups": lookups,
+        "hit_rate": hits / lookups,
+        "latency_us": _percentiles_us(latencies),
+        "lookups_per_sec": lookups / single_seconds,
+        "batch_size": batch_size,
+        "batched_lookups_per_sec": lookups / batch_seconds,
+        "file_bytes": os.path.getsize(path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up / benchmark a customer-360 store")
+    parser.add_argument("--store", required=True, help="Store file written by refresh_customer_360")
+    parser.add_argument("--lookup", action="append", help="customer_id to print (repeatable)")
+    parser.add_argument("--benchmark", type=int, default=None, help="Run this many random lookups")
+    parser.add_argument("--batch-size", type=int, default=100, help="Keys per get_many in the benchmark")
+    args = parser.parse_args()
+
+    if args.lookup:
+        store = Customer360Store(args.store)
+        for customer_id in args.lookup:
+            print(customer_id + ": " + json.dumps(store.get(customer_id), indent=2))
+        store.close()
+
+    if args.benchmark:
+        result = benchmark_store(args.store, args.benchmark, args.batch_size)
+        latency = result["latency_us"]
+        print("=" * 60)
+        print("CUSTOMER-360 STORE BENCHMARK")
+        print("=" * 60)
+        print("  Store:      " + args.store + " (" + format(result["customers"], ",") + " customers, "
+              + format(result["file_bytes"] // 1024, ",") + " KB)")
+        print("  Lookups:    " + format(result["lookups"], ",") + " (hit rate "
+              + str(round(100 * result["hit_rate"], 1)) + "%)")
+        print("  Latency:    p50 " + str(round(latency["p50"], 1)) + " us | p95 " + str(round(latency["p95"], 1))
+              + " us | p99 " + str(round(latency["p99"], 1)) + " us | max " + str(round(latency["max"], 1)) + " us")
+        print("  Throughput: " + format(int(result["lookups_per_sec"]), ",") + " lookups/sec (single key), "
+              + format(int(result["batched_lookups_per_sec"]), ",") + " lookups/sec (get_many x"
+              + str(result["batch_size"]) + ")")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# ============================================================
+# sessions.py
+# ============================================================
+# PURPOSE:
+#   Build sessions from clickstream events by EVENT TIME -
+#   the same code for the batch file and for the stream.
+#
+# WHY NOT groupBy("session_id")?
+#   session_id is whatever the browser / app sent. It breaks
+#   across devices, restarts and app updates, and the streaming
+#   path had no sessions at all. A session here is a run of
+#   events from one visitor with no gap longer than
+#   SESSION_GAP (30 min, the usual web analytics definition).
+#
+# HOW IT WORKS:
+#   1. visitor_id = customer_id, or a device fingerprint
+#      (ip | device | browser | os) for anonymous events.
+#   2. Spark's session_window(event_timestamp, gap) groups the
+#      events of a visitor into sessions - in a static job it
+#      is a sort per visitor, in a streaming job it keeps only
+#      the OPEN sessions in state.
+#   3. Funnel progression comes from the existing funnel_stage
+#      column ("1-Awareness" ... "4-Purchase"): the furthest
+#      stage reached, when each stage was first reached and
+#      whether the stages were reached in order.
+#   4. Streaming: withWatermark bounds the state - events
+#      later than LATE_DATA_DELAY are dropped, and a session is
+#      emitted ONCE, when the watermark passes its end + gap.
+#      SessionUpsert MERGEs each micro-batch on session_id, so
+#      a replayed batch does not duplicate sessions.
+#
+#   All aggregates are streaming-safe: collect_set instead of
+#   countDistinct (not supported on streams).
+#
+# USAGE:
+#   df_sessions = sessionize(df_clicks_silver)                      # batch
+#   spark.readStream.format("delta").load(SILVER + "/streaming_clickstream") \
+#       .transform(sessionize_stream) \
+#       .writeStream.outputMode("append") \
+#       .foreachBatch(SessionUpsert(spark, SILVER + "/streaming_sessions")) \
+#       .option("checkpointLocation", ...).start()                   # streaming
+# ============================================================
+
+from pyspark.sql.functions import (coalesce, col, collect_set, concat_ws, count, current_timestamp, first,
+                                   greatest, lit, round, session_window, sha2, size, to_date, unix_timestamp,
+                                   when)
+from pyspark.sql.functions import max as spark_max
+from pyspark.sql.functions import min as spark_min
+from pyspark.sql.functions import sum as spark_sum
+
+from shopsmart.incremental import upsert_latest
+
+SESSION_GAP = "30 minutes"
+LATE_DATA_DELAY = "10 minutes"
+
+# funnel_stage values as mapped in the Silver clickstream cells
+FUNNEL_STAGES = ["1-Awareness", "2-Interest", "3-Consideration", "4-Purchase"]
+
+
+def visitor_id():
+    """customer_id, or a device fingerprint for anonymous events"""
+    device = concat_ws("|", col("ip_address"), col("device_type"), col("browser"), col("os"))
+    return coalesce(col("customer_id"), concat_ws(":", lit("anon"), sha2(device, 256)))
+
+
+def _event_count(event_type):
+    return spark_sum(when(col("event_type") == event_type, lit(1)).otherwise(lit(0)))
+
+
+def _first_reached(stage):
+    return spark_min(when(col("funnel_stage") == stage, col("event_timestamp")))
+
+
+def sessionize(df_events, gap=SESSION_GAP):
+    """Silver clickstream events -> one row per (visitor, event-time session)"""
+    stage_at = ["reached_" + s.split("-")[1].lower() + "_at" for s in FUNNEL_STAGES]
+    sessions = df_events \
+        .filter(col("event_timestamp").isNotNull()) \
+        .withColumn("visitor_id", visitor_id()) \
+        .groupBy("visitor_id", session_window(col("event_timestamp"), gap).alias("session_window")) \
+        .agg(
+            first("customer_id", ignorenulls=True).alias("customer_id"),
+            first("device_type", ignorenulls=True).alias("device_type"),
+            first("browser", ignorenulls=True).alias("browser"),
+            first("os", ignorenulls=True).alias("os"),
+            count(lit(1)).alias("total_events"),
+            size(collect_set("event_type")).alias("unique_event_types"),
+            size(collect_set("product_id")).alias("products_viewed"),
+            size(collect_set("session_id")).alias("client_session_ids"),
+            spark_min("event_timestamp").alias("session_start"),
+            spark_max("event_timestamp").alias("session_end"),
+            _event_count("page_view").alias("page_views"),
+            _event_count("product_view").alias("product_views"),
+            _event_count("add_to_cart").alias("cart_adds"),
+            _event_count("remove_from_cart").alias("cart_removes"),
+            _event_count("checkout").alias("checkouts"),
+            _event_count("search").alias("searches"),
+            first("referrer", ignorenulls=True).alias("entry_referrer"),
+            first("geo_city", ignorenulls=True).alias("geo_city"),
+            first("geo_country", ignorenulls=True).alias("geo_country"),
+            *[_first_reached(stage).alias(name) for stage, name in zip(FUNNEL_STAGES, stage_at)]
+        )
+
+    # Furthest stage reached: 0 = none of the funnel events
+    depth = greatest(*[when(col(name).isNotNull(), lit(i + 1)).otherwise(lit(0))
+                       for i, name in enumerate(stage_at)])
+    furthest = when(depth == 0, lit("0-None"))
+    for i, stage in enumerate(FUNNEL_STAGES):
+        furthest = furthest.when(depth == i + 1, lit(stage))
+
+    # In order: every stage up to the furthest one was reached, each no later than the next
+    in_order = lit(True)
+    for i in range(1, len(stage_at)):
+        in_order = in_order & (
+            (depth <= i) |
+            (col(stage_at[i - 1]).isNotNull() & col(stage_at[i]).isNotNull() &
+             (col(stage_at[i - 1]) <= col(stage_at[i]))))
+
+    return sessions \
+        .withColumn("session_id",
+            sha2(concat_ws("|", col("visitor_id"), col("session_start").cast("string")), 256)) \
+        .withColumn("session_duration_sec",
+            unix_timestamp(col("session_end")) - unix_timestamp(col("session_start"))) \
+        .withColumn("session_duration_min", round(col("session_duration_sec") / 60, 2)) \
+        .withColumn("funnel_depth", depth) \
+        .withColumn("furthest_funnel_stage", furthest) \
+        .withColumn("is_ordered_funnel", in_order) \
+        .withColumn("has_cart_activity", col("cart_adds") > 0) \
+        .withColumn("has_checkout", col("checkouts") > 0) \
+        .withColumn("is_bounce", col("total_events") == 1) \
+        .withColumn("is_anonymous", col("customer_id").isNull()) \
+        .withColumn("engagement_level",
+            when(col("total_events") >= 10, lit("High"))
+            .when(col("total_events") >= 5, lit("Medium"))
+            .when(col("total_events") >= 2, lit("Low"))
+            .otherwise(lit("Bounce"))) \
+        .withColumn("session_date", to_date(col("session_start"))) \
+        .drop("session_window") \
+        .withColumn("_silver_processed_at", current_timestamp()) \
+        .withColumn("_silver_version", lit("1.0"))
+
+
+def sessionize_stream(df_stream, gap=SESSION_GAP, late_data_delay=LATE_DATA_DELAY):
+    """sessionize() for a streaming DataFrame - watermarked, so only open sessions stay in state"""
+    return sessionize(df_stream.withWatermark("event_timestamp", late_data_delay), gap)
+
+
+class SessionUpsert:
+    """foreachBatch handler: MERGE the sessions closed in a micro-batch into a Delta table"""
+
+    def __init__(self, spark, path, verbose=True):
+        self.spark = spark
+        self.path = path
+        self.verbose = verbose
+
+    def __call__(self, df, batch_id):
+        df = df.cache()
+        rows = df.count()
+        if rows:
+            upsert_latest(self.spark, df, self.path, ["session_id"], partition_by=["session_date"])
+        df.unpersist()
+        if self.verbose:
+            print("  batch " + str(batch_id) + ": " + str(rows) + " sessions closed")
+        return rows
@@ -0,0 +1,377 @@
+# ============================================================
+# silver.py
+# ============================================================
+# PURPOSE:
+#   The Bronze -> Silver transformations of notebook 1, one
+#   function per table, so the notebook, pipeline.py and the
+#   benchmark all run the SAME code.
+#
+# WHAT STAYS IN THE NOTEBOOK:
+#   Reading Bronze, the data-quality split, writing, the
+#   watermarks and the verification output. The functions
+#   here are pure DataFrame -> DataFrame: no reads, no writes,
+#   no counts.
+#
+# CONVENTIONS:
+#   - build_<table>(df): cleaned, deduplicated, enriched rows -
+#     without the quality filter and without Silver metadata.
+#   - <TABLE>_VALID: the SQL condition a row must meet to be
+#     written (tables whose check is a plain filter; orders and
+#     order_items use the rules in quality.py).
+#   - with_silver_metadata(df): _silver_processed_at / _version.
+#   - write_table(): overwrite (full load) or upsert (incremental).
+#
+# USAGE:
+#   df_orders_silver = with_silver_metadata(build_orders(orders_check.good))
+#   df_prod_silver = with_silver_metadata(build_products(df_prod_bronze).filter(PRODUCTS_VALID))
+#   write_table(spark, df_orders_silver, SILVER + "/orders", ["order_id"], full=FULL_LOAD,
+#               partition_by=["order_year", "order_month"], latest_by="updated_at")
+# ============================================================
+
+from pyspark.sql.functions import (coalesce, col, concat, concat_ws, current_date, current_timestamp, date_format,
+                                   datediff, dayofmonth, dayofweek, floor, greatest, hour, initcap, lit, lower,
+                                   month, regexp_extract, regexp_replace, round, row_number, sha2, substring,
+                                   to_date, to_timestamp, trim, upper, when, year)
+from pyspark.sql.window import Window
+
+from shopsmart.incremental import upsert_latest
+
+SILVER_VERSION = "1.0"
+
+PRODUCTS_VALID = "product_id IS NOT NULL AND price IS NOT NULL AND price > 0"
+INVENTORY_VALID = "product_id IS NOT NULL AND warehouse_id IS NOT NULL AND snapshot_date IS NOT NULL"
+PAYMENTS_VALID = ("transaction_id IS NOT NULL AND order_id IS NOT NULL AND amount IS NOT NULL "
+                  "AND amount > 0 AND transaction_timestamp IS NOT NULL")
+
+
+def with_silver_metadata(df):
+    return df \
+        .withColumn("_silver_processed_at", current_timestamp()) \
+        .withColumn("_silver_version", lit(SILVER_VERSION))
+
+
+def write_table(spark, df, path, keys=None, full=True, partition_by=None, latest_by=None):
+    """Full load: overwrite the table. Incremental: MERGE on keys (see incremental.upsert_latest)"""
+    if full or not keys:
+        writer = df.write.format("delta").mode("overwrite").option("overwriteSchema", True)
+        if partition_by:
+            writer = writer.partitionBy(*partition_by)
+        writer.save(path)
+    else:
+        upsert_latest(spark, df, path, keys, latest_by=latest_by, partition_by=partition_by)
+
+
+# ----------------------------------------------------------
+# Orders (input: rows that passed ORDERS_RULES)
+# ----------------------------------------------------------
+def build_orders(df):
+    """Latest version per order_id, standardized, with amounts / time parts / flags"""
+    latest = Window.partitionBy("order_id").orderBy(col("updated_at").desc())
+
+    return df \
+        .withColumn("_row_num", row_number().over(latest)) \
+        .filter(col("_row_num") == 1) \
+        .drop("_row_num") \
+        .withColumn("order_id", trim(col("order_id"))) \
+        .withColumn("customer_id", trim(col("customer_id"))) \
+        .withColumn("order_status", upper(trim(col("order_status")))) \
+        .withColumn("payment_method", lower(trim(col("payment_method")))) \
+        .withColumn("channel", lower(trim(col("channel")))) \
+        .withColumn("total_amount", col("total_amount").cast("double")) \
+        .withColumn("discount_amount", coalesce(col("discount_amount").cast("double"), lit(0.0))) \
+        .withColumn("shipping_amount", coalesce(col("shipping_amount").cast("double"), lit(0.0))) \
+        .withColumn("net_amount",
+            round(col("total_amount") - col("discount_amount"), 2)) \
+        .withColumn("gross_with_shipping",
+            round(col("total_amount") + col("shipping_amount"), 2)) \
+        .withColumn("discount_pct",
+            when(col("total_amount") > 0,
+                round(col("discount_amount") / col("total_amount") * 100, 2))
+            .otherwise(lit(0.0))) \
+        .withColumn("has_discount",
+            when(col("discount_amount") > 0, lit(True)).otherwise(lit(False))) \
+        .withColumn("has_free_shipping",
+            when(col("shipping_amount") == 0, lit(True)).otherwise(lit(False))) \
+        .withColumn("order_year", year("order_date")) \
+        .withColumn("order_month", month("order_date")) \
+        .withColumn("order_day", dayofmonth("order_date")) \
+        .withColumn("order_hour", hour("order_date")) \
+        .withColumn("order_day_of_week", dayofweek("order_date")) \
+        .withColumn("day_name", date_format("order_date", "EEEE")) \
+        .withColumn("is_weekend",
+            when(dayofweek("order_date").isin(1, 7), lit(True)).otherwise(lit(False))) \
+        .withColumn("is_cancelled",
+            when(col("order_status") == "CANCELLED", lit(True)).otherwise(lit(False))) \
+        .withColumn("is_returned",
+            when(col("order_status") == "RETURNED", lit(True)).otherwise(lit(False)))
+
+
+# ----------------------------------------------------------
+# Order items (ORDER_ITEMS_RULES run on the result)
+# ----------------------------------------------------------
+def build_order_items(df):
+    """One row per item_id, standardized, with line totals"""
+    return df \
+        .dropDuplicates(["item_id"]) \
+        .withColumn("item_id", trim(col("item_id"))) \
+        .withColumn("order_id", trim(col("order_id"))) \
+        .withColumn("product_id", trim(col("product_id"))) \
+        .withColumn("item_status", lower(trim(col("item_status")))) \
+        .withColumn("quantity", col("quantity").cast("int")) \
+        .withColumn("unit_price", col("unit_price").cast("double")) \
+        .withColumn("discount_percent", coalesce(col("discount_percent").cast("double"), lit(0.0))) \
+        .withColumn("line_total",
+            round(col("quantity") * col("unit_price"), 2)) \
+        .withColumn("discount_amount",
+            round(col("quantity") * col("unit_price") * col("discount_percent") / 100, 2)) \
+        .withColumn("net_line_total",
+            round(col("quantity") * col("unit_price") * (1 - col("discount_percent") / 100), 2)) \
+        .withColumn("has_discount",
+            when(col("discount_percent") > 0, lit(True)).otherwise(lit(False)))
+
+
+# ----------------------------------------------------------
+# Customers
+# ----------------------------------------------------------
+def build_customers(df):
+    """Flattened address / preferences, PII masked, age and tenure derived, one row per customer"""
+    return df \
+        .withColumn("address_street", col("address.street")) \
+        .withColumn("address_city", col("address.city")) \
+        .withColumn("address_state", col("address.state")) \
+        .withColumn("address_zip", col("address.zip")) \
+        .withColumn("address_country", col("address.country")) \
+        .withColumn("pref_categories", concat_ws(",", col("preferences.categories"))) \
+        .withColumn("pref_communication", concat_ws(",", col("preferences.communication"))) \
+        .drop("address", "preferences") \
+        .withColumn("customer_id", trim(col("customer_id"))) \
+        .withColumn("date_of_birth", to_date(col("date_of_birth"))) \
+        .withColumn("registration_date", to_date(col("registration_date"))) \
+        .withColumn("gender",
+            when(upper(col("gender")).isin("M", "MALE"), lit("Male"))
+            .when(upper(col("gender")).isin("F", "FEMALE"), lit("Female"))
+            .otherwise(lit("Other"))) \
+        .withColumn("loyalty_tier", initcap(trim(col("loyalty_tier")))) \
+        .withColumn("age",
+            floor(datediff(current_date(), col("date_of_birth")) / 365.25).cast("int")) \
+        .withColumn("age_group",
+            when(col("age") < 25, lit("18-24"))
+            .when(col("age") < 35, lit("25-34"))
+            .when(col("age") < 45, lit("35-44"))
+            .when(col("age") < 55, lit("45-54"))
+            .when(col("age") < 65, lit("55-64"))
+            .otherwise(lit("65+"))) \
+        .withColumn("customer_tenure_days",
+            datediff(current_date(), col("registration_date"))) \
+        .withColumn("tenure_category",
+            when(col("customer_tenure_days") < 90, lit("New (< 3 months)"))
+            .when(col("customer_tenure_days") < 365, lit("Growing (3-12 months)"))
+            .when(col("customer_tenure_days") < 730, lit("Established (1-2 years)"))
+            .otherwise(lit("Loyal (2+ years)"))) \
+        .withColumn("email_hash",
+            when(col("email").isNotNull(), sha2(lower(trim(col("email"))), 256))
+            .otherwise(lit(None))) \
+        .withColumn("email_domain",
+            when(col("email").isNotNull(), regexp_extract(col("email"), "@(.+)$", 1))
+            .otherwise(lit(None))) \
+        .withColumn("phone_masked",
+            when(col("phone").isNotNull(),
+                concat(lit("***-***-"), substring(regexp_replace(col("phone"), "[^0-9]", ""), -4, 4)))
+            .otherwise(lit(None))) \
+        .withColumn("first_name_initial", substring(col("first_name"), 1, 1)) \
+        .withColumn("last_name_initial", substring(col("last_name"), 1, 1)) \
+        .drop("email", "phone") \
+        .dropDuplicates(["customer_id"]) \
+        .withColumn("has_email", col("email_hash").isNotNull()) \
+        .withColumn("_pii_masked", lit(True))
+
+
+# ----------------------------------------------------------
+# Products (written: PRODUCTS_VALID rows)
+# ----------------------------------------------------------
+def build_products(df):
+    """Flattened attributes, typed, with margin / price tier / rating labels, one row per product"""
+    return df \
+        .withColumn("attr_battery_life", col("attributes.battery_life")) \
+        .withColumn("attr_colors", concat_ws(",", col("attributes.color"))) \
+        .withColumn("attr_connectivity", col("attributes.connectivity")) \
+        .drop("attributes") \
+        .withColumn("product_id", trim(col("product_id"))) \
+        .withColumn("product_name", trim(col("product_name"))) \
+        .withColumn("category", initcap(trim(col("category")))) \
+        .withColumn("sub_category", initcap(trim(col("sub_category")))) \
+        .withColumn("brand", initcap(trim(col("brand")))) \
+        .withColumn("supplier_id", trim(col("supplier_id"))) \
+        .withColumn("price", col("price").cast("double")) \
+        .withColumn("cost_price", col("cost_price").cast("double")) \
+        .withColumn("weight_kg", col("weight_kg").cast("double")) \
+        .withColumn("rating", col("rating").cast("double")) \
+        .withColumn("review_count", col("review_count").cast("int")) \
+        .withColumn("is_active", col("is_active").cast("boolean")) \
+        .withColumn("created_at", to_timestamp(col("created_at"))) \
+        .withColumn("updated_at", to_timestamp(col("updated_at"))) \
+        .withColumn("profit_margin",
+            round(col("price") - col("cost_price"), 2)) \
+        .withColumn("margin_pct",
+            when(col("price") > 0,
+                round((col("price") - col("cost_price")) / col("price") * 100, 2))
+            .otherwise(lit(0.0))) \
+        .withColumn("price_tier",
+            when(col("price") < 50, lit("Budget"))
+            .when(col("price") < 200, lit("Mid-Range"))
+            .when(col("price") < 500, lit("Premium"))
+            .otherwise(lit("Luxury"))) \
+        .withColumn("rating_category",
+            when(col("rating") >= 4.5, lit("Excellent"))
+            .when(col("rating") >= 4.0, lit("Very Good"))
+            .when(col("rating") >= 3.0, lit("Good"))
+            .when(col("rating") >= 2.0, lit("Average"))
+            .otherwise(lit("Poor"))) \
+        .withColumn("product_age_days",
+            datediff(current_date(), col("created_at"))) \
+        .dropDuplicates(["product_id"])
+
+
+# ----------------------------------------------------------
+# Inventory (written: INVENTORY_VALID rows)
+# ----------------------------------------------------------
+def build_inventory(df):
+    """Negative stock floored at 0 (and flagged), typed, with availability / reorder columns"""
+    return df \
+        .withColumn("_had_negative_stock",
+            when(col("quantity_on_hand") < 0, lit(True)).otherwise(lit(False))) \
+        .withColumn("quantity_on_hand",
+            when(col("quantity_on_hand") < 0, lit(0))
+            .otherwise(col("quantity_on_hand"))) \
+        .withColumn("product_id", trim(col("product_id"))) \
+        .withColumn("warehouse_id", trim(col("warehouse_id"))) \
+        .withColumn("quantity_on_hand", col("quantity_on_hand").cast("int")) \
+        .withColumn("quantity_reserved", col("quantity_reserved").cast("int")) \
+        .withColumn("reorder_point", col("reorder_point").cast("int")) \
+        .withColumn("reorder_quantity", col("reorder_quantity").cast("int")) \
+        .withColumn("last_restock_date", col("last_restock_date").cast("date")) \
+        .withColumn("snapshot_date", col("snapshot_date").cast("date")) \
+        .withColumn("quantity_available",
+            greatest(col("quantity_on_hand") - col("quantity_reserved"), lit(0))) \
+        .withColumn("stock_status",
+            when(col("quantity_available") == 0, lit("Out of Stock"))
+            .when(col("quantity_available") <= col("reorder_point"), lit("Low Stock"))
+            .when(col("quantity_available") <= col("reorder_point") * 2, lit("Medium Stock"))
+            .otherwise(lit("In Stock"))) \
+        .withColumn("needs_reorder",
+            when(col("quantity_on_hand") <= col("reorder_point"), lit(True))
+            .otherwise(lit(False))) \
+        .withColumn("days_since_restock",
+            datediff(current_date(), col("last_restock_date"))) \
+        .withColumn("stock_value",
+            col("quantity_on_hand").cast("double") * lit(50.0)) \
+        .dropDuplicates(["product_id", "warehouse_id", "snapshot_date"])
+
+
+# ----------------------------------------------------------
+# Clickstream events (sessions: see sessions.sessionize)
+# ----------------------------------------------------------
+def build_clickstream(df):
+    """Flattened geo_location, standardized, with time parts and funnel stage, one row per event"""
+    return df \
+        .withColumn("geo_city", col("geo_location.city")) \
+        .withColumn("geo_country", col("geo_location.country")) \
+        .drop("geo_location") \
+        .withColumn("event_id", trim(col("event_id"))) \
+        .withColumn("session_id", trim(col("session_id"))) \
+        .withColumn("customer_id", trim(col("customer_id"))) \
+        .withColumn("event_type", lower(trim(col("event_type")))) \
+        .withColumn("event_timestamp", to_timestamp(col("event_timestamp"))) \
+        .withColumn("product_id", trim(col("product_id"))) \
+        .withColumn("device_type", lower(trim(col("device_type")))) \
+        .withColumn("browser", initcap(trim(col("browser")))) \
+        .withColumn("os", initcap(trim(col("os")))) \
+        .withColumn("page_url", trim(col("page_url"))) \
+        .withColumn("referrer", lower(trim(col("referrer")))) \
+        .withColumn("search_query", lower(trim(col("search_query")))) \
+        .withColumn("event_date", to_date(col("event_timestamp"))) \
+        .withColumn("event_hour", hour(col("event_timestamp"))) \
+        .withColumn("event_day_of_week", dayofweek(col("event_timestamp"))) \
+        .withColumn("day_name", date_format(col("event_timestamp"), "EEEE")) \
+        .withColumn("is_weekend",
+            when(dayofweek(col("event_timestamp")).isin(1, 7), lit(True))
+            .otherwise(lit(False))) \
+        .withColumn("is_anonymous",
+            when(col("customer_id").isNull(), lit(True)).otherwise(lit(False))) \
+        .withColumn("is_purchase_intent",
+            when(col("event_type").isin("add_to_cart", "checkout"), lit(True))
+            .otherwise(lit(False))) \
+        .withColumn("funnel_stage",
+            when(col("event_type") == "page_view", lit("1-Awareness"))
+            .when(col("event_type") == "product_view", lit("2-Interest"))
+            .when(col("event_type").isin("add_to_cart", "search", "remove_from_cart"), lit("3-Consideration"))
+            .when(col("event_type") == "checkout", lit("4-Purchase"))
+            .otherwise(lit("Other"))) \
+        .dropDuplicates(["event_id"])
+
+
+# ----------------------------------------------------------
+# Payments (written: PAYMENTS_VALID rows)
+# ----------------------------------------------------------
+def build_payments(df):
+    """Typed (several timestamp formats), status standardized, risk / fraud signals, one row per transaction"""
+    return df \
+        .withColumn("transaction_id", trim(col("transaction_id"))) \
+        .withColumn("order_id", trim(col("order_id"))) \
+        .withColumn("payment_method", lower(trim(col("payment_method")))) \
+        .withColumn("card_type", lower(trim(col("card_type")))) \
+        .withColumn("amount", col("amount").cast("double")) \
+        .withColumn("currency", upper(trim(coalesce(col("currency"), lit("USD"))))) \
+        .withColumn("status", lower(trim(col("status")))) \
+        .withColumn("gateway_response_code", trim(col("gateway_response_code"))) \
+        .withColumn("is_international", col("is_international").cast("boolean")) \
+        .withColumn("risk_score", col("risk_score").cast("int")) \
+        .withColumn("ip_address", trim(col("ip_address"))) \
+        .withColumn("device_fingerprint", trim(col("device_fingerprint"))) \
+        .withColumn("transaction_timestamp",
+            coalesce(
+                to_timestamp(col("transaction_timestamp"), "yyyy-MM-dd'T'HH:mm:ss'Z'"),
+                to_timestamp(col("transaction_timestamp"), "yyyy-MM-dd'T'HH:mm:ss"),
+                to_timestamp(col("transaction_timestamp"), "yyyy-MM-dd HH:mm:ss"),
+                to_timestamp(col("transaction_timestamp"))
+            )) \
+        .withColumn("status_original", col("status")) \
+        .withColumn("status",
+            when(col("status").isin("success", "succeeded", "completed", "captured", "approved"),
+                lit("SUCCESS"))
+            .when(col("status").isin("failed", "failure", "declined", "denied", "rejected"),
+                lit("FAILED"))
+            .when(col("status").isin("pending", "processing", "initiated"),
+                lit("PENDING"))
+            .when(col("status").isin("refunded", "reversed", "voided"),
+                lit("REFUNDED"))
+            .otherwise(upper(col("status")))) \
+        .withColumn("risk_level",
+            when(col("risk_score") >= 80, lit("CRITICAL"))
+            .when(col("risk_score") >= 60, lit("HIGH"))
+            .when(col("risk_score") >= 40, lit("MEDIUM"))
+            .when(col("risk_score") >= 20, lit("LOW"))
+            .otherwise(lit("VERY_LOW"))) \
+        .withColumn("is_high_risk",
+            when(col("risk_score") >= 70, lit(True)).otherwise(lit(False))) \
+        .withColumn("transaction_hour", hour(col("transaction_timestamp"))) \
+        .withColumn("is_off_hours",
+            when((hour(col("transaction_timestamp")) >= 23) |
+                 (hour(col("transaction_timestamp")) <= 5),
+                lit(True)).otherwise(lit(False))) \
+        .withColumn("is_high_amount",
+            when(col("amount") > 2000, lit(True)).otherwise(lit(False))) \
+        .withColumn("fraud_signal_count",
+            col("is_high_risk").cast("int") +
+            col("is_off_hours").cast("int") +
+            col("is_high_amount").cast("int") +
+            col("is_international").cast("int")) \
+        .withColumn("fraud_risk_label",
+            when(col("fraud_signal_count") >= 3, lit("CRITICAL"))
+            .when(col("fraud_signal_count") >= 2, lit("HIGH"))
+            .when(col("fraud_signal_count") >= 1, lit("MEDIUM"))
+            .otherwise(lit("LOW"))) \
+        .withColumn("transaction_date", to_date(col("transaction_timestamp"))) \
+        .withColumn("transaction_day_of_week", dayofweek(col("transaction_timestamp"))) \
+        .withColumn("day_name", date_format(col("transaction_timestamp"), "EEEE")) \
+        .dropDuplicates(["transaction_id"])
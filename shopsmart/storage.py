@@ -0,0 +1,71 @@
+# ============================================================
+# storage.py
+# ============================================================
+# PURPOSE:
+#   Where the Bronze / Silver / Gold layers live - ADLS by
+#   default, any other root (a local folder, DBFS, another
+#   account) when SHOPSMART_STORAGE_ROOT is set.
+#
+# WHY?
+#   Every notebook opened with the same block: read the
+#   service principal from Key Vault, set five OAuth configs,
+#   hard-code the abfss:// URLs. That ties the pipeline to the
+#   dev storage account - it can't run on a laptop or in a
+#   benchmark without editing every notebook.
+#
+# HOW IT WORKS:
+#   - No root: abfss://<layer>@dlsshopsmartdev123... and the
+#     OAuth configs from the shopsmart-scope secrets (as before).
+#   - A root: <root>/bronze, <root>/silver, <root>/gold and no
+#     authentication at all.
+#
+# USAGE:
+#   BRONZE, SILVER, GOLD = connect(spark, dbutils)            # notebook
+#   BRONZE, SILVER, GOLD = connect(spark, root="/tmp/shop")   # local
+# ============================================================
+
+import os
+
+STORAGE_ACCOUNT = "dlsshopsmartdev123"
+SECRET_SCOPE = "shopsmart-scope"
+ROOT_ENV = "SHOPSMART_STORAGE_ROOT"
+
+LAYERS = ("bronze", "silver", "gold")
+
+
+def storage_root(root=None):
+    """The configured root, or None for ADLS"""
+    return root or os.environ.get(ROOT_ENV) or None
+
+
+def layer_paths(root=None, account=STORAGE_ACCOUNT):
+    """(BRONZE, SILVER, GOLD) under root - ADLS containers when there is no root"""
+    root = storage_root(root)
+    if root:
+        return tuple(root.rstrip("/") + "/" + layer for layer in LAYERS)
+    return tuple("abfss://" + layer + "@" + account + ".dfs.core.windows.net" for layer in LAYERS)
+
+
+def configure_adls(spark, dbutils, account=STORAGE_ACCOUNT, scope=SECRET_SCOPE):
+    """OAuth 2.0 with the service principal from Key Vault (works on shared / Unity Catalog clusters)"""
+    client_id = dbutils.secrets.get(scope=scope, key="datalake-sp-client-id")
+    client_secret = dbutils.secrets.get(scope=scope, key="datalake-sp-client-secret")
+    tenant_id = dbutils.secrets.get(scope=scope, key="datalake-sp-tenant-id")
+
+    suffix = "." + account + ".dfs.core.windows.net"
+    spark.conf.set("fs.azure.account.auth.type" + suffix, "OAuth")
+    spark.conf.set("fs.azure.account.oauth.provider.type" + suffix,
+                   "org.apache.hadoop.fs.azurebfs.oauth2.ClientCredsTokenProvider")
+    spark.conf.set("fs.azure.account.oauth2.client.id" + suffix, client_id)
+    spark.conf.set("fs.azure.account.oauth2.client.secret" + suffix, client_secret)
+    spark.conf.set("fs.azure.account.oauth2.client.endpoint" + suffix,
+                   "https://login.microsoftonline.com/" + tenant_id + "/oauth2/token")
+
+
+def connect(spark, dbutils=None, root=None, account=STORAGE_ACCOUNT):
+    """Layer paths, with ADLS authentication set up when no root is configured"""
+    if storage_root(root) is None:
+        if dbutils is None:
+            raise ValueError("No storage root: set " + ROOT_ENV + " or pass root= to run outside Databricks")
+        configure_adls(spark, dbutils, account)
+    return layer_paths(root, account)
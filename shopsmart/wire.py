@@ -0,0 +1,274 @@
+# ============================================================
+# wire.py
+# ============================================================
+# PURPOSE:
+#   Compact binary encoding of clickstream events on Event
+#   Hub, with JSON kept as the fallback / debugging format.
+#
+# WHY?
+#   A JSON event repeats ~20 key names, the nested
+#   geo_location object and long enum strings ("product_view",
+#   "desktop", "facebook.com") in every message - ~500 bytes,
+#   paid for in Event Hub throughput units and again in parse
+#   time on the consumer.
+#
+# FORMAT (one event per message):
+#   byte 0    MAGIC 0x00 (a JSON message starts with "{")
+#   byte 1    schema id (a WIRE_SCHEMAS key)
+#   byte 2..  the event as a plain Avro binary record: no key
+#             names, strings length-prefixed, ints zigzag
+#             varints, event_timestamp as epoch millis, and the
+#             enum-like fields as int codes into the schema's
+#             dictionaries (-1 = NULL)
+#   -> ~130 bytes instead of ~500.
+#   An event the schema can't carry (a value outside a
+#   dictionary, an extra field, an unparseable timestamp) is
+#   sent as JSON instead - consumers accept both.
+#
+#   A schema id is never changed once used: new fields or
+#   dictionary values mean a new id, so old messages still in
+#   the hub keep decoding.
+#
+# DECODING:
+#   decode_events() is vectorized in Spark: from_avro runs on
+#   the executors (built into Databricks; local Spark needs the
+#   org.apache.spark:spark-avro package) plus one array lookup
+#   per dictionary column. The result has exactly the Bronze
+#   columns of clickstream.parse_events().
+#
+# USAGE:
+#   payload = encode_event(event)            # bytes (or JSON str as fallback)
+#   df = decode_events(spark, [payload, ...])
+# ============================================================
+
+import json
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+MAGIC = b"\x00"
+
+# Field kinds: string / int / millis are nullable (Avro union with null),
+# code is an int index into the dictionary of that field (-1 = NULL)
+WIRE_SCHEMAS = {
+    1: {
+        "fields": [
+            ("event_id", "string"),
+            ("session_id", "string"),
+            ("customer_id", "string"),
+            ("event_type", "code"),
+            ("event_timestamp", "millis"),
+            ("page_url", "string"),
+            ("product_id", "string"),
+            ("device_type", "code"),
+            ("browser", "code"),
+            ("os", "code"),
+            ("ip_address", "string"),
+            ("geo_city", "string"),
+            ("geo_country", "string"),
+            ("referrer", "code"),
+            ("search_query", "string"),
+            ("page_load_time_ms", "int"),
+            ("time_on_page_sec", "int"),
+            ("scroll_depth_pct", "int"),
+        ],
+        "dictionaries": {
+            "event_type": ["page_view", "product_view", "add_to_cart", "remove_from_cart", "checkout",
+                           "search", "wishlist_add"],
+            "device_type": ["mobile", "desktop", "tablet"],
+            "browser": ["Chrome", "Safari", "Firefox", "Edge"],
+            "os": ["Android", "iOS", "Windows", "MacOS"],
+            "referrer": ["google.com", "facebook.com", "instagram.com", "direct", "email", "twitter.com"],
+        },
+    },
+}
+CURRENT_SCHEMA_ID = 1
+
+# Same text as the producer's JSON event_timestamp
+TIMESTAMP_FORMAT = "yyyy-MM-dd'T'HH:mm:ss.SSS'Z'"
+
+_AVRO_TYPES = {"string": ["null", "string"], "int": ["null", "int"], "millis": ["null", "long"], "code": "int"}
+_INT_MIN, _INT_MAX = -2 ** 31, 2 ** 31 - 1
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+_CODES = {
+    schema_id: {name: {v: i for i, v in enumerate(values)} for name, values in wire["dictionaries"].items()}
+    for schema_id, wire in WIRE_SCHEMAS.items()
+}
+_FIELD_NAMES = {schema_id: set(n for n, _ in wire["fields"]) for schema_id, wire in WIRE_SCHEMAS.items()}
+_PLANS = {
+    schema_id: [(name, kind, _CODES[schema_id].get(name)) for name, kind in wire["fields"]]
+    for schema_id, wire in WIRE_SCHEMAS.items()
+}
+
+
+def avro_schema(schema_id=CURRENT_SCHEMA_ID):
+    """The Avro record schema (JSON) of one wire schema id - what from_avro decodes with"""
+    return json.dumps({
+        "type": "record",
+        "name": "ClickstreamEvent",
+        "namespace": "shopsmart.wire.v" + str(schema_id),
+        "fields": [{"name": n, "type": _AVRO_TYPES[kind]} for n, kind in WIRE_SCHEMAS[schema_id]["fields"]],
+    })
+
+
+# ----------------------------------------------------------
+# Encoding (producer side, plain Python)
+# ----------------------------------------------------------
+def _varint(n):
+    """Avro int / long: zigzag, then 7 bits per byte, low bits first"""
+    n = (n << 1) ^ (n >> 63)
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+# Varints of the common small values (codes, lengths, page metrics) looked up instead of computed
+_SMALL_VARINTS = [_varint(n) for n in range(1 << 13)]
+_NULL_CODE = _varint(-1)
+
+
+@lru_cache(maxsize=4096)
+def _epoch_millis(text):
+    """ISO-8601 text -> epoch millis (cached: a producer batch shares its timestamp)"""
+    ts = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - _EPOCH) // _MILLISECOND
+
+
+def _long(n):
+    return _SMALL_VARINTS[n] if 0 <= n < 8192 else _varint(n)
+
+
+def encode_event(event, schema_id=CURRENT_SCHEMA_ID):
+    """Event dict (generate_event() layout) -> wire bytes, or its JSON text if the schema can't carry it"""
+    flat = dict(event)
+    geo = flat.pop("geo_location", None) or {}
+    flat["geo_city"] = geo.get("city")
+    flat["geo_country"] = geo.get("country")
+    if not flat.keys() <= _FIELD_NAMES[schema_id] or geo.keys() - {"city", "country"}:
+        return json.dumps(event)
+
+    parts = [MAGIC, bytes([schema_id])]
+    try:
+        for name, kind, codes in _PLANS[schema_id]:
+            value = flat.get(name)
+            if codes is not None:
+                parts.append(_NULL_CODE if value is None else _SMALL_VARINTS[codes[value]])
+            elif value is None:
+                parts.append(b"\x00")                # union branch 0: null
+            elif kind == "string":
+                data = value.encode("utf-8")
+                parts += (b"\x02", _long(len(data)), data)
+            elif kind == "int":
+                if value.__class__ is not int or not _INT_MIN <= value <= _INT_MAX:
+                    raise ValueError(name)
+                parts += (b"\x02", _long(value))
+            else:
+                parts += (b"\x02", _long(_epoch_millis(value)))
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return json.dumps(event)
+    return b"".join(parts)
+
+
+def _read_varint(data, at):
+    shift = n = 0
+    while True:
+        byte = data[at]
+        n |= (byte & 0x7F) << shift
+        at += 1
+        if byte < 0x80:
+            return (n >> 1) ^ -(n & 1), at
+        shift += 7
+
+
+def peek_keys(payload):
+    """(event_id, 'yyyy-MM-dd' of event_timestamp) of a wire message without decoding the rest
+
+    (None, None) for an unknown schema id or a truncated message.
+    """
+    if payload[:1] != MAGIC or len(payload) < 2 or payload[1] not in WIRE_SCHEMAS:
+        return None, None
+    event_id = day = None
+    at = 2
+    try:
+        for name, kind in WIRE_SCHEMAS[payload[1]]["fields"]:
+            if kind == "code":
+                _, at = _read_varint(payload, at)
+                continue
+            branch, at = _read_varint(payload, at)
+            if branch == 0:
+                continue
+            value, at = _read_varint(payload, at)
+            if kind == "string":
+                if name == "event_id":
+                    event_id = payload[at:at + value].decode("utf-8")
+                at += value
+            elif name == "event_timestamp":
+                day = datetime.fromtimestamp(value / 1000, timezone.utc).strftime("%Y-%m-%d")
+            if event_id is not None and name == "event_timestamp":
+                break
+    except (IndexError, UnicodeDecodeError, ValueError, OverflowError):
+        return None, None
+    return event_id, day
+
+
+# ----------------------------------------------------------
+# Decoding (consumer side, Spark)
+# ----------------------------------------------------------
+def _field_column(schema_id, name, kind):
+    """One Bronze column from the decoded struct e<schema_id>"""
+    from pyspark.sql.functions import array, col, date_format, element_at, expr, lit, to_utc_timestamp, when
+
+    value = col("e" + str(schema_id) + "." + name)
+    if kind == "code":
+        values = WIRE_SCHEMAS[schema_id]["dictionaries"][name]
+        # Guarded, so a code outside the dictionary is NULL (element_at fails on it under ANSI mode)
+        return when((value >= 0) & (value < len(values)), element_at(array(*[lit(v) for v in values]), value + 1))
+    if kind == "millis":
+        # timestamp_millis is an instant; date_format prints in the session time zone, so shift to UTC
+        utc = to_utc_timestamp(expr("timestamp_millis(e" + str(schema_id) + "." + name + ")"),
+                               expr("current_timezone()"))
+        return date_format(utc, TIMESTAMP_FORMAT)
+    return value
+
+
+def decode_frame(df, body="_body"):
+    """DataFrame with a binary wire-message column -> one flat Bronze row per message
+
+    Same columns as clickstream.parse_events(). A message with an unknown
+    schema id, or one that doesn't decode, keeps its bytes (base64) in
+    _corrupt_record.
+    """
+    from pyspark.sql.avro.functions import from_avro
+    from pyspark.sql.functions import base64, coalesce, col, expr, lit, substring, when
+
+    header = substring(col(body), 1, 2)
+    # Each message is decoded only by the schema its header names (PERMISSIVE: bad bytes -> null struct)
+    decoded = df.select(col(body), *[
+        when(header == lit(MAGIC + bytes([schema_id])),
+             from_avro(expr("substring(" + body + ", 3)"), avro_schema(schema_id), {"mode": "PERMISSIVE"}))
+        .alias("e" + str(schema_id))
+        for schema_id in WIRE_SCHEMAS
+    ])
+
+    columns = []
+    for name, kind in WIRE_SCHEMAS[CURRENT_SCHEMA_ID]["fields"]:
+        versions = [_field_column(schema_id, name, kind) for schema_id in WIRE_SCHEMAS
+                    if name in _FIELD_NAMES[schema_id]]
+        columns.append(coalesce(*versions).alias(name))
+    event_ids = [col("e" + str(schema_id) + ".event_id") for schema_id in WIRE_SCHEMAS]
+    columns.append(when(coalesce(*event_ids).isNull(), base64(col(body))).alias("_corrupt_record"))
+    return decoded.select(*columns)
+
+
+def decode_events(spark, payloads):
+    """Wire messages (bytes) -> Spark DataFrame with the Bronze columns of parse_events()"""
+    import pandas as pd
+
+    raw = spark.createDataFrame(pd.DataFrame({"_body": [bytes(p) for p in payloads]}), "_body binary")
+    return decode_frame(raw)
@@ -0,0 +1,86 @@
+# ============================================================
+# columnar.py
+# ============================================================
+# PURPOSE:
+#   Parquet output for scaled_generator.py (--format parquet).
+#
+#   - Explicit Arrow schemas (from shopsmart/schemas.py), so
+#     Bronze can read the files without an extra inferSchema pass.
+#   - address / preferences / attributes / geo_location are
+#     real struct (and list) columns, not JSON strings.
+#   - Order-derived sources are written Hive-style under
+#     order_year=YYYY/order_month=M, the same partitioning as
+#     silver/orders and gold/fact_sales.
+#
+# Needs pyarrow (pip install pyarrow); the text formats don't.
+# ============================================================
+
+import json
+import os
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+COMPRESSION = "snappy"
+
+# Same declarations the notebooks read Bronze with
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shopsmart.schemas import arrow_schema  # noqa: E402
+
+SOURCES = ["products", "customers", "inventory", "orders", "order_items", "payments", "clickstream"]
+SCHEMAS = {name: arrow_schema(name) for name in SOURCES}
+
+# output -> timestamp column that decides its order_year / order_month partition
+PARTITION_BY = {
+    "orders": "order_date",
+    "order_items": "created_at",   # line items carry their order's timestamp
+    "payments": "transaction_timestamp",
+}
+
+
+def _arrow_column(values, field_type, n):
+    """One generator column (see scaled_generator CHUNK BUILDERS) -> Arrow array"""
+    if isinstance(values, dict):
+        children = [_arrow_column(values[f.name], f.type, n) for f in field_type]
+        return pa.StructArray.from_arrays(children, fields=list(field_type))
+    if isinstance(values, list):
+        # fixed-length array: interleave the element columns row by row
+        flat = np.stack([np.asarray(v) for v in values], axis=1).ravel()
+        offsets = np.arange(0, len(flat) + 1, len(values), dtype=np.int32)
+        return pa.ListArray.from_arrays(pa.array(offsets), pa.array(flat, type=field_type.value_type))
+    if hasattr(values, "encoded"):
+        # RawJSON from a small pool: decode each distinct value once
+        distinct, index = np.unique(values.encoded, return_inverse=True)
+        decoded = pa.array([json.loads(v) for v in distinct.tolist()], type=field_type)
+        return decoded.take(pa.array(index))
+    if np.ndim(values) == 0:
+        values = np.full(n, values)
+    if isinstance(values, np.ma.MaskedArray):
+        return pa.array(np.ma.getdata(values), mask=np.ma.getmaskarray(values), type=field_type)
+    return pa.array(values, type=field_type)
+
+
+def to_table(name, columns, n):
+    schema = SCHEMAS[name]
+    return pa.Table.from_arrays([_arrow_column(columns[f.name], f.type, n) for f in schema], schema=schema)
+
+
+def write_part(name, columns, n, folder, shard):
+    """Write one shard of one output; returns the rows written"""
+    table = to_table(name, columns, n)
+    part = "part-" + str(shard).zfill(5) + ".parquet"
+    if name not in PARTITION_BY:
+        pq.write_table(table, os.path.join(folder, part), compression=COMPRESSION)
+        return n
+
+    # one file per (year, month) this shard touches
+    months = np.asarray(columns[PARTITION_BY[name]]).astype("datetime64[M]").astype(np.int64)
+    for month in np.unique(months):
+        year, month_no = 1970 + month // 12, month % 12 + 1
+        path = os.path.join(folder, "order_year=" + str(year), "order_month=" + str(month_no))
+        os.makedirs(path, exist_ok=True)
+        rows = table.filter(pa.array(months == month))
+        pq.write_table(rows, os.path.join(path, part), compression=COMPRESSION)
+    return n
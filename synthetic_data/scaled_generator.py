@@ -0,0 +1,841 @@
+# ============================================================
+# scaled_generator.py
+# ============================================================
+# PURPOSE:
+#   Builds the same 6 sources as generator.py, but at any
+#   volume (--scale 1000 = 2M orders, ~5M order lines) so the
+#   Bronze -> Silver notebooks can be load-tested.
+#
+# HOW IT WORKS:
+#   1. Faker is only called up-front to fill small lookup pools
+#      (names, cities, companies, ...). Rows index into them.
+#   2. Every source is built in fixed-size chunks with NumPy
+#      (one array per column, no per-row Python loop).
+#   3. Chunks are rendered to CSV / JSON as whole byte matrices
+#      (see STREAMING WRITERS) and written as one part file per
+#      chunk, so memory stays flat no matter how large the run is.
+#   4. Chunks are independent shards (see SHARDING), so they are
+#      spread over a process pool - same bytes for any --workers.
+#   5. --format picks the on-disk layout (see FORMATS): the
+#      original CSV / JSON, Parquet (columnar.py) or gzip'd
+#      JSON Lines for the API-style sources.
+#
+# USAGE:
+#   python generator.py --scale 1000
+#   python generator.py --scale 1000 --chunk-size 250000 --workers 32
+#   python generator.py --scale 1000 --as-of 2024-06-30   # reproducible
+#   python generator.py --scale 1000 --format parquet
+#   python generator.py --scale 1000 --format jsonl.gz
+# ============================================================
+
+import gzip
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from json.encoder import encode_basestring
+
+import numpy as np
+from faker import Faker
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+# Row counts at --scale 1 (same as the original sample)
+BASE_PRODUCTS = 50
+BASE_CUSTOMERS = 500
+BASE_ORDERS = 2000
+BASE_CLICKS = 3000
+
+DEFAULT_CHUNK_SIZE = 100_000
+GZIP_LEVEL = 1  # fast level: the point is ingest cost, not the smallest file
+POOL_SIZE = 1024
+
+CATEGORIES = ['Electronics', 'Fashion', 'Home', 'Sports', 'Beauty']
+WAREHOUSES = ['WH001', 'WH002', 'WH003']
+GENDERS = ["M", "F", "O"]
+LOYALTY_TIERS = ["Bronze", "Silver", "Gold", "Platinum"]
+COMMUNICATION = ["email", "sms", "push"]
+ORDER_STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled', 'returned']
+PAYMENT_METHODS = ['credit_card', 'debit_card', 'upi', 'wallet', 'cod']
+CHANNELS = ['web', 'mobile_app', 'in_store', 'marketplace']
+ITEM_STATUSES = ['packed', 'shipped', 'delivered']
+CARD_TYPES = ["visa", "mastercard", "amex", "none"]
+EVENT_TYPES = ['page_view', 'product_view', 'add_to_cart', 'remove_from_cart', 'checkout', 'search']
+DEVICE_TYPES = ["mobile", "desktop", "tablet"]
+BROWSERS = ["Chrome", "Safari", "Firefox", "Edge"]
+OS_LIST = ["Android", "iOS", "Windows", "MacOS"]
+REFERRERS = ["google.com", "facebook.com", "direct", "email"]
+BATTERY_LIFE = [str(h) + " hours" for h in range(5, 41)]
+
+DAY = 86400
+
+
+# ============================================================
+# LOOKUP POOLS
+# ============================================================
+
+def build_pools(seed=42, size=POOL_SIZE):
+    """Pre-sample every Faker value the sources need into NumPy arrays"""
+    fake = Faker()
+    fake.seed_instance(seed)
+
+    def sample(fn):
+        return np.array([fn() for _ in range(size)])
+
+    pools = {
+        "catch_phrase": sample(fake.catch_phrase),
+        "word": sample(lambda: fake.word().capitalize()),
+        "search_word": sample(fake.word),
+        "company": sample(fake.company),
+        "color": sample(fake.color_name),
+        "first_name": sample(fake.first_name),
+        "last_name": sample(fake.last_name),
+        "email": sample(fake.email),
+        "phone": sample(fake.phone_number),
+        "street": sample(fake.street_address),
+        "city": sample(fake.city),
+        "state": sample(fake.state_abbr),
+        "zip": sample(fake.zipcode),
+        "ipv4": sample(fake.ipv4),
+    }
+
+    # random.sample(categories, k=1..3) / random.sample(channels, k=1..2)
+    # only has a few hundred possible outcomes, so enumerate them once
+    pools["pref_categories"] = _permutation_pool(CATEGORIES, 3)
+    pools["pref_communication"] = _permutation_pool(COMMUNICATION, 2)
+    return pools
+
+
+def _permutation_pool(values, max_k):
+    """All ordered samples of 1..max_k values as JSON arrays, grouped by k"""
+    return [[json.dumps(list(p)) for p in itertools.permutations(values, k)] for k in range(1, max_k + 1)]
+
+
+def _pick_samples(rng, groups, n):
+    """Vectorized random.sample(values, k=randint(1, max_k)) using a permutation pool"""
+    k = rng.integers(0, len(groups), n)
+    sizes = np.array([len(g) for g in groups])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    flat = np.array([p for g in groups for p in g])
+    return flat[offsets[k] + (rng.random(n) * sizes[k]).astype(np.int64)]
+
+
+# ============================================================
+# VECTORIZED COLUMN HELPERS
+# ============================================================
+
+def _choice(rng, values, n):
+    return np.asarray(values)[rng.integers(0, len(values), n)]
+
+
+def _from_pool(rng, pool, n):
+    return pool[rng.integers(0, len(pool), n)]
+
+
+def _as_str(*parts):
+    """Join constant strings and (n, w) code point matrices side by side into a str array
+
+    Only the last matrix may hold NUL padding (short values); earlier ones must be full width.
+    """
+    n = max(len(p) for p in parts if not isinstance(p, str))
+    blocks = [np.broadcast_to(np.array([ord(c) for c in p], dtype=np.uint32), (n, len(p)))
+              if isinstance(p, str) else p for p in parts]
+    out = np.ascontiguousarray(np.hstack(blocks), dtype=np.uint32)
+    return out.view("<U" + str(out.shape[1])).ravel()
+
+
+def _str_codes(values):
+    """Fixed-width str array -> its (n, w) code point matrix"""
+    return np.ascontiguousarray(values).view(np.uint32).reshape(len(values), -1)
+
+
+def _digit_codes(numbers, width=0):
+    """Non-negative ints -> (n, w) digit code points, zero-padded to width (0 = no padding)"""
+    size = max(width, len(str(int(numbers.max()))) if len(numbers) else 1)
+    powers = 10 ** np.arange(size - 1, -1, -1, dtype=np.int64)
+    digits = (numbers[:, None] // powers % 10 + ord("0")).astype(np.uint32)
+    if width:
+        return digits
+    # left-align: shift each row by its count of leading zeros, pad the end with NUL
+    n_digits = np.searchsorted(powers[::-1][1:], numbers, side="right") + 1
+    cols = np.arange(size)
+    digits = np.take_along_axis(digits, np.minimum(cols + (size - n_digits)[:, None], size - 1), axis=1)
+    digits[cols >= n_digits[:, None]] = 0
+    return digits
+
+
+def _ids(prefix, numbers, width=0):
+    """1 -> 'CUST001' for a whole array of numbers (no str() per row)"""
+    return _as_str(prefix, _digit_codes(np.asarray(numbers, dtype=np.int64), width))
+
+
+def _id_width(count, minimum):
+    return max(minimum, len(str(count)))
+
+
+def _hex_codes(rng, n, length, upper=True):
+    """(n, length) code points of random hex digits (length must be even)"""
+    digits = rng.bytes(n * length // 2).hex()
+    raw = np.frombuffer((digits.upper() if upper else digits).encode(), dtype=np.uint8)
+    return raw.reshape(n, length).astype(np.uint32)
+
+
+def _hex(rng, prefix, n, length):
+    """n strings like 'TXN4464FD13': prefix + random upper-case hex"""
+    return _as_str(prefix, _hex_codes(rng, n, length))
+
+
+def _uuid_like(rng, n):
+    """n lower-case strings shaped like str(uuid.uuid4())"""
+    raw = _hex_codes(rng, n, 32, upper=False)
+    return _as_str(raw[:, :8], "-", raw[:, 8:12], "-", raw[:, 12:16], "-", raw[:, 16:20], "-", raw[:, 20:])
+
+
+def _timestamps(rng, anchor, n, min_age_s, max_age_s):
+    """Random datetime64[s] values between anchor - max_age and anchor - min_age"""
+    return anchor - rng.integers(min_age_s, max_age_s + 1, n).astype("timedelta64[s]")
+
+
+def _dates(ts):
+    return ts.astype("datetime64[D]")
+
+
+def _date_str(ts):
+    """'YYYY-MM-DD' - each distinct day is formatted once, rows just index it"""
+    days = ts.astype("datetime64[D]")
+    first = days.min()
+    table = np.datetime_as_string(np.arange(first, days.max() + 1), unit="D").astype("<U10")
+    return table[(days - first).astype(np.int64)]
+
+
+def _two_digits(values):
+    return np.stack([values // 10, values % 10], axis=1) + ord("0")
+
+
+def _ts_str(ts):
+    """'YYYY-MM-DDTHH:MM:SSZ' built from code points instead of per-value formatting"""
+    days = ts.astype("datetime64[D]")
+    seconds = (ts - days).astype(np.int64)
+    out = np.empty((len(ts), 20), dtype=np.uint32)
+    out[:, :10] = _date_str(days).view(np.uint32).reshape(len(ts), 10)
+    out[:, 11:13] = _two_digits(seconds // 3600)
+    out[:, 14:16] = _two_digits(seconds // 60 % 60)
+    out[:, 17:19] = _two_digits(seconds % 60)
+    out[:, [10, 13, 16, 19]] = [ord("T"), ord(":"), ord(":"), ord("Z")]
+    return out.view("<U20").ravel()
+
+
+def _with_nulls(rng, values, null_rate):
+    """Mask ~null_rate of the values; writers emit them as null (the source's dirty data)"""
+    return np.ma.masked_array(values, mask=rng.random(len(values)) <= null_rate)
+
+
+class RawJSON:
+    """A column of values that are already JSON text (written as-is)"""
+
+    def __init__(self, encoded):
+        self.encoded = encoded
+
+    def __len__(self):
+        return len(self.encoded)
+
+
+def _chunks(total, chunk_size):
+    for start in range(0, total, chunk_size):
+        yield start, min(chunk_size, total - start)
+
+
+# ============================================================
+# CHUNK BUILDERS (one {column: array} dict per chunk)
+# ============================================================
+
+def product_prices(rng, n):
+    """First draw of every products shard - orders replay it to price their line items"""
+    return np.round(rng.uniform(15.0, 999.99, n), 2)
+
+
+def build_products(rng, pools, anchor, start, n, id_width):
+    price = product_prices(rng, n)
+    return {
+        "product_id": _ids("PROD", np.arange(start + 1, start + n + 1), id_width),
+        "product_name": _from_pool(rng, pools["catch_phrase"], n),
+        "category": _choice(rng, CATEGORIES, n),
+        "sub_category": _from_pool(rng, pools["word"], n),
+        "brand": _from_pool(rng, pools["company"], n),
+        "price": price,
+        "cost_price": np.round(price * rng.uniform(0.4, 0.7, n), 2),
+        "weight_kg": np.round(rng.uniform(0.1, 15.0, n), 2),
+        "supplier_id": _ids("SUP", rng.integers(1, 11, n), 3),
+        "rating": np.round(rng.uniform(2.0, 5.0, n), 1),
+        "review_count": rng.integers(0, 5001, n),
+        "is_active": rng.random(n) < 0.75,
+        "attributes": {
+            "color": [_from_pool(rng, pools["color"], n), _from_pool(rng, pools["color"], n)],
+            "battery_life": _choice(rng, BATTERY_LIFE, n),
+            "connectivity": "Bluetooth 5.0",
+        },
+        "created_at": _timestamps(rng, anchor, n, 365 * DAY, 730 * DAY),
+        "updated_at": _timestamps(rng, anchor, n, 0, 365 * DAY),
+    }
+
+
+def build_customers(rng, pools, anchor, start, n, id_width):
+    return {
+        "customer_id": _ids("CUST", np.arange(start + 1, start + n + 1), id_width),
+        "first_name": _from_pool(rng, pools["first_name"], n),
+        "last_name": _from_pool(rng, pools["last_name"], n),
+        "email": _with_nulls(rng, _from_pool(rng, pools["email"], n), 0.10),  # 10% dirty data
+        "phone": _from_pool(rng, pools["phone"], n),
+        "date_of_birth": _dates(_timestamps(rng, anchor, n, 18 * 365 * DAY, 80 * 365 * DAY)),
+        "gender": _choice(rng, GENDERS, n),
+        "registration_date": _dates(_timestamps(rng, anchor, n, 0, 730 * DAY)),
+        "loyalty_tier": _choice(rng, LOYALTY_TIERS, n),
+        "address": {
+            "street": _from_pool(rng, pools["street"], n),
+            "city": _from_pool(rng, pools["city"], n),
+            "state": _from_pool(rng, pools["state"], n),
+            "zip": _from_pool(rng, pools["zip"], n),
+            "country": "US",
+        },
+        "preferences": {
+            "categories": RawJSON(_pick_samples(rng, pools["pref_categories"], n)),
+            "communication": RawJSON(_pick_samples(rng, pools["pref_communication"], n)),
+        },
+    }
+
+
+def build_inventory(rng, anchor, product_ids):
+    n = len(product_ids) * len(WAREHOUSES)
+    qty = np.where(
+        rng.random(n) > 0.05,
+        rng.integers(0, 1001, n),
+        rng.integers(-50, 0, n),  # 5% dirty data
+    )
+    return {
+        "product_id": np.repeat(product_ids, len(WAREHOUSES)),
+        "warehouse_id": np.tile(WAREHOUSES, len(product_ids)),
+        "quantity_on_hand": qty,
+        "quantity_reserved": np.maximum(0, (qty * rng.uniform(0.0, 0.3, n)).astype(np.int64)),
+        "reorder_point": 100,
+        "reorder_quantity": 250,
+        "last_restock_date": _dates(_timestamps(rng, anchor, n, 0, 90 * DAY)),
+        "snapshot_date": anchor.astype("datetime64[D]"),
+    }
+
+
+def build_orders(rng, pools, anchor, start, n, widths, product_prices, n_customers):
+    """Orders, their line items and the matching payments for one chunk"""
+    order_ids = _ids("ORD", np.arange(start + 1, start + n + 1), widths["order"])
+    order_ts = _timestamps(rng, anchor, n, 0, 365 * DAY)
+    status = _with_nulls(rng, _choice(rng, ORDER_STATUSES, n), 0.02)  # 2% dirty data
+
+    # ---- Line items: 1-4 per order ----
+    num_items = rng.integers(1, 5, n)
+    total_items = int(num_items.sum())
+    item_order = np.repeat(np.arange(n), num_items)
+    first_item = np.repeat(np.cumsum(num_items) - num_items, num_items)
+    line_no = np.arange(total_items) - first_item
+
+    product_idx = rng.integers(0, len(product_prices), total_items)
+    qty = rng.integers(1, 4, total_items)
+    unit_price = product_prices[product_idx]
+    order_total = np.bincount(item_order, weights=qty * unit_price, minlength=n)
+
+    item_order_ids = order_ids[item_order]
+    order_items = {
+        "item_id": _as_str("ITM", _str_codes(item_order_ids), "-", _digit_codes(line_no)),
+        "order_id": item_order_ids,
+        "product_id": _ids("PROD", product_idx + 1, widths["product"]),
+        "quantity": qty,
+        "unit_price": unit_price,
+        "discount_percent": np.round(rng.uniform(0, 15.0, total_items), 2),
+        "item_status": _choice(rng, ITEM_STATUSES, total_items),
+        "created_at": order_ts[item_order],
+    }
+
+    # ---- Orders ----
+    total_amount = np.round(order_total, 2)
+    orders = {
+        "order_id": order_ids,
+        "customer_id": _ids("CUST", rng.integers(1, n_customers + 1, n), widths["customer"]),
+        "order_date": order_ts,
+        "order_status": status,
+        "total_amount": total_amount,
+        "discount_amount": np.round(order_total * 0.05, 2),
+        "shipping_amount": np.where(order_total < 50, 15.00, 0.00),
+        "payment_method": _choice(rng, PAYMENT_METHODS, n),
+        "channel": _choice(rng, CHANNELS, n),
+        "shipping_address_id": _ids("ADDR", rng.integers(1, 1001, n)),
+        "created_at": order_ts,
+        "updated_at": order_ts + rng.integers(1, 49, n).astype("timedelta64[h]"),
+    }
+
+    # ---- Payments matched to the order ----
+    failed = status.filled("") == 'cancelled'
+    payments = {
+        "transaction_id": _hex(rng, "TXN", n, 8),
+        "order_id": order_ids,
+        "payment_method": _choice(rng, PAYMENT_METHODS, n),
+        "card_type": _choice(rng, CARD_TYPES, n),
+        "amount": total_amount,
+        "currency": "USD",
+        "status": np.where(failed, "failed", "success"),
+        "gateway_response_code": np.where(failed, "05", "00"),
+        "is_international": rng.random(n) < 0.5,
+        "transaction_timestamp": order_ts + rng.integers(1, 16, n).astype("timedelta64[m]"),
+        "risk_score": rng.integers(1, 100, n),
+        "ip_address": _from_pool(rng, pools["ipv4"], n),
+        "device_fingerprint": _uuid_like(rng, n),
+    }
+    return orders, order_items, payments
+
+
+def build_clickstream(rng, pools, anchor, n, widths, n_customers, n_products, n_sessions):
+    product_ids = _ids("PROD", rng.integers(1, n_products + 1, n), widths["product"])
+    customer_ids = _ids("CUST", rng.integers(1, n_customers + 1, n), widths["customer"])
+    return {
+        "event_id": _hex(rng, "EVT", n, 10),
+        "session_id": _ids("SESS", rng.integers(1000, 1000 + n_sessions, n)),
+        "customer_id": _with_nulls(rng, customer_ids, 0.2),
+        "event_type": _choice(rng, EVENT_TYPES, n),
+        "event_timestamp": _timestamps(rng, anchor, n, 0, 30 * DAY),
+        "page_url": _as_str("/products/", _str_codes(product_ids)),
+        "product_id": product_ids,
+        "device_type": _choice(rng, DEVICE_TYPES, n),
+        "browser": _choice(rng, BROWSERS, n),
+        "os": _choice(rng, OS_LIST, n),
+        "ip_address": _from_pool(rng, pools["ipv4"], n),
+        "geo_location": {"city": _from_pool(rng, pools["city"], n), "country": "US"},
+        "referrer": _choice(rng, REFERRERS, n),
+        "search_query": _with_nulls(rng, _from_pool(rng, pools["search_word"], n), 0.8),
+    }
+
+
+# ============================================================
+# STREAMING WRITERS
+# ============================================================
+# A chunk is rendered without any per-row Python work: every
+# column becomes an (n, width) byte matrix whose short values
+# are padded with NUL bytes, the matrices (plus separators /
+# JSON keys) are stacked side by side into rows, and one
+# bytes.translate() drops the padding. Generated text never
+# contains NUL, so the padding is the only thing removed.
+
+FLOAT_DECIMALS = 6  # fixed-point fast path; anything finer falls back to repr
+
+
+def _special_chars(chars, control_chars=False):
+    """Lookup table over byte values; UTF-8 multi-byte sequences are never special"""
+    table = np.zeros(256, dtype=bool)
+    table[[ord(c) for c in chars]] = True
+    if control_chars:
+        table[1:0x20] = True  # 0 is only the padding of short strings
+    return table
+
+
+CSV_SPECIAL = _special_chars(',"\r\n')
+JSON_SPECIAL = _special_chars('"\\', control_chars=True)
+
+
+def _csv_quote(value):
+    if any(c in value for c in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _text_bytes(values):
+    """str array -> UTF-8 byte matrix trimmed to the longest value (ASCII is a plain cast)"""
+    codes = np.ascontiguousarray(values).view(np.uint32).reshape(len(values), -1)
+    used = np.flatnonzero(codes.any(axis=0))
+    codes = codes[:, :used[-1] + 1] if len(used) else codes[:, :0]
+    if codes.size == 0 or codes.max() < 0x80:
+        return codes.astype(np.uint8)
+    encoded = np.array([v.encode("utf-8") for v in values.tolist()])
+    return np.ascontiguousarray(encoded).view(np.uint8).reshape(len(values), encoded.dtype.itemsize)
+
+
+def _digits(magnitude, width):
+    """Non-negative ints -> (n, width) ASCII digits with leading zeros blanked to NUL"""
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    digits = (magnitude[:, None] // powers % 10 + ord("0")).astype(np.uint8)
+    n_digits = np.searchsorted(powers[::-1][1:], magnitude, side="right") + 1
+    digits[np.arange(width) < (width - n_digits)[:, None]] = 0
+    return digits
+
+
+def _sign(values):
+    return np.where(values < 0, ord("-"), 0).astype(np.uint8)[:, None]
+
+
+def _int_parts(values):
+    magnitude = np.abs(values.astype(np.int64))
+    return [_sign(values), _digits(magnitude, len(str(int(magnitude.max()))))]
+
+
+def _float_parts(values):
+    """Floats rounded to a few decimals -> same text as repr() ('15.0', '474.72')"""
+    for decimals in range(1, FLOAT_DECIMALS + 1):
+        scale = 10 ** decimals
+        scaled = np.rint(values * scale)
+        if np.array_equal(scaled / scale, values) and np.abs(scaled).max() < 2 ** 53:
+            break
+    else:
+        return [_text_bytes(values.astype(str))]
+    magnitude = np.abs(scaled).astype(np.int64)
+    whole = _digits(magnitude // scale, len(str(int(magnitude.max() // scale))))
+    frac = _digits(magnitude % scale + scale, decimals + 1)[:, 1:]  # +scale keeps leading zeros
+    # strip trailing zeros but keep one digit after the point
+    zeros = np.cumprod((frac == ord("0"))[:, ::-1], axis=1)[:, ::-1].astype(bool)
+    zeros[:, 0] = False
+    frac[zeros] = 0
+    return [_sign(scaled), whole, b".", frac]
+
+
+def _string_parts(values, fmt):
+    """Text column (maybe masked) -> CSV field or quoted JSON string"""
+    missing = np.ma.getmask(values) if np.ma.is_masked(values) else None
+    text = np.ma.getdata(values)
+    if missing is not None:
+        text = np.where(missing, "", text)
+    body = _text_bytes(text)
+    if fmt == "csv":
+        if CSV_SPECIAL[body].any():
+            return [_text_bytes(np.array([_csv_quote(v) for v in text.tolist()]))]
+        return [body]
+    if JSON_SPECIAL[body].any():
+        tokens = np.array(list(map(encode_basestring, text.tolist())))
+        return [_text_bytes(tokens if missing is None else np.where(missing, "null", tokens))]
+    if missing is None:
+        return [b'"', body, b'"']
+    quote = np.where(missing, 0, ord('"')).astype(np.uint8)[:, None]
+    if body.shape[1] < 4:
+        body = np.hstack([body, np.zeros((len(body), 4 - body.shape[1]), dtype=np.uint8)])
+    body[missing, :4] = np.frombuffer(b"null", dtype=np.uint8)
+    return [quote, body, quote]
+
+
+def _datetime_str(values):
+    """datetime64[D] -> 'YYYY-MM-DD', anything finer -> 'YYYY-MM-DDTHH:MM:SSZ'"""
+    if np.datetime_data(values.dtype)[0] == "D":
+        return _date_str(values)
+    return _ts_str(values.astype("datetime64[s]"))
+
+
+def _column_parts(values, fmt):
+    """One column -> list of byte matrices / constant bytes that make up its text"""
+    if isinstance(values, dict):  # nested struct
+        return _object_parts(values)
+    if isinstance(values, list):  # fixed-length array, one column per element
+        parts = []
+        for i, item in enumerate(values):
+            parts += [b"[" if i == 0 else b", "] + _column_parts(item, fmt)
+        return parts + [b"]"]
+    if isinstance(values, RawJSON):
+        return [_text_bytes(values.encoded)]
+    if isinstance(values, (str, int, float)):  # same value on every row
+        text = json.dumps(values, ensure_ascii=False) if fmt == "json" else _csv_quote(str(values))
+        return [text.encode("utf-8")]
+    if isinstance(values, np.datetime64):
+        values = np.array([values])
+        return _column_parts(_datetime_str(values)[0], fmt)
+    kind = values.dtype.kind
+    if kind == "M":
+        return _string_parts(_datetime_str(values), fmt)
+    if kind == "b":
+        names = ("True", "False") if fmt == "csv" else ("true", "false")
+        return [_text_bytes(np.where(values, *names))]
+    if kind in "iu":
+        return _int_parts(values)
+    if kind == "f":
+        return _float_parts(values)
+    return _string_parts(values, fmt)
+
+
+def _object_parts(columns):
+    """{"name": column} -> one JSON object per row"""
+    parts = []
+    for i, (name, values) in enumerate(columns.items()):
+        parts.append((("{" if i == 0 else ", ") + encode_basestring(name) + ": ").encode("utf-8"))
+        parts += _column_parts(values, "json")
+    return parts + [b"}"]
+
+
+def _num_rows(columns):
+    for values in (columns.values() if isinstance(columns, dict) else columns):
+        if isinstance(values, (dict, list)):
+            return _num_rows(values)
+        if not isinstance(values, (str, int, float)):
+            return len(values)
+    raise ValueError("chunk has no array columns")
+
+
+def _assemble(parts, n):
+    """Lay the parts side by side (one row per record) and drop the NUL padding"""
+    merged = []
+    for part in parts:
+        if isinstance(part, bytes) and merged and isinstance(merged[-1], bytes):
+            merged[-1] += part
+        else:
+            merged.append(part)
+    widths = [len(p) if isinstance(p, bytes) else p.shape[1] for p in merged]
+    # filling a (width, n) buffer and transposing once is much cheaper
+    # than copying many narrow (n, w) slices into a row-major one
+    rows = np.empty((sum(widths), n), dtype=np.uint8)
+    at = 0
+    for part, width in zip(merged, widths):
+        if isinstance(part, bytes):
+            rows[at:at + width] = np.frombuffer(part, dtype=np.uint8)[:, None]
+        else:
+            rows[at:at + width] = part.T
+        at += width
+    return rows.T.tobytes().translate(None, b"\0")
+
+
+def render_csv(columns):
+    """One chunk of CSV rows (no header), each ending in a newline"""
+    parts = []
+    for values in columns.values():
+        parts += _column_parts(values, "csv") + [b","]
+    return _assemble(parts[:-1] + [b"\n"], _num_rows(columns))
+
+
+def render_json_rows(columns, before=b"", after=b"\n"):
+    """One JSON object per row, wrapped in before / after (JSON Lines by default)"""
+    return _assemble([before] + _object_parts(columns) + [after], _num_rows(columns))
+
+
+class ChunkWriter:
+    """Appends column-dict chunks to one file without holding earlier chunks"""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self._file = gzip.open(path, "wb", compresslevel=GZIP_LEVEL) if fmt == "jsonl.gz" else open(path, "wb")
+        if fmt == "json":
+            self._file.write(b"[\n")
+
+    def write(self, columns):
+        n = _num_rows(columns)
+        if n == 0:
+            return
+        if self.fmt == "csv":
+            if self.rows == 0:
+                self._file.write((",".join(columns) + "\n").encode("utf-8"))
+            self._file.write(render_csv(columns))
+        elif self.fmt == "json":
+            # every row starts with ",\n" - except the very first one in the file
+            rows = render_json_rows(columns, before=b",\n", after=b"")
+            self._file.write(memoryview(rows)[2:] if self.rows == 0 else rows)
+        else:
+            self._file.write(render_json_rows(columns))
+        self.rows += n
+
+    def close(self):
+        if self.fmt == "json":
+            self._file.write(b"\n]\n")
+        self._file.close()
+
+
+# ============================================================
+# SHARDING
+# ============================================================
+# Every source is cut into shards of chunk_size rows. A shard's
+# random stream is derived from (seed, source number, shard
+# index) only, so it produces the same bytes whichever process
+# runs it - the worker count never changes the output.
+# Each shard writes its own part file, Spark-style:
+#   source1_orders_pg/orders.csv/part-00000.csv
+# spark.read.csv(".../orders.csv") reads the folder as one table.
+
+# output name -> (folder, file name, text format)
+OUTPUTS = {
+    "products": ("source3_products_mongo", "products.json", "json"),
+    "inventory": ("source5_inventory_csv", "inventory.csv", "csv"),
+    "customers": ("source2_customers_api", "customers.json", "json"),
+    "orders": ("source1_orders_pg", "orders.csv", "csv"),
+    "order_items": ("source1_orders_pg", "order_items.csv", "csv"),
+    "payments": ("source6_payments_api", "payments.json", "json"),
+    "clickstream": ("source4_clickstream_eventhub", "clickstream.json", "jsonl"),
+}
+
+# shard driver -> source number used in its seed
+SOURCE_IDS = {"orders": 1, "customers": 2, "products": 3, "clickstream": 4}
+
+_WORKER = {}
+
+
+def _shard_rng(seed, source, shard):
+    return np.random.default_rng(np.random.SeedSequence([seed, SOURCE_IDS[source], shard]))
+
+
+# ============================================================
+# FORMATS
+# ============================================================
+#   text      orders.csv/part-00000.csv, customers.json/part-00000.json (default)
+#   parquet   orders.parquet/order_year=2024/order_month=5/part-00000.parquet
+#   jsonl.gz  customers.jsonl/part-00000.jsonl.gz - CSV sources stay CSV
+FORMATS = ["text", "parquet", "jsonl.gz"]
+
+
+def _table_layout(name, output_format):
+    """(table folder, writer format, part extension) of one output in one --format"""
+    _, file_name, fmt = OUTPUTS[name]
+    stem, ext = os.path.splitext(file_name)
+    if output_format == "parquet":
+        return stem + ".parquet", "parquet", ".parquet"
+    if output_format == "jsonl.gz" and fmt != "csv":
+        return stem + ".jsonl", "jsonl.gz", ".jsonl.gz"
+    return file_name, fmt, ext
+
+
+def _table_path(output_dir, name, output_format):
+    return os.path.join(output_dir, OUTPUTS[name][0], _table_layout(name, output_format)[0])
+
+
+def _part_path(output_dir, name, shard, output_format="text"):
+    ext = _table_layout(name, output_format)[2]
+    return os.path.join(_table_path(output_dir, name, output_format), "part-" + str(shard).zfill(5) + ext)
+
+
+def _init_worker(config):
+    """Runs once per process: everything a shard needs besides its own rng"""
+    _WORKER.clear()
+    _WORKER.update(config)
+
+
+def _generate_shard(task):
+    source, shard, start, n = task
+    cfg = _WORKER
+    rng = _shard_rng(cfg["seed"], source, shard)
+    pools, anchor, widths = cfg["pools"], cfg["anchor"], cfg["widths"]
+
+    if source == "products":
+        products = build_products(rng, pools, anchor, start, n, widths["product"])
+        outputs = {"products": products, "inventory": build_inventory(rng, anchor, products["product_id"])}
+    elif source == "customers":
+        outputs = {"customers": build_customers(rng, pools, anchor, start, n, widths["customer"])}
+    elif source == "orders":
+        orders, order_items, payments = build_orders(
+            rng, pools, anchor, start, n, widths, cfg["product_prices"], cfg["n_customers"])
+        outputs = {"orders": orders, "order_items": order_items, "payments": payments}
+    else:
+        outputs = {"clickstream": build_clickstream(
+            rng, pools, anchor, n, widths, cfg["n_customers"], cfg["n_products"], cfg["n_sessions"])}
+
+    rows = {}
+    output_format = cfg["output_format"]
+    for name, columns in outputs.items():
+        if output_format == "parquet":
+            import columnar
+            rows[name] = columnar.write_part(
+                name, columns, _num_rows(columns), _table_path(cfg["output_dir"], name, output_format), shard)
+            continue
+        writer = ChunkWriter(_part_path(cfg["output_dir"], name, shard, output_format),
+                             _table_layout(name, output_format)[1])
+        writer.write(columns)
+        writer.close()
+        rows[name] = writer.rows
+    return rows
+
+
+def _all_product_prices(seed, n_products, chunk_size):
+    """order_items.unit_price needs every product's price up front - replay just that draw per shard"""
+    prices = np.empty(n_products)
+    for shard, (start, n) in enumerate(_chunks(n_products, chunk_size)):
+        prices[start:start + n] = product_prices(_shard_rng(seed, "products", shard), n)
+    return prices
+
+
+def _reset_output(output_dir, output_format):
+    """Drop earlier runs (single files or part folders, any format) so no stale parts are left behind"""
+    for name in OUTPUTS:
+        for path in set(_table_path(output_dir, name, f) for f in FORMATS):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        os.makedirs(_table_path(output_dir, name, output_format))
+
+
+# ============================================================
+# MAIN DRIVER
+# ============================================================
+
+def generate_scaled(scale, output_dir="output_data", chunk_size=DEFAULT_CHUNK_SIZE, seed=42,
+                    workers=None, as_of=None, output_format="text"):
+    """Generate all 6 sources at `scale` x the sample size, shard by shard across `workers` processes"""
+
+    if output_format not in FORMATS:
+        raise ValueError("output_format must be one of " + ", ".join(FORMATS) + ", got " + repr(output_format))
+    if output_format == "parquet":
+        import columnar  # noqa: F401 - fail before any work if pyarrow is missing
+
+    workers = workers or os.cpu_count() or 1
+    n_products = BASE_PRODUCTS * scale
+    n_customers = BASE_CUSTOMERS * scale
+    n_orders = BASE_ORDERS * scale
+    n_clicks = BASE_CLICKS * scale
+
+    print("🛍️ Generating ShopSmart AI 6-Source Data at scale " + str(scale)
+          + " on " + str(workers) + " worker(s), format " + output_format + "...")
+    print("   Orders: " + format(n_orders, ",") + " | Customers: " + format(n_customers, ",")
+          + " | Products: " + format(n_products, ",") + " | Clicks: " + format(n_clicks, ","))
+
+    run_start = time.perf_counter()
+    _reset_output(output_dir, output_format)
+    # Pin "now" once for all shards (pass as_of to reproduce a run exactly)
+    now = np.datetime64(as_of, "s") if as_of else np.datetime64(datetime.now().replace(microsecond=0), "s")
+    config = {
+        "seed": seed,
+        "output_dir": output_dir,
+        "output_format": output_format,
+        "pools": build_pools(seed),
+        "anchor": now,
+        "widths": {
+            "product": _id_width(n_products, 3),
+            "customer": _id_width(n_customers, 3),
+            "order": _id_width(n_orders, 5),
+        },
+        "product_prices": _all_product_prices(seed, n_products, chunk_size),
+        "n_products": n_products,
+        "n_customers": n_customers,
+        "n_sessions": 3 * n_clicks,
+    }
+
+    # Big sources first so the pool is never waiting on one long shard at the end
+    tasks = [
+        (source, shard, start, n)
+        for source, total in [("orders", n_orders), ("clickstream", n_clicks),
+                              ("customers", n_customers), ("products", n_products)]
+        for shard, (start, n) in enumerate(_chunks(total, chunk_size))
+    ]
+
+    rows = dict.fromkeys(OUTPUTS, 0)
+    if workers == 1:
+        _init_worker(config)
+        results = map(_generate_shard, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,))
+        results = pool.map(_generate_shard, tasks)
+    try:
+        for done, shard_rows in enumerate(results, 1):
+            for name, count in shard_rows.items():
+                rows[name] += count
+            if done % max(1, len(tasks) // 10) == 0 or done == len(tasks):
+                print("   " + str(done) + "/" + str(len(tasks)) + " shards written")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    for name, count in rows.items():
+        print("   " + _table_layout(name, output_format)[0].ljust(18) + format(count, ",").rjust(14) + " rows")
+    total_rows = sum(rows.values())
+    elapsed = time.perf_counter() - run_start
+    print("✅ Data generation complete! " + format(total_rows, ",") + " rows in "
+          + str(round(elapsed, 1)) + "s (" + format(int(total_rows / elapsed), ",") + " rows/sec)")
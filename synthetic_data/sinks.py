@@ -0,0 +1,276 @@
+# ============================================================
+# sinks.py
+# ============================================================
+# PURPOSE:
+#   Where stream_producer.py sends its events. The producer only
+#   talks to a Sink, so the same code path can be load-tested
+#   without an Azure namespace.
+#
+#   EventHubSink  Azure Event Hub (the real thing)
+#   FileSink      partitioned, rotating local JSON Lines files
+#                 (length-prefixed .bin files for binary payloads)
+#   QueueSink     in-process queue - for tests and for running
+#                 a consumer in the same process
+#
+# HOW IT WORKS:
+#   Every sink mirrors the Event Hub producer API:
+#     batch = sink.new_batch(partition_id)
+#     batch.add(payload)     # ValueError when the batch is full
+#     sink.send_batch(batch)
+#   and records the same counters (events, batches, bytes,
+#   send latency) in sink.stats, whichever backend it is.
+#
+# USAGE:
+#   sink = FileSink("stream_output", partitions=4)
+#   sink = EventHubSink()   # EVENTHUB_CONNECTION_STRING / EVENTHUB_NAME
+# ============================================================
+
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+DEFAULT_PARTITIONS = 4
+MAX_BATCH_BYTES = 1024 * 1024       # Event Hub standard tier limit
+MAX_FILE_BYTES = 128 * 1024 * 1024  # FileSink rotates to a new file after this
+LATENCY_WINDOW = 10_000             # send latencies kept for the percentiles (the most recent ones)
+
+
+class SinkStats:
+    """Throughput and latency counters shared by every sink (safe to update from sender threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.events = 0
+        self.batches = 0
+        self.bytes = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)   # seconds per send_batch call, most recent
+        self.max_latency = 0.0
+
+    def record(self, events, size, seconds):
+        with self._lock:
+            self.events += events
+            self.batches += 1
+            self.bytes += size
+            self.latencies.append(seconds)
+            self.max_latency = max(self.max_latency, seconds)
+
+    def snapshot(self):
+        """Counters so far, with events/sec and p50 / p95 / p99 / max send latency in ms
+
+        The percentiles cover the last LATENCY_WINDOW sends, max all of them.
+        """
+        with self._lock:
+            latencies = list(self.latencies)
+            snap = {"events": self.events, "batches": self.batches, "bytes": self.bytes,
+                    "max_ms": 1000 * self.max_latency}
+        latencies.sort()   # outside the lock: senders are never held up by a snapshot
+        elapsed = time.perf_counter() - self.started
+        snap["elapsed_s"] = elapsed
+        snap["events_per_sec"] = snap["events"] / elapsed if elapsed > 0 else 0.0
+        for name, q in [("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)]:
+            snap[name] = 1000 * latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+        return snap
+
+
+class LocalBatch:
+    """EventDataBatch stand-in for the local sinks: a list of payloads with a size cap"""
+
+    def __init__(self, partition_id, max_size_in_bytes=MAX_BATCH_BYTES):
+        self.partition_id = partition_id
+        self.max_size_in_bytes = max_size_in_bytes
+        self.size_in_bytes = 0
+        self.payloads = []
+
+    def add(self, payload):
+        size = len(payload) + 1   # + newline
+        if self.payloads and self.size_in_bytes + size > self.max_size_in_bytes:
+            raise ValueError("Batch is full (" + str(self.max_size_in_bytes) + " bytes)")
+        self.payloads.append(payload)
+        self.size_in_bytes += size
+
+    def __len__(self):
+        return len(self.payloads)
+
+
+class Sink:
+    """Base class: subclasses implement partition_ids(), new_batch() and _send()"""
+
+    name = "sink"
+
+    def __init__(self):
+        self.stats = SinkStats()
+
+    def describe(self):
+        return self.name
+
+    def partition_ids(self):
+        raise NotImplementedError
+
+    def new_batch(self, partition_id=None):
+        raise NotImplementedError
+
+    def _send(self, batch):
+        raise NotImplementedError
+
+    def send_batch(self, batch):
+        """Send one batch and record its size and latency"""
+        events, size = len(batch), batch.size_in_bytes
+        start = time.perf_counter()
+        self._send(batch)
+        self.stats.record(events, size, time.perf_counter() - start)
+
+    def close(self):
+        pass
+
+
+class _LocalSink(Sink):
+    """Shared by FileSink / QueueSink: fixed partitions "0".."n-1", round-robin when none is given"""
+
+    def __init__(self, partitions=DEFAULT_PARTITIONS, max_batch_bytes=MAX_BATCH_BYTES):
+        super().__init__()
+        self._partition_ids = [str(p) for p in range(partitions)]
+        self._next_partition = itertools.cycle(self._partition_ids)
+        self.max_batch_bytes = max_batch_bytes
+
+    def partition_ids(self):
+        return list(self._partition_ids)
+
+    def new_batch(self, partition_id=None):
+        return LocalBatch(partition_id or next(self._next_partition), self.max_batch_bytes)
+
+
+class FileSink(_LocalSink):
+    """Partitioned JSON Lines files: output_dir/partition=0/events-00000.jsonl, rotated at max_file_bytes
+
+    A batch with binary (wire format) payloads goes to events-00000.bin
+    instead: every payload as a 4-byte big-endian length + its bytes.
+    """
+
+    name = "file"
+
+    def __init__(self, output_dir="stream_output", partitions=DEFAULT_PARTITIONS,
+                 max_file_bytes=MAX_FILE_BYTES, max_batch_bytes=MAX_BATCH_BYTES):
+        super().__init__(partitions, max_batch_bytes)
+        self.output_dir = output_dir
+        self.max_file_bytes = max_file_bytes
+        self._files = {}   # (partition id, extension) -> [open file, file number, bytes written]
+        self._lock = threading.Lock()
+
+    def describe(self):
+        return "file (" + self.output_dir + ")"
+
+    def _open(self, key, number):
+        partition_id, extension = key
+        folder = os.path.join(self.output_dir, "partition=" + partition_id)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "events-" + str(number).zfill(5) + extension)
+        return [open(path, "ab"), number, os.path.getsize(path)]
+
+    def _send(self, batch):
+        if all(isinstance(p, str) for p in batch.payloads):
+            key = (batch.partition_id, ".jsonl")
+            data = ("\n".join(batch.payloads) + "\n").encode("utf-8")
+        else:
+            key = (batch.partition_id, ".bin")
+            records = [p.encode("utf-8") if isinstance(p, str) else p for p in batch.payloads]
+            data = b"".join(len(r).to_bytes(4, "big") + r for r in records)
+        with self._lock:
+            current = self._files.get(key)
+            if current is None:
+                current = self._files[key] = self._open(key, 0)
+            elif current[2] and current[2] + len(data) > self.max_file_bytes:
+                current[0].close()
+                current = self._files[key] = self._open(key, current[1] + 1)
+        # One sender thread per partition, so the file itself needs no lock
+        current[0].write(data)
+        current[0].flush()
+        current[2] += len(data)
+
+    def close(self):
+        for current in self._files.values():
+            current[0].close()
+        self._files.clear()
+
+
+class QueueSink(_LocalSink):
+    """Puts every sent batch on sink.queue as (partition_id, [payload, ...])"""
+
+    name = "queue"
+
+    def __init__(self, partitions=DEFAULT_PARTITIONS, maxsize=0, max_batch_bytes=MAX_BATCH_BYTES):
+        super().__init__(partitions, max_batch_bytes)
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def _send(self, batch):
+        self.queue.put((batch.partition_id, batch.payloads))
+
+
+class EventHubSink(Sink):
+    """Azure Event Hub - one producer client per partition, since clients are not thread-safe"""
+
+    name = "eventhub"
+
+    def __init__(self, connection_str=None, eventhub_name=None):
+        super().__init__()
+        # Only needed for this sink, so the local sinks work without the Azure SDK
+        from azure.eventhub import EventData, EventHubProducerClient
+        self._event_data = EventData
+        self._client_class = EventHubProducerClient
+        self.connection_str = connection_str or os.environ.get("EVENTHUB_CONNECTION_STRING")
+        self.eventhub_name = eventhub_name or os.environ.get("EVENTHUB_NAME", "eh-clickstream")
+        if not self.connection_str:
+            raise ValueError("Missing EVENTHUB_CONNECTION_STRING environment variable")
+        self._clients = {}   # partition id (None = let Event Hub pick) -> producer client
+
+    def describe(self):
+        return "eventhub (" + self.eventhub_name + ")"
+
+    def _client(self, partition_id):
+        client = self._clients.get(partition_id)
+        if client is None:
+            client = self._clients[partition_id] = self._client_class.from_connection_string(
+                conn_str=self.connection_str,
+                eventhub_name=self.eventhub_name
+            )
+        return client
+
+    def partition_ids(self):
+        return self._client(None).get_partition_ids()
+
+    def new_batch(self, partition_id=None):
+        return _EventHubBatch(self._client(partition_id), partition_id, self._event_data)
+
+    def _send(self, batch):
+        batch.client.send_batch(batch.batch)
+
+    def close(self):
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+
+class _EventHubBatch:
+    """EventDataBatch plus the client that created it, behind the LocalBatch interface"""
+
+    def __init__(self, client, partition_id, event_data):
+        self.client = client
+        self.partition_id = partition_id
+        self.batch = client.create_batch(partition_id=partition_id)
+        self._event_data = event_data
+        self.count = 0
+
+    def add(self, payload):
+        self.batch.add(self._event_data(payload))
+        self.count += 1
+
+    @property
+    def size_in_bytes(self):
+        return self.batch.size_in_bytes
+
+    def __len__(self):
+        return self.count
+
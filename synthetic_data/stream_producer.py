@@ -3,7 +3,8 @@
 # ============================================================
 # PURPOSE:
 #   Simulates real-time clickstream events from an e-commerce
-#   website and sends them to Azure Event Hub.
+#   website and sends them to Azure Event Hub - or, with --sink,
+#   to local files or an in-process queue (see sinks.py).
 #
 # HOW IT WORKS:
 #   1. Generates a fake clickstream event (page view, add to
@@ -11,6 +12,17 @@
 #   2. Sends each event as JSON to Azure Event Hub
 #   3. Runs continuously until you press Ctrl+C
 #
+#   --rate switches to HIGH-THROUGHPUT MODE: events are built
+#   in bulk, packed into full batches and sent on several
+#   partitions at once at a target events/sec.
+#
+#   --replay switches to REPLAY MODE: recorded events are sent
+#   again with their original spacing, sped up by --speed.
+#
+#   --format binary sends every event in the compact wire
+#   format of shopsmart/wire.py (~130 bytes instead of ~500)
+#   instead of JSON; the consumer reads both.
+#
 # IN YOUR ARCHITECTURE:
 #   This script simulates the "Clickstream (MongoDB)" and
 #   "Store Sensors (IoT)" data sources sending real-time
@@ -18,29 +30,37 @@
 #
 # USAGE:
 #   python stream_producer.py
+#   python stream_producer.py --rate 20000 --duration 60
+#   python stream_producer.py --rate 50000 --events 1000000 --partitions 8
+#   python stream_producer.py --rate 50000 --duration 30 --sink file   # no Azure needed
+#   python stream_producer.py --rate 50000 --duration 30 --format binary
+#   python stream_producer.py --replay output_data/source4_clickstream_eventhub/clickstream.json --speed 1000
+#   python stream_producer.py --replay stream_output --speed 10 --duration 600
 #   (Press Ctrl+C to stop)
 # ============================================================
 
-from azure.eventhub import EventHubProducerClient, EventData
+import argparse
+import glob
+import gzip
+import heapq
+import itertools
 import json
+import os
+import queue
 import random
+import re
+import sys
+import threading
 import time
 import uuid
-from datetime import datetime
-
-# ============================================================
-# CONFIGURATION
-# ============================================================
-# Replace with your actual connection string
-
-import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 
-EVENTHUB_NAME = os.environ.get("EVENTHUB_NAME", "eh-clickstream")
-CONNECTION_STR = os.environ.get("EVENTHUB_CONNECTION_STRING")
-
-if not CONNECTION_STR:
-    raise ValueError("Missing EVENTHUB_CONNECTION_STRING environment variable")
+from sinks import DEFAULT_PARTITIONS, EventHubSink, FileSink
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shopsmart.schemas import validate_record  # noqa: E402
+from shopsmart.wire import encode_event  # noqa: E402
 
 # ============================================================
 # DATA GENERATORS
@@ -122,23 +142,24 @@ def generate_event():
     return event
 
 
-def send_events(num_events=100, delay_seconds=1):
-    """Send events to Event Hub"""
+def send_events(num_events=100, delay_seconds=1, sink=None, wire_format="json"):
+    """Send events to Event Hub (or any sink from sinks.py), as JSON or in the binary wire format"""
+
+    # Event Hub settings come from EVENTHUB_CONNECTION_STRING / EVENTHUB_NAME
+    owns_sink = sink is None
+    sink = sink or EventHubSink()
 
     print("=" * 60)
     print("SHOPSMART AI - STREAMING PRODUCER")
     print("=" * 60)
-    print("  Event Hub:  " + EVENTHUB_NAME)
-    print("  Namespace:  ehns-shopsmart-dev-123")
+    print("  Sink:       " + sink.describe())
     print("  Events:     " + str(num_events))
     print("  Delay:      " + str(delay_seconds) + " seconds between events")
+    print("  Format:     " + wire_format)
     print("=" * 60)
 
-    # Create producer client
-    producer = EventHubProducerClient.from_connection_string(
-        conn_str=CONNECTION_STR,
-        eventhub_name=EVENTHUB_NAME
-    )
+    # Same fields as the Bronze / streaming schema, or fail before sending anything
+    validate_record("clickstream_event", generate_event())
 
     sent_count = 0
     event_type_counts = {}
@@ -149,12 +170,12 @@ def send_events(num_events=100, delay_seconds=1):
         for i in range(num_events):
             # Generate event
             event = generate_event()
-            event_json = json.dumps(event)
+            payload = encode_event(event) if wire_format == "binary" else json.dumps(event)
 
             # Create batch and send
-            event_data_batch = producer.create_batch()
-            event_data_batch.add(EventData(event_json))
-            producer.send_batch(event_data_batch)
+            event_data_batch = sink.new_batch()
+            event_data_batch.add(payload)
+            sink.send_batch(event_data_batch)
 
             sent_count += 1
 
@@ -176,23 +197,555 @@ def send_events(num_events=100, delay_seconds=1):
     except KeyboardInterrupt:
         print("\n\nStopped by user.")
     finally:
-        producer.close()
+        if owns_sink:
+            sink.close()
 
     # Print summary
     print("\n" + "=" * 60)
     print("STREAMING SUMMARY")
     print("=" * 60)
     print("  Total events sent: " + str(sent_count))
+    print_sink_stats(sink)
     print("\n  Events by type:")
     for et, count in sorted(event_type_counts.items(), key=lambda x: -x[1]):
         print("    " + et.ljust(20) + str(count))
-    print("\nDone! Events are now in Event Hub, ready for Databricks to consume.")
+    print("\nDone! Events are now in " + sink.describe() + ", ready for Databricks to consume.")
+
+
+# ============================================================
+# HIGH-THROUGHPUT MODE
+# ============================================================
+# send_events() above sends one event per batch and sleeps in
+# between, so it tops out around 1 event/sec. For load tests:
+#   1. generate_event_batch() builds thousands of events at once
+#      (one random.choices call per field, JSON by template, or
+#      encode_event() per row for --format binary).
+#   2. Each partition gets its own sender thread and a bounded
+#      queue. The sender packs events into a sink batch until it
+#      is full (or LINGER_SECONDS have passed), then sends it.
+#   3. The pacing loop feeds the queues at --rate events/sec.
+#      When the senders fall behind, the queues fill up and
+#      queue.put() blocks - that is the backpressure.
+
+TICKS_PER_SECOND = 20   # pacing granularity: rate / 20 events per tick
+MAX_PENDING_TICKS = 10  # per-partition queue depth (~0.5s of events)
+LINGER_SECONDS = 0.25   # longest a part-filled batch waits for more events
+
+# Every nullable value pre-encoded as a JSON literal, so a row is one % format
+_CUSTOMERS = CUSTOMER_IDS + [None]
+_CUSTOMER_CUM_WEIGHTS = [0.8 * (i + 1) / len(CUSTOMER_IDS) for i in range(len(CUSTOMER_IDS))] + [1.0]
+_JSON_LITERAL = {v: json.dumps(v) for v in _CUSTOMERS + CITIES + SEARCH_QUERIES}
+
+_EVENT_TEMPLATE = (
+    '{"event_id": "EVT-%s", "session_id": "SESS%d", "customer_id": %s, "event_type": "%s", '
+    '"event_timestamp": "%s", "page_url": "/products/%s", "product_id": "%s", "device_type": "%s", '
+    '"browser": "%s", "os": "%s", "ip_address": "%d.%d.%d.%d", '
+    '"geo_location": {"city": %s, "country": "US"}, "referrer": "%s", "search_query": %s, '
+    '"page_load_time_ms": %d, "time_on_page_sec": %d, "scroll_depth_pct": %d}'
+)
+
+
+def generate_event_batch(n, wire_format="json"):
+    """Generate n events as JSON strings or wire bytes (same fields as generate_event) plus their event types"""
+
+    # One timestamp per batch - a batch covers a few milliseconds at most
+    timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    event_ids = os.urandom(6 * n).hex().upper()
+    event_types = random.choices(EVENT_TYPES, weights=EVENT_WEIGHTS, k=n)
+    products = random.choices(PRODUCT_IDS, k=n)
+    octets = random.choices(range(1, 256), k=4 * n)
+
+    rows = zip(
+        range(0, 12 * n, 12),
+        random.choices(range(10000, 100000), k=n),
+        random.choices(_CUSTOMERS, cum_weights=_CUSTOMER_CUM_WEIGHTS, k=n),
+        event_types,
+        products,
+        random.choices(DEVICE_TYPES, weights=DEVICE_WEIGHTS, k=n),
+        random.choices(BROWSERS, k=n),
+        random.choices(OS_LIST, k=n),
+        range(0, 4 * n, 4),
+        random.choices(CITIES, k=n),
+        random.choices(REFERRERS, k=n),
+        random.choices(SEARCH_QUERIES, k=n),
+        random.choices(range(100, 5001), k=n),
+        random.choices(range(1, 301), k=n),
+        random.choices(range(0, 101), k=n),
+    )
+    if wire_format == "binary":
+        payloads = [
+            encode_event({
+                "event_id": "EVT-" + event_ids[e:e + 12], "session_id": "SESS" + str(session),
+                "customer_id": customer, "event_type": event_type, "event_timestamp": timestamp,
+                "page_url": "/products/" + product, "product_id": product, "device_type": device,
+                "browser": browser, "os": os_name, "ip_address": "%d.%d.%d.%d" % tuple(octets[o:o + 4]),
+                "geo_location": {"city": city, "country": "US"}, "referrer": referrer, "search_query": search,
+                "page_load_time_ms": load_ms, "time_on_page_sec": time_on_page, "scroll_depth_pct": scroll,
+            })
+            for (e, session, customer, event_type, product, device, browser, os_name, o, city, referrer,
+                 search, load_ms, time_on_page, scroll) in rows
+        ]
+        return payloads, event_types
+
+    payloads = [
+        _EVENT_TEMPLATE % (event_ids[e:e + 12], session, _JSON_LITERAL[customer], event_type, timestamp,
+                           product, product, device, browser, os_name, octets[o], octets[o + 1], octets[o + 2],
+                           octets[o + 3], _JSON_LITERAL[city], referrer, _JSON_LITERAL[search], load_ms,
+                           time_on_page, scroll)
+        for (e, session, customer, event_type, product, device, browser, os_name, o, city, referrer,
+             search, load_ms, time_on_page, scroll) in rows
+    ]
+    return payloads, event_types
+
+
+class PartitionSender(threading.Thread):
+    """Drains one partition's queue into full sink batches"""
+
+    def __init__(self, sink, partition_id, max_pending):
+        super().__init__(name="sender-" + partition_id, daemon=True)
+        self.sink = sink
+        self.partition_id = partition_id
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+
+    def run(self):
+        batch, count = self.sink.new_batch(self.partition_id), 0
+        deadline = None   # when the current part-filled batch has to go out
+        try:
+            while True:
+                try:
+                    timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                    payloads = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    batch, count = self._send(batch)
+                    deadline = None
+                    continue
+                if payloads is None:
+                    break
+                for payload in payloads:
+                    try:
+                        batch.add(payload)
+                    except ValueError:
+                        # Batch is at its size limit - ship it and start the next one
+                        batch, count = self._send(batch)
+                        batch.add(payload)
+                        deadline = None
+                    count += 1
+                if count and deadline is None:
+                    deadline = time.monotonic() + LINGER_SECONDS
+            if count:
+                self._send(batch)
+        except Exception as e:
+            self.error = e
+
+    def _send(self, batch):
+        self.sink.send_batch(batch)
+        return self.sink.new_batch(self.partition_id), 0
+
+    def put(self, payloads):
+        """Queue payloads for this partition - blocks while the queue is full (backpressure)"""
+        while True:
+            if self.error is not None:
+                raise self.error
+            try:
+                self.queue.put(payloads, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+
+def print_sink_stats(sink):
+    """The counters every sink keeps (see sinks.SinkStats)"""
+    stats = sink.stats.snapshot()
+    print("  Batches sent:      " + format(stats["batches"], ",")
+          + " (avg " + str(stats["events"] // max(1, stats["batches"])) + " events, "
+          + format(stats["bytes"] // max(1, stats["batches"]), ",") + " bytes/batch)")
+    print("  Send latency:      p50 " + str(round(stats["p50_ms"], 2)) + " ms | p95 "
+          + str(round(stats["p95_ms"], 2)) + " ms | p99 "
+          + str(round(stats["p99_ms"], 2)) + " ms | max " + str(round(stats["max_ms"], 2)) + " ms")
+
+
+def send_events_at_rate(events_per_sec, num_events=None, duration_seconds=None, max_partitions=None,
+                        sink=None, wire_format="json"):
+    """Send events at a target rate, in full batches, across partitions (until num_events / duration / Ctrl+C)"""
+
+    owns_sink = sink is None
+    sink = sink or EventHubSink()
+    partition_ids = sink.partition_ids()
+    if max_partitions:
+        partition_ids = partition_ids[:max_partitions]
+    tick_events = max(1, int(events_per_sec / TICKS_PER_SECOND))
+
+    print("=" * 60)
+    print("SHOPSMART AI - STREAMING PRODUCER (HIGH-THROUGHPUT)")
+    print("=" * 60)
+    print("  Sink:       " + sink.describe())
+    print("  Target:     " + format(events_per_sec, ",") + " events/sec")
+    print("  Partitions: " + ", ".join(partition_ids))
+    print("  Format:     " + wire_format)
+    limits = ([format(num_events, ",") + " events"] if num_events else []) \
+        + ([str(duration_seconds) + " seconds"] if duration_seconds else [])
+    print("  Stop after: " + (" / ".join(limits) or "Ctrl+C"))
+    print("=" * 60)
+
+    # The JSON template must still match the Bronze / streaming schema
+    validate_record("clickstream_event", json.loads(generate_event_batch(1)[0][0]))
+
+    senders = [PartitionSender(sink, pid, MAX_PENDING_TICKS) for pid in partition_ids]
+    for sender in senders:
+        sender.start()
+
+    produced = 0
+    event_type_counts = Counter()
+    blocked = 0.0         # seconds the pacing loop spent waiting on full queues
+    start = time.perf_counter()
+    first_sent = sink.stats.events
+    last_report, last_sent, last_blocked = start, first_sent, 0.0
+
+    try:
+        print("\nSending events... (Press Ctrl+C to stop)\n")
+
+        while num_events is None or produced < num_events:
+            now = time.perf_counter()
+            if duration_seconds and now - start >= duration_seconds:
+                break
+
+            n = tick_events if num_events is None else min(tick_events, num_events - produced)
+            payloads, event_types = generate_event_batch(n, wire_format)
+            event_type_counts.update(event_types)
+
+            # Round-robin slices, one per partition; put() blocks when a sender is behind
+            put_start = time.perf_counter()
+            for i, sender in enumerate(senders):
+                sender.put(payloads[i::len(senders)])
+            blocked += time.perf_counter() - put_start
+            produced += n
+
+            # Once per second: what actually left the process, and how much we waited
+            now = time.perf_counter()
+            if now - last_report >= 1:
+                stats = sink.stats.snapshot()
+                sent = stats["events"]
+                print("  [" + str(int(now - start)).rjust(4) + "s] "
+                      + format(int((sent - last_sent) / (now - last_report)), ",").rjust(9) + " events/sec | "
+                      + format(sent - first_sent, ",").rjust(12) + " sent | "
+                      + str(round(stats["p99_ms"], 1)).rjust(6) + " ms p99 send | "
+                      + str(sum(s.queue.qsize() for s in senders)).rjust(3) + " chunks queued | "
+                      + str(int(100 * (blocked - last_blocked) / (now - last_report))).rjust(3)
+                      + "% waiting on sends")
+                last_report, last_sent, last_blocked = now, sent, blocked
+
+            # Pace to the target rate (no sleep at all if we are behind)
+            delay = start + produced / events_per_sec - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    except KeyboardInterrupt:
+        print("\n\nStopped by user.")
+    finally:
+        for sender in senders:
+            if sender.error is None:
+                sender.queue.put(None)
+        for sender in senders:
+            sender.join()
+        if owns_sink:
+            sink.close()
+
+    elapsed = time.perf_counter() - start
+    sent_count = sink.stats.events - first_sent
+
+    # Print summary
+    print("\n" + "=" * 60)
+    print("STREAMING SUMMARY")
+    print("=" * 60)
+    print("  Total events sent: " + format(sent_count, ",") + " of " + format(produced, ",") + " generated")
+    print_sink_stats(sink)
+    print("  Throughput:        " + format(int(sent_count / elapsed), ",") + " events/sec over "
+          + str(round(elapsed, 1)) + "s")
+    for sender in senders:
+        if sender.error is not None:
+            print("  Partition " + sender.partition_id + " failed: " + repr(sender.error))
+    print("\n  Events by type:")
+    for et, count in event_type_counts.most_common():
+        print("    " + et.ljust(20) + str(count))
+    print("\nDone! Events are now in " + sink.describe() + ", ready for Databricks to consume.")
+
+
+# ============================================================
+# REPLAY MODE
+# ============================================================
+# Sends RECORDED events (the generator's clickstream.json,
+# JSON Lines captured with --sink file or from production)
+# with their original inter-arrival times divided by --speed,
+# so bursts and daily peaks come back as they happened:
+#   1. iter_recorded() reads the files line by line - never a
+#      whole file. A reorder buffer (heap of REORDER_WINDOW
+#      events per file) fixes small disorder; several files
+#      are merged by event_timestamp.
+#   2. An event recorded t seconds after the first one is due
+#      t / speed seconds after the replay started. Its
+#      event_timestamp is rewritten to that moment and its
+#      event_id gets a per-replay suffix (otherwise the Bronze
+#      dedup drops a second replay). Both edits are regex
+#      substitutions on the raw line - no JSON round trip.
+#   3. Due events go out through the same PartitionSender
+#      queues and full batches as --rate mode (re-encoded per
+#      event with --format binary).
+#   4. Reported: achieved vs target events/sec every second,
+#      then p50 / p95 / p99 / max of the schedule lag (how late
+#      a tick went out) and of the per-batch send latency.
+#
+# Events further out of order than the reorder window are
+# sent as soon as they are read (counted as "late in file").
+# Sort big captures by event_timestamp first for exact shapes.
+
+REORDER_WINDOW = 100_000   # events buffered per file to restore event_timestamp order
+
+_TIMESTAMP_FIELD = re.compile(r'("event_timestamp"\s*:\s*")([^"]*)(")')
+_EVENT_ID_FIELD = re.compile(r'("event_id"\s*:\s*")([^"]*)(")')
+
+
+def _parse_timestamp(value):
+    """Recorded event_timestamp -> naive UTC datetime (None if unparseable)"""
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def recorded_files(path):
+    """A JSON Lines file, or every *.json / *.jsonl (.gz) file below a folder (FileSink / generator output)"""
+    if os.path.isfile(path):
+        return [path]
+    # The scaled generator writes clickstream.json/part-*.json: skip the folder, keep its parts
+    return sorted(p for p in glob.glob(os.path.join(path, "**", "*.json*"), recursive=True) if os.path.isfile(p))
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def _iter_file(path, reorder_window, skipped):
+    heap, seq = [], 0
+    with _open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            match = _TIMESTAMP_FIELD.search(line) if line else None
+            ts = _parse_timestamp(match.group(2)) if match else None
+            if ts is None:
+                skipped[0] += bool(line)
+                continue
+            heapq.heappush(heap, (ts, seq, line))
+            seq += 1
+            if len(heap) > reorder_window:
+                yield heapq.heappop(heap)
+    while heap:
+        yield heapq.heappop(heap)
+
+
+def iter_recorded(paths, reorder_window=REORDER_WINDOW, skipped=None):
+    """(original timestamp, raw JSON line) from all files, in (near) event_timestamp order, streamed"""
+    skipped = skipped if skipped is not None else [0]
+    for ts, _, line in heapq.merge(*[_iter_file(p, reorder_window, skipped) for p in paths]):
+        yield ts, line
+
+
+def _percentiles_ms(values):
+    values = sorted(values)
+    return {name: 1000 * values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+            for name, q in [("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)]}
+
+
+def replay_events(path, speed=1.0, num_events=None, duration_seconds=None, max_partitions=None, sink=None,
+                  keep_ids=False, reorder_window=REORDER_WINDOW, wire_format="json"):
+    """Re-send recorded events at their original timing / speed, through the high-throughput senders"""
+
+    paths = recorded_files(path)
+    if not paths:
+        raise ValueError("No recorded events at " + path)
+    owns_sink = sink is None
+    sink = sink or EventHubSink()
+    partition_ids = sink.partition_ids()
+    if max_partitions:
+        partition_ids = partition_ids[:max_partitions]
+
+    print("=" * 60)
+    print("SHOPSMART AI - STREAMING PRODUCER (REPLAY)")
+    print("=" * 60)
+    print("  Sink:       " + sink.describe())
+    print("  Recording:  " + path + " (" + str(len(paths)) + " file(s))")
+    print("  Speed:      " + str(speed) + "x")
+    print("  Format:     " + wire_format)
+    print("  Partitions: " + ", ".join(partition_ids))
+    limits = ([format(num_events, ",") + " events"] if num_events else []) \
+        + ([str(duration_seconds) + " seconds"] if duration_seconds else [])
+    print("  Stop after: " + (" / ".join(limits) or "end of recording"))
+    print("=" * 60)
+
+    # The recording must still match the Bronze / streaming schema
+    skipped = [0]
+    events = iter_recorded(paths, reorder_window, skipped)
+    first = next(events, None)
+    if first is None:
+        raise ValueError("No event with a readable event_timestamp in " + path)
+    first_record = json.loads(first[1])
+    validate_record("clickstream_event" if "page_load_time_ms" in first_record else "clickstream", first_record)
+
+    senders = [PartitionSender(sink, pid, MAX_PENDING_TICKS) for pid in partition_ids]
+    for sender in senders:
+        sender.start()
+
+    replay_suffix = "-R" + uuid.uuid4().hex[:6].upper()
+    first_ts = first[0]
+    start_wall = datetime.utcnow()
+    start = time.perf_counter()
+    first_sent = sink.stats.events
+
+    produced = 0
+    late_in_file = 0
+    lags = []                 # seconds each tick went out after its due time
+    tick, payloads = 0, []    # tick = 1 / TICKS_PER_SECOND slot of the replay clock
+    last_report, last_sent, last_produced = start, first_sent, 0
+
+    def send_tick():
+        # Wait for the tick's due time (no wait if we are behind), then fan out round-robin
+        delay = start + tick / TICKS_PER_SECOND - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        lags.append(max(0.0, time.perf_counter() - (start + tick / TICKS_PER_SECOND)))
+        for i, sender in enumerate(senders):
+            sender.put(payloads[i::len(senders)])
+
+    try:
+        print("\nReplaying events... (Press Ctrl+C to stop)\n")
+
+        last_offset = 0.0
+        for ts, line in itertools.chain([first], events):
+            offset = (ts - first_ts).total_seconds() / speed
+            if offset < last_offset:
+                late_in_file += 1
+                offset = last_offset
+            last_offset = offset
+            if duration_seconds and offset >= duration_seconds:
+                break
+
+            event_tick = int(offset * TICKS_PER_SECOND)
+            if event_tick > tick and payloads:
+                send_tick()
+                payloads = []
+            tick = max(tick, event_tick)
+
+            timestamp = (start_wall + timedelta(seconds=offset)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+            line = _TIMESTAMP_FIELD.sub(lambda m: m.group(1) + timestamp + m.group(3), line, count=1)
+            if not keep_ids:
+                line = _EVENT_ID_FIELD.sub(lambda m: m.group(1) + m.group(2) + replay_suffix + m.group(3),
+                                           line, count=1)
+            payloads.append(encode_event(json.loads(line)) if wire_format == "binary" else line)
+            produced += 1
+
+            # Once per second: target (what the recording had due - reading never runs more
+            # than a tick ahead of the clock) vs achieved (what left the process)
+            now = time.perf_counter()
+            if now - last_report >= 1:
+                stats = sink.stats.snapshot()
+                print("  [" + str(int(now - start)).rjust(4) + "s] target "
+                      + format(int((produced - last_produced) / (now - last_report)), ",").rjust(9) + " | achieved "
+                      + format(int((stats["events"] - last_sent) / (now - last_report)), ",").rjust(9)
+                      + " events/sec | " + format(stats["events"] - first_sent, ",").rjust(12) + " sent | lag "
+                      + str(round(1000 * (lags[-1] if lags else 0.0), 1)).rjust(7) + " ms")
+                last_report, last_sent, last_produced = now, stats["events"], produced
+
+            if num_events and produced >= num_events:
+                break
+        if payloads:
+            send_tick()
+
+    except KeyboardInterrupt:
+        print("\n\nStopped by user.")
+    finally:
+        for sender in senders:
+            if sender.error is None:
+                sender.queue.put(None)
+        for sender in senders:
+            sender.join()
+        if owns_sink:
+            sink.close()
+
+    elapsed = time.perf_counter() - start
+    sent_count = sink.stats.events - first_sent
+    replayed_span = last_offset * speed
+    lag = _percentiles_ms(lags)
+
+    # Print summary
+    print("\n" + "=" * 60)
+    print("REPLAY SUMMARY")
+    print("=" * 60)
+    print("  Total events sent: " + format(sent_count, ",") + " of " + format(produced, ",") + " replayed")
+    print("  Recording span:    " + str(round(replayed_span, 1)) + "s replayed in " + str(round(elapsed, 1))
+          + "s (" + str(speed) + "x)")
+    print("  Target rate:       " + format(int(produced / max(last_offset, 1e-9)), ",") + " events/sec (average)")
+    print("  Achieved rate:     " + format(int(sent_count / elapsed), ",") + " events/sec")
+    print("  Schedule lag:      p50 " + str(round(lag["p50"], 1)) + " ms | p95 " + str(round(lag["p95"], 1))
+          + " ms | p99 " + str(round(lag["p99"], 1)) + " ms | max " + str(round(lag["max"], 1)) + " ms")
+    print_sink_stats(sink)
+    if late_in_file or skipped[0]:
+        print("  Late in file:      " + format(late_in_file, ",") + " (sent right away) | unreadable lines: "
+              + format(skipped[0], ","))
+    for sender in senders:
+        if sender.error is not None:
+            print("  Partition " + sender.partition_id + " failed: " + repr(sender.error))
+    print("\nDone! Events are now in " + sink.describe() + ", ready for Databricks to consume.")
 
 
 # ============================================================
 # MAIN
 # ============================================================
 if __name__ == "__main__":
-    # Send 50 events with 1 second delay (takes ~1 minute)
-    # Change num_events to send more, delay_seconds for speed
-    send_events(num_events=50, delay_seconds=1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Send ShopSmart clickstream events to Event Hub")
+    parser.add_argument("--sink", default="eventhub", choices=["eventhub", "file"],
+                        help="eventhub (needs EVENTHUB_CONNECTION_STRING) or file (local JSON Lines)")
+    parser.add_argument("--output-dir", default="stream_output", help="Folder for --sink file")
+    parser.add_argument("--rate", type=int, default=None,
+                        help="Target events/sec (high-throughput mode). Omit for the 1 event/sec demo.")
+    parser.add_argument("--events", type=int, default=None, help="Stop after this many events")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stop after this many seconds (--rate / --replay only)")
+    parser.add_argument("--partitions", type=int, default=None,
+                        help="Event Hub: send on the first N partitions only (--rate / --replay only). "
+                             "File: number of partition folders (default: 4).")
+    parser.add_argument("--delay", type=float, default=1, help="Seconds between events in demo mode")
+    parser.add_argument("--format", default="json", choices=["json", "binary"],
+                        help="json, or binary: the compact wire format of shopsmart/wire.py")
+    parser.add_argument("--replay", default=None,
+                        help="Replay recorded events from this JSON Lines file / folder (replay mode)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed: 1 = original timing, 1000 = 1000x faster (--replay only)")
+    parser.add_argument("--keep-ids", action="store_true",
+                        help="Replay with the recorded event_ids (Bronze dedup then drops repeats)")
+    parser.add_argument("--reorder-window", type=int, default=REORDER_WINDOW,
+                        help="Events buffered per file to put them in event_timestamp order (--replay only)")
+    args = parser.parse_args()
+
+    if args.sink == "file":
+        sink = FileSink(args.output_dir, partitions=args.partitions or DEFAULT_PARTITIONS)
+    else:
+        sink = EventHubSink()
+
+    try:
+        if args.replay:
+            replay_events(args.replay, speed=args.speed, num_events=args.events, duration_seconds=args.duration,
+                          max_partitions=args.partitions, sink=sink, keep_ids=args.keep_ids,
+                          reorder_window=args.reorder_window, wire_format=args.format)
+        elif args.rate:
+            send_events_at_rate(args.rate, num_events=args.events, duration_seconds=args.duration,
+                                max_partitions=args.partitions, sink=sink, wire_format=args.format)
+        else:
+            # Send 50 events with 1 second delay (takes ~1 minute)
+            # Change --events to send more, --delay for speed
+            send_events(num_events=args.events or 50, delay_seconds=args.delay, sink=sink,
+                        wire_format=args.format)
+    finally:
+        sink.close()
\ No newline at end of file
@@ -0,0 +1,28 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "synthetic_data"))
+
+
+@pytest.fixture(scope="session")
+def spark():
+    """Local SparkSession with spark-avro - skipped where there is no Java"""
+    if not (os.environ.get("JAVA_HOME") or shutil.which("java")):
+        pytest.skip("local Spark needs Java")
+    pyspark = pytest.importorskip("pyspark")
+    from pyspark.sql import SparkSession
+
+    session = SparkSession.builder \
+        .master("local[2]") \
+        .appName("shopsmart-tests") \
+        .config("spark.sql.shuffle.partitions", "2") \
+        .config("spark.ui.enabled", "false") \
+        .config("spark.jars.packages", "org.apache.spark:spark-avro_2.12:" + pyspark.__version__) \
+        .getOrCreate()
+    yield session
+    session.stop()
@@ -0,0 +1,109 @@
+import json
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("delta")
+
+from shopsmart.dedup import BloomFilter, EventDeduplicator, ScalableBloomFilter, _day, event_keys  # noqa: E402
+from shopsmart.wire import encode_event  # noqa: E402
+from stream_producer import generate_event  # noqa: E402
+
+
+def _ids(prefix, n):
+    return [prefix + str(i) for i in range(n)]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter.for_capacity(10_000, 0.001)
+    seen = _ids("seen-", 10_000)
+    bloom.add(seen)
+    assert bloom.contains(seen).all()
+
+
+def test_bloom_filter_false_positive_rate_at_capacity():
+    bloom = BloomFilter.for_capacity(50_000, 0.001)
+    bloom.add(_ids("seen-", 50_000))
+    rate = bloom.contains(_ids("new-", 200_000)).mean()
+    assert rate < 0.002
+
+
+def test_scalable_filter_stays_under_fp_rate_past_capacity():
+    fixed = BloomFilter.for_capacity(20_000, 0.001)
+    scalable = ScalableBloomFilter(20_000, 0.001)
+    seen = _ids("seen-", 100_000)   # 5x the first filter's capacity
+    for i in range(0, len(seen), 10_000):
+        fixed.add(seen[i:i + 10_000])
+        scalable.add(seen[i:i + 10_000])
+
+    probe = _ids("new-", 100_000)
+    assert fixed.contains(probe).mean() > 0.5          # a saturated fixed filter drops most new events
+    assert scalable.contains(probe).mean() < 0.001
+    assert scalable.contains(seen).all()
+    assert [f.capacity for f in scalable.generations] == [20_000, 40_000, 80_000]
+    assert scalable.events == 100_000
+
+
+def test_scalable_filter_reports_changed_generations():
+    scalable = ScalableBloomFilter(100, 0.01)
+    assert scalable.add(_ids("a", 50)) == [0]
+    assert scalable.add(_ids("b", 100)) == [0, 1]
+    assert scalable.add(_ids("c", 10)) == [1]
+
+
+def test_bloom_filter_survives_serialization():
+    bloom = BloomFilter.for_capacity(1000, 0.01)
+    bloom.add(_ids("a", 1000))
+    copy = BloomFilter.from_bytes(bloom.num_bits, bloom.num_hashes, bloom.to_bytes(), bloom.events, bloom.capacity)
+    assert (copy.bits == bloom.bits).all()
+    assert copy.events == 1000 and copy.capacity == 1000
+
+
+def test_event_keys_from_json_and_wire_payloads():
+    events = [generate_event() for _ in range(3)]
+    payloads = [json.dumps(events[0]), encode_event(events[1]), json.dumps(events[2]), "not json"]
+    ids, days = event_keys(payloads)
+    assert ids.tolist()[:3] == [e["event_id"] for e in events]
+    assert days.tolist()[:3] == [e["event_timestamp"][:10] for e in events]
+    assert pd.isna(ids.iloc[3]) and pd.isna(days.iloc[3])
+
+
+def _dedup(events_per_day=1_000_000):
+    dedup = EventDeduplicator(spark=None, state_path=None, events_per_day=events_per_day)
+    dedup.filters = {}   # no state table: nothing to load
+    return dedup
+
+
+def _fold_pending(dedup):
+    """What commit() does after the Bronze write, without persisting the state"""
+    for day, ids in dedup._pending:
+        dedup._filter(day).add(ids)
+    dedup._pending = []
+
+
+def test_deduplicator_drops_repeats_and_seen_ids():
+    dedup = _dedup()
+    events = [generate_event() for _ in range(100)]
+    payloads = [json.dumps(e) for e in events]
+
+    kept = dedup.new_payloads(payloads + payloads[:10])
+    assert kept == payloads
+    _fold_pending(dedup)
+
+    fresh = [json.dumps(generate_event()) for _ in range(20)]
+    assert dedup.new_payloads(payloads[50:] + fresh) == fresh
+    assert dedup.summary()["duplicates"] == 60
+
+
+def test_deduplicator_keeps_new_events_past_daily_capacity():
+    dedup = _dedup(events_per_day=1000)
+    day = _day() + "T12:00:00.000Z"   # inside the retention window
+    kept = 0
+    for b in range(10):
+        payloads = ['{"event_id": "EVT-' + str(b) + "-" + str(i) + '", "event_timestamp": "' + day + '"}'
+                    for i in range(1000)]
+        kept += len(dedup.new_payloads(payloads))
+        _fold_pending(dedup)
+    assert kept >= 9_970   # 10x the first filter's capacity, still ~0.1% wrongly dropped
+    assert dedup.summary()["filter_generations"] == 4   # 1000 + 2000 + 4000 + 8000 >= 10,000
+    assert dedup.new_payloads(payloads) == []
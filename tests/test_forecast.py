@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("delta")
+
+from shopsmart.forecast import SERIES_KEYS, STATE_SCHEMA, fit_bucket, fold_window  # noqa: E402
+
+STATE_COLUMNS = [f.name for f in STATE_SCHEMA.fields]
+
+
+def _sales(days, series=20, seed=7):
+    """Random daily units; series start on different days and skip some days"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for s in range(series):
+        start = int(rng.integers(0, days // 2))
+        for day in range(start, days):
+            if day == start or rng.random() > 0.2:
+                rows.append(("P" + str(s % 7), "W" + str(s), 1000 + day, float(rng.poisson(5 + s))))
+    return pd.DataFrame(rows, columns=SERIES_KEYS + ["epoch_day", "units"])
+
+
+def _empty_state():
+    return pd.DataFrame({name: pd.Series(dtype="float64") for name in STATE_COLUMNS}) \
+        .astype({"product_id": "object", "warehouse_id": "object"})
+
+
+def _sorted(state):
+    return state.sort_values(SERIES_KEYS).reset_index(drop=True)
+
+
+def test_incremental_fold_equals_full_fold():
+    sales = _sales(60)
+    full = fit_bucket(_empty_state(), sales, 1059)
+
+    state = _empty_state()
+    for through_day in [1019, 1020, 1040, 1059]:
+        after_day = state["last_epoch_day"].max() if len(state) else -1
+        new = sales[(sales["epoch_day"] > after_day) & (sales["epoch_day"] <= through_day)]
+        state = fit_bucket(state, new, through_day)
+
+    pd.testing.assert_frame_equal(_sorted(state)[STATE_COLUMNS], _sorted(full)[STATE_COLUMNS])
+
+
+def test_days_without_sales_count_as_zero():
+    sales = pd.DataFrame({"product_id": ["P1"], "warehouse_id": ["W1"], "epoch_day": [10], "units": [8.0]})
+    state = fit_bucket(_empty_state(), sales, 15)
+    row = state.iloc[0]
+    assert row["first_epoch_day"] == 10 and row["last_epoch_day"] == 15
+    assert row["history_days"] == 6
+    assert 0 < row["level"] < 8.0
+
+
+def test_constant_demand_converges_without_error():
+    sales = pd.DataFrame({"product_id": "P1", "warehouse_id": "W1", "epoch_day": range(100), "units": 4.0})
+    row = fit_bucket(_empty_state(), sales, 99).iloc[0]
+    assert row["level"] == pytest.approx(4.0)
+    assert row["trend"] == pytest.approx(0.0)
+    assert row["mse"] == pytest.approx(0.0)
+
+
+def test_fold_window_leaves_out_the_newest_day():
+    assert fold_window(None) is None
+    assert fold_window(1059) == (-1, 1058)            # first run
+    assert fold_window(1060, since="1058") == (1058, 1059)
+    assert fold_window(1059, since="1058") is None    # only the (partial) newest day is new
@@ -0,0 +1,74 @@
+import pytest
+
+from shopsmart.ingestor import LocalQueueSource, MicroBatchIngestor
+from sinks import QueueSink
+
+
+def _produce(sink, batches, per_batch):
+    sent = []
+    for b in range(batches):
+        batch = sink.new_batch()
+        for i in range(per_batch):
+            payload = '{"event_id": "EVT-' + str(b) + "-" + str(i) + '"}'
+            batch.add(payload)
+            sent.append(payload)
+        sink.send_batch(batch)
+    return sent
+
+
+def test_every_event_is_written_once_and_checkpointed():
+    sink = QueueSink(partitions=3)
+    sent = _produce(sink, batches=12, per_batch=250)
+    source = LocalQueueSource(sink.queue)
+    written = []
+
+    def write_batch(payloads, batch_id):
+        written.extend(payloads)
+        return len(payloads)
+
+    ingestor = MicroBatchIngestor(source, write_batch, max_batch_events=1000, max_batch_seconds=0.2,
+                                  verbose=False)
+    summary = ingestor.run(duration_seconds=20, idle_timeout_seconds=1)
+
+    assert sorted(written) == sorted(sent)
+    assert summary["events"] == len(sent)
+    assert all(h["rows"] == h["events"] for h in ingestor.history)
+    assert set(source.checkpoints) == {"0", "1", "2"}
+    # Each partition is checkpointed at the last event it delivered
+    last = {p: payloads[-1] for p, payloads in _by_partition(sent, 3).items()}
+    assert {p: e.body.decode("utf-8") for p, e in source.checkpoints.items()} == last
+
+
+def _by_partition(sent, partitions, per_batch=250):
+    out = {}
+    for b in range(len(sent) // per_batch):
+        out.setdefault(str(b % partitions), []).extend(sent[b * per_batch:(b + 1) * per_batch])
+    return out
+
+
+def test_failed_write_is_not_checkpointed():
+    sink = QueueSink(partitions=1)
+    _produce(sink, batches=1, per_batch=10)
+    source = LocalQueueSource(sink.queue)
+
+    def write_batch(payloads, batch_id):
+        raise RuntimeError("Bronze write failed")
+
+    ingestor = MicroBatchIngestor(source, write_batch, max_batch_seconds=0.1, verbose=False)
+    with pytest.raises(RuntimeError):
+        ingestor.run(duration_seconds=10)
+    assert source.checkpoints == {}
+
+
+def test_binary_payloads_reach_the_writer_as_bytes():
+    sink = QueueSink(partitions=1)
+    batch = sink.new_batch()
+    batch.add(b"\x00\x01binary")
+    batch.add('{"event_id": "EVT-1"}')
+    sink.send_batch(batch)
+    written = []
+
+    ingestor = MicroBatchIngestor(LocalQueueSource(sink.queue), lambda p, b: written.extend(p) or len(p),
+                                  max_batch_seconds=0.1, verbose=False)
+    ingestor.run(duration_seconds=10, idle_timeout_seconds=0.5)
+    assert written == [b"\x00\x01binary", '{"event_id": "EVT-1"}']
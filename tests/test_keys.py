@@ -0,0 +1,10 @@
+def test_number_keys_is_dense_and_in_key_order(spark):
+    from shopsmart.keys import number_keys
+
+    ids = ["C" + str(i).zfill(5) for i in range(5000)]
+    df = spark.createDataFrame([(c,) for c in reversed(ids)], "customer_id string").repartition(7)
+    numbered, ordered = number_keys(df, ["customer_id"], "customer_sk", offset=100)
+    rows = sorted((r["customer_sk"], r["customer_id"]) for r in numbered.collect())
+    ordered.unpersist()
+
+    assert rows == [(101 + i, c) for i, c in enumerate(ids)]
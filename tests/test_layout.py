@@ -0,0 +1,65 @@
+import json
+import os
+
+
+def _add(path, month):
+    stats = {"numRecords": 10, "minValues": {"customer_sk": 1}, "maxValues": {"customer_sk": 5}}
+    return {"add": {"path": path, "partitionValues": {"order_month": month}, "size": 100,
+                    "modificationTime": 1, "dataChange": True, "stats": json.dumps(stats)}}
+
+
+def _remove(path):
+    return {"remove": {"path": path, "deletionTimestamp": 1, "dataChange": True}}
+
+
+def _commit(log, version, actions):
+    with open(os.path.join(log, str(version).zfill(20) + ".json"), "w") as f:
+        f.write(json.dumps({"commitInfo": {"operation": "WRITE"}}) + "\n")
+        for action in actions:
+            f.write(json.dumps(action) + "\n")
+
+
+def test_log_files_replays_checkpoint_and_commits(spark, tmp_path):
+    from shopsmart.layout import log_files
+
+    table = str(tmp_path / "fact_sales")
+    log = os.path.join(table, "_delta_log")
+    os.makedirs(log)
+    _commit(log, 0, [_add("a", "1"), _add("b", "1")])
+    _commit(log, 1, [_remove("a"), _add("c", "2")])
+    assert sorted(r["path"] for r in log_files(spark, table).collect()) == ["b", "c"]
+
+    # Checkpoint at version 1, commit 0 cleaned up, then a re-add of the same file
+    rows = [json.dumps(a) for a in [_add("b", "1"), _add("c", "2"), _remove("a"), {"metaData": {"id": "x"}}]]
+    spark.read.json(spark.sparkContext.parallelize(rows)).coalesce(1).write.parquet(str(tmp_path / "cp"))
+    part = [f for f in os.listdir(str(tmp_path / "cp")) if f.endswith(".parquet")][0]
+    os.rename(str(tmp_path / "cp" / part), os.path.join(log, "1".zfill(20) + ".checkpoint.parquet"))
+    with open(os.path.join(log, "_last_checkpoint"), "w") as f:
+        f.write(json.dumps({"version": 1, "size": 3}))
+    os.remove(os.path.join(log, "0".zfill(20) + ".json"))
+    _commit(log, 2, [_remove("b"), _add("d", "3")])
+    _commit(log, 3, [_remove("d"), _add("d", "3")])
+
+    files = {r["path"]: r for r in log_files(spark, table).collect()}
+    assert sorted(files) == ["c", "d"]
+    assert files["d"]["partitionValues"] == {"order_month": "3"}
+    assert json.loads(files["c"]["stats"])["numRecords"] == 10
+
+
+def test_log_rows_adds_up_file_stats(spark, tmp_path):
+    from shopsmart.layout import log_rows
+
+    table = str(tmp_path / "fact_sales")
+    log = os.path.join(table, "_delta_log")
+    os.makedirs(log)
+    deleted = _add("c", "2")
+    deleted["add"]["deletionVector"] = {"storageType": "i", "pathOrInlineDv": "x", "sizeInBytes": 1,
+                                        "cardinality": 3}
+    _commit(log, 0, [_add("a", "1"), _add("b", "1")])
+    _commit(log, 1, [_remove("a"), deleted])
+    assert log_rows(spark, table) == 17
+
+    no_stats = _add("d", "3")
+    del no_stats["add"]["stats"]
+    _commit(log, 2, [no_stats])
+    assert log_rows(spark, table) is None
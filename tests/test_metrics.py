@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("delta")
+
+from shopsmart.metrics import PipelineRun, rows_written, source_rows  # noqa: E402
+
+
+class _Run(PipelineRun):
+    """PipelineRun without Spark: no listener, records kept in memory"""
+
+    def __init__(self):
+        super().__init__(spark=None, pipeline="test", sinks=[], listen=False, verbose=False)
+
+
+def _commit(version, timestamp=None):
+    return {"version": version, "timestamp": timestamp, "operation": "MERGE",
+            "metrics": {"numTargetRowsInserted": 5, "numTargetRowsUpdated": 2}}
+
+
+def test_start_version_decides_whether_the_stage_committed():
+    stage = _Run().stage("silver.orders")
+    stage._start_version = 7
+    assert not stage._committed(_commit(7))    # no-op run: the last run's commit
+    assert stage._committed(_commit(8))
+    stage._start_version = None                # table created by the stage
+    assert stage._committed(_commit(0))
+
+
+def test_commit_time_decides_without_a_start_version():
+    stage = _Run().stage("silver.orders")
+    assert not stage._committed(_commit(3, stage._started - timedelta(minutes=5)))
+    assert stage._committed(_commit(3, datetime.now()))
+
+
+def test_rows_written_of_a_merge():
+    assert rows_written(_commit(1)) == 7
+
+
+def test_source_rows():
+    merge = {"operation": "MERGE", "metrics": {"numSourceRows": 9, "numTargetRowsInserted": 5}}
+    write = {"operation": "WRITE", "metrics": {"numOutputRows": 12}}
+    assert source_rows(merge) == 9
+    assert source_rows(write) == 12
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from scaled_generator import generate_scaled
+from stream_producer import iter_recorded, recorded_files
+
+
+@pytest.mark.parametrize("output_format", ["text", "jsonl.gz"])
+def test_replays_scaled_generator_output(tmp_path, output_format):
+    generate_scaled(1, output_dir=str(tmp_path), seed=1, workers=1, as_of="2024-06-30",
+                    output_format=output_format)
+    folder = str(tmp_path / "source4_clickstream_eventhub")
+
+    paths = recorded_files(folder)
+    assert paths and all(os.path.isfile(p) for p in paths)
+    assert all(os.path.basename(p).startswith("part-") for p in paths)
+
+    skipped = [0]
+    events = list(iter_recorded(paths, skipped=skipped))
+    assert len(events) == 3000
+    assert skipped == [0]
+    timestamps = [ts for ts, _ in events]
+    assert timestamps == sorted(timestamps)
@@ -0,0 +1,20 @@
+from shopsmart.schemas import check_drift, field_names
+
+
+def test_check_drift_parses_the_sample_without_the_rdd_api(spark, tmp_path):
+    good = "O1,C1,2024-01-01,shipped,10.0,0,0,card,web,A1,2024-01-01 00:00:00,2024-01-01 00:00:00"
+    bad = "O2,C2,2024-01-01,shipped,ten,0,0,card,web,A1,2024-01-01 00:00:00,2024-01-01 00:00:00"
+    path = tmp_path / "orders.csv"
+    path.write_text("\n".join([",".join(field_names("orders")), good, bad]) + "\n")
+
+    report = check_drift(spark, "orders", str(path))
+    assert report == {"missing": [], "unexpected": [], "corrupt": 1, "sampled": 2}
+
+
+def test_check_drift_of_json_lines(spark, tmp_path):
+    path = tmp_path / "clicks.json"
+    path.write_text('{"event_id": "1", "referrer_code": "x"}\n{not json\n')
+
+    report = check_drift(spark, "clickstream", str(path))
+    assert report["unexpected"] == ["referrer_code"]
+    assert (report["sampled"], report["corrupt"]) == (2, 1)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from shopsmart.serving import COLUMN_NAMES, Customer360Store, benchmark_store, store_meta, write_snapshot
+
+
+def _customers(n):
+    ids = np.arange(n)
+    return pd.DataFrame({
+        "customer_id": ["CUST" + str(i).zfill(5) for i in ids],
+        "loyalty_tier": np.where(ids % 3 == 0, "Gold", "Silver"),
+        "rfm_segment": np.where(ids % 2 == 0, "Champions", "At Risk"),
+        "r_score": ids % 5 + 1,
+        "f_score": 3,
+        "m_score": 2,
+        "rfm_score": 532,
+        "recency_days": ids % 90,
+        "frequency": 4,
+        "monetary": ids * 1.5,
+        "payments_recent": 1,
+        "anomalies_recent": 0,
+        "high_risk_payments_recent": 0,
+        "max_risk_score_recent": np.where(ids % 4 == 0, np.nan, 40),
+        "worst_risk_recent": "LOW",
+        "last_payment_at": "2025-01-01 10:00:00",
+    })
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "serving" / "customer_360.sqlite")
+
+
+def test_first_snapshot_inserts_everything(store_path):
+    stats = write_snapshot(store_path, _customers(1000), {"dim_customer": 3})
+    assert stats == {"rows": 1000, "inserted": 1000, "updated": 0, "deleted": 0, "unchanged": 0}
+    assert store_meta(store_path)["source_versions"] == {"dim_customer": 3}
+
+
+def test_refresh_writes_only_changes(store_path):
+    write_snapshot(store_path, _customers(1000))
+    assert write_snapshot(store_path, _customers(1000))["unchanged"] == 1000
+
+    pdf = _customers(1000).iloc[10:].copy()
+    pdf.loc[100:149, "monetary"] = 0.0
+    # A row with NULL scores must not make every other row look changed (int columns turn float)
+    pdf = pd.concat([pdf, pd.DataFrame({"customer_id": ["NEW"], "loyalty_tier": ["Bronze"]})])
+    stats = write_snapshot(store_path, pdf)
+    assert stats == {"rows": 991, "inserted": 1, "updated": 50, "deleted": 10, "unchanged": 940}
+
+
+def test_lookups(store_path):
+    write_snapshot(store_path, _customers(2000))
+    store = Customer360Store(store_path)
+    try:
+        record = store.get("CUST00004")
+        assert list(record) == COLUMN_NAMES
+        assert record["rfm_segment"] == "Champions"
+        assert record["r_score"] == 5 and isinstance(record["r_score"], int)
+        assert record["max_risk_score_recent"] is None
+        assert store.get("NOBODY") is None
+
+        wanted = ["CUST" + str(i).zfill(5) for i in range(0, 2000, 2)] + ["NOBODY"]
+        found = store.get_many(wanted)
+        assert len(found) == 1000
+        assert found["CUST01998"]["monetary"] == 1998 * 1.5
+    finally:
+        store.close()
+
+
+def test_store_is_read_only(store_path):
+    import sqlite3
+
+    write_snapshot(store_path, _customers(10))
+    store = Customer360Store(store_path)
+    with pytest.raises(sqlite3.OperationalError):
+        store.conn.execute("DELETE FROM customer_360")
+    store.close()
+
+
+def test_benchmark(store_path):
+    write_snapshot(store_path, _customers(500))
+    result = benchmark_store(store_path, lookups=2000, batch_size=50)
+    assert result["customers"] == 500
+    assert 0.9 < result["hit_rate"] < 1.0
+    assert result["latency_us"]["p50"] <= result["latency_us"]["p99"] <= result["latency_us"]["max"]
+    assert result["lookups_per_sec"] > 0
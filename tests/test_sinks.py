@@ -0,0 +1,95 @@
+import glob
+import os
+
+import pytest
+
+from sinks import LATENCY_WINDOW, FileSink, LocalBatch, QueueSink, SinkStats
+
+
+def _send(sink, payloads, partition_id=None):
+    batch = sink.new_batch(partition_id)
+    for payload in payloads:
+        batch.add(payload)
+    sink.send_batch(batch)
+
+
+def test_local_batch_raises_when_full():
+    batch = LocalBatch("0", max_size_in_bytes=10)
+    batch.add("abcd")
+    batch.add("efgh")
+    with pytest.raises(ValueError):
+        batch.add("ijkl")
+    assert len(batch) == 2
+
+
+def test_local_batch_always_takes_one_payload():
+    batch = LocalBatch("0", max_size_in_bytes=10)
+    batch.add("x" * 100)
+    assert len(batch) == 1
+
+
+def test_queue_sink_round_robin_and_stats():
+    sink = QueueSink(partitions=2)
+    _send(sink, ['{"a": 1}', '{"a": 2}'])
+    _send(sink, ['{"a": 3}'])
+    _send(sink, ['{"a": 4}'], partition_id="1")
+
+    sent = [sink.queue.get_nowait() for _ in range(3)]
+    assert sent == [("0", ['{"a": 1}', '{"a": 2}']), ("1", ['{"a": 3}']), ("1", ['{"a": 4}'])]
+    snap = sink.stats.snapshot()
+    assert snap["events"] == 4
+    assert snap["batches"] == 3
+    assert snap["p99_ms"] >= snap["p50_ms"] >= 0
+
+
+def test_sink_stats_keep_a_bounded_latency_window():
+    stats = SinkStats()
+    stats.record(1, 10, 5.0)
+    for _ in range(LATENCY_WINDOW):
+        stats.record(1, 10, 0.001)
+    assert len(stats.latencies) == LATENCY_WINDOW
+    snap = stats.snapshot()
+    assert snap["batches"] == LATENCY_WINDOW + 1
+    assert snap["p99_ms"] == 1.0
+    assert snap["max_ms"] == 5000.0
+
+
+def test_file_sink_writes_json_lines_per_partition(tmp_path):
+    sink = FileSink(str(tmp_path), partitions=2)
+    _send(sink, ['{"a": 1}', '{"a": 2}'], partition_id="0")
+    _send(sink, ['{"a": 3}'], partition_id="1")
+    _send(sink, ['{"a": 4}'], partition_id="0")
+    sink.close()
+
+    with open(tmp_path / "partition=0" / "events-00000.jsonl") as f:
+        assert f.read().splitlines() == ['{"a": 1}', '{"a": 2}', '{"a": 4}']
+    with open(tmp_path / "partition=1" / "events-00000.jsonl") as f:
+        assert f.read().splitlines() == ['{"a": 3}']
+
+
+def test_file_sink_length_prefixes_binary_payloads(tmp_path):
+    sink = FileSink(str(tmp_path), partitions=1)
+    payloads = [b"\x00\x01abc", b"\x00\x01" + bytes(range(256)), '{"json": "fallback"}']
+    _send(sink, payloads)
+    sink.close()
+
+    data = (tmp_path / "partition=0" / "events-00000.bin").read_bytes()
+    records, at = [], 0
+    while at < len(data):
+        size = int.from_bytes(data[at:at + 4], "big")
+        records.append(data[at + 4:at + 4 + size])
+        at += 4 + size
+    assert records == [payloads[0], payloads[1], payloads[2].encode("utf-8")]
+
+
+def test_file_sink_rotates_files(tmp_path):
+    sink = FileSink(str(tmp_path), partitions=1, max_file_bytes=100)
+    for i in range(10):
+        _send(sink, ['{"i": ' + str(i) + ', "pad": "' + "x" * 30 + '"}'])
+    sink.close()
+
+    files = sorted(glob.glob(os.path.join(str(tmp_path), "partition=0", "*.jsonl")))
+    assert len(files) > 1
+    assert all(os.path.getsize(f) <= 100 for f in files)
+    lines = [line for f in files for line in open(f).read().splitlines()]
+    assert len(lines) == 10
@@ -0,0 +1,93 @@
+import json
+from datetime import datetime, timezone
+
+from shopsmart.wire import CURRENT_SCHEMA_ID, MAGIC, WIRE_SCHEMAS, _read_varint, encode_event, peek_keys
+from stream_producer import generate_event
+
+
+def _decode(payload):
+    """Reference decoder: walks WIRE_SCHEMAS field by field (what from_avro does in Spark)"""
+    assert payload[:1] == MAGIC
+    wire = WIRE_SCHEMAS[payload[1]]
+    event, at = {}, 2
+    for name, kind in wire["fields"]:
+        if kind == "code":
+            code, at = _read_varint(payload, at)
+            event[name] = None if code < 0 else wire["dictionaries"][name][code]
+            continue
+        branch, at = _read_varint(payload, at)
+        if branch == 0:
+            event[name] = None
+            continue
+        value, at = _read_varint(payload, at)
+        if kind == "string":
+            event[name] = payload[at:at + value].decode("utf-8")
+            at += value
+        elif kind == "millis":
+            ts = datetime.fromtimestamp(value / 1000, timezone.utc)
+            event[name] = ts.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        else:
+            event[name] = value
+    assert at == len(payload)
+    geo = {"city": event.pop("geo_city"), "country": event.pop("geo_country")}
+    return event, geo
+
+
+def _flat(event):
+    flat = dict(event)
+    return flat, flat.pop("geo_location")
+
+
+def test_round_trip_of_generated_events():
+    for _ in range(500):
+        event = generate_event()
+        payload = encode_event(event)
+        assert isinstance(payload, bytes)
+        assert payload[1] == CURRENT_SCHEMA_ID
+        assert _decode(payload) == _flat(event)
+
+
+def test_wire_format_is_smaller_than_json():
+    events = [generate_event() for _ in range(200)]
+    wire = sum(len(encode_event(e)) for e in events)
+    text = sum(len(json.dumps(e)) for e in events)
+    assert wire < text / 2
+
+
+def test_nulls_round_trip():
+    event = generate_event()
+    event.update(customer_id=None, search_query=None, referrer=None, page_load_time_ms=None)
+    assert _decode(encode_event(event)) == _flat(event)
+
+
+def test_events_the_schema_cannot_carry_fall_back_to_json():
+    unknown_value = dict(generate_event(), event_type="purchase")
+    extra_field = dict(generate_event(), coupon="SAVE10")
+    bad_timestamp = dict(generate_event(), event_timestamp="yesterday")
+    too_big = dict(generate_event(), page_load_time_ms=2 ** 40)
+    for event in [unknown_value, extra_field, bad_timestamp, too_big]:
+        payload = encode_event(event)
+        assert isinstance(payload, str)
+        assert json.loads(payload) == event
+
+
+def test_peek_keys():
+    event = generate_event()
+    assert peek_keys(encode_event(event)) == (event["event_id"], event["event_timestamp"][:10])
+    assert peek_keys(b"\x00\x63whatever") == (None, None)      # unknown schema id
+    assert peek_keys(encode_event(event)[:5]) == (None, None)  # truncated
+
+
+def test_spark_decode_matches_json_parse(spark):
+    from shopsmart.clickstream import parse_json_events
+    from shopsmart.wire import decode_events
+
+    events = [generate_event() for _ in range(50)]
+    events[0].update(customer_id=None, referrer=None)
+    decoded = decode_events(spark, [encode_event(e) for e in events] + [b"\x00\x01\xff\xff"])
+    parsed = parse_json_events(spark, [json.dumps(e) for e in events])
+
+    assert decoded.columns == parsed.columns
+    rows = sorted(decoded.collect(), key=lambda r: r["event_id"] or "")
+    assert rows[0]["event_id"] is None and rows[0]["_corrupt_record"] is not None
+    assert rows[1:] == sorted(parsed.collect(), key=lambda r: r["event_id"])